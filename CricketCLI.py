@@ -1,20 +1,60 @@
 __author__ = 'user'
 
 import cmd
+import cricketprofile
 from kwutils import *
 from pycricket import *
 
+class CricketConsole():
+    """Prints what happens in a match to the console as it is played."""
+
+    def __init__(self, match: CricketMatch):
+        self.match = match
+
+    def subscribe(self):
+        self.match.subscribe(CricketEvents.DELIVERY, self.on_delivery)
+        self.match.subscribe(CricketEvents.WICKET, self.on_wicket)
+        self.match.subscribe(CricketEvents.MATCH_COMPLETE, self.on_match_complete)
+
+    def unsubscribe(self):
+        self.match.unsubscribe(CricketEvents.DELIVERY, self.on_delivery)
+        self.match.unsubscribe(CricketEvents.WICKET, self.on_wicket)
+        self.match.unsubscribe(CricketEvents.MATCH_COMPLETE, self.on_match_complete)
+
+    def on_delivery(self, innings: CricketInnings, delivery: CricketDelivery):
+        print("Over %i.%i %s" % (len(innings.overs), innings.current_over.balls, delivery))
+
+    def on_wicket(self, innings: CricketInnings, delivery: CricketDelivery):
+        print("Batsmen %s is out! New batsmen %s" % (delivery.batsmen, innings.current_batsmen))
+
+    def on_match_complete(self, match: CricketMatch):
+        print("\nIt's all over!")
+        match.print()
+
+
 class CricketCLI(cmd.Cmd):
 
     intro = "Welcome to the PyCricket CLI.\nType 'start' got get going!"
     prompt = "What next?"
 
 
-    def __init__(self, match : CricketMatch):
+    def __init__(self, match : CricketMatch, stdin=None, stdout=None):
 
-        super(CricketCLI, self).__init__()
+        super(CricketCLI, self).__init__(stdin=stdin, stdout=stdout)
         self.match = match
 
+        # When reading commands from a script don't prompt for them and stop at the end of the script
+        if stdin is not None:
+            self.use_rawinput = False
+            self.intro = None
+            self.prompt = ""
+
+        self.console = CricketConsole(match)
+        self.console.subscribe()
+
+    def do_EOF(self, arg):
+        return True
+
     def do_quit(self, arg):
         if confirm("Are you sure you want to quit?"):
             exit(0)
@@ -25,21 +65,20 @@ class CricketCLI(cmd.Cmd):
     def do_auto(self, arg):
 
         try:
-            current_innings = self.match.current_innings
-            batsmen = current_innings.current_batsmen
-            bowler = current_innings.current_bowler
+            if self.match.current_innings is None:
+                raise (Exception("The match hasn't started yet."))
 
             if is_numeric(arg):
                 loops = int(arg)
             else:
                 loops = 1
 
+            # Pick each delivery for the players who will face and bowl it and stop at the end of an over
             for i in range(loops):
-                #batsmen = CricketPlayer("Ace")
-                #bowler = CricketPlayer("Bad Boy")
-                new_delivery = CricketBrain.delivery(batsmen, bowler)
-                self.match.bowl(new_delivery)
-                #print(new_delivery)
+                outcome = self.match.play(self.match.auto_delivery())
+                if outcome.status != CricketOutcome.CONTINUING:
+                    print(self.match.describe(outcome))
+                    break
 
         except Exception as err:
             print(str(err))
@@ -63,24 +102,49 @@ class CricketCLI(cmd.Cmd):
 
 
     def do_bowl(self, arg):
+        """bowl [type] [runs] - the type can be its number or its name, e.g. bowl Shot 4 or bowl 5"""
 
         try:
-            if is_numeric(arg):
-                type_id = int(arg) - 1
-                if type_id not in range(len(CricketDelivery.DESCRIPTION)):
-                    raise(Exception("Invalid delivery type %i" % type_id))
-            else:
+            type_id, runs_arg = CricketDelivery.parse_command(arg)
+            if type_id is None:
                 type = pick("delivery",CricketDelivery.DESCRIPTION)
                 type_id = CricketDelivery.DESCRIPTION.index(type)
 
             runs = CricketRules.runs(type_id)
             if runs == CricketRules.RUNS:
-                runs = pick("Runs", (1,2,3,4,5,6,0))
+                if runs_arg is not None:
+                    runs = runs_arg
+                else:
+                    runs = pick("Runs", (1,2,3,4,5,6,0))
             self.match.bowl(CricketDelivery(type_id, runs))
 
         except Exception as err:
             print(str(err))
 
+    def do_profile(self, arg):
+        """profile [on|off|reset|capture <matches> [cprofile|pyinstrument]] - time the match engine's phases;
+        with no argument print the timings so far"""
+
+        try:
+            args = arg.split()
+            if len(args) == 0:
+                cricketprofile.print_stats()
+            elif args[0] == "on":
+                cricketprofile.enable()
+            elif args[0] == "off":
+                cricketprofile.disable()
+            elif args[0] == "reset":
+                cricketprofile.reset()
+            elif args[0] == "capture":
+                matches = int(args[1]) if len(args) > 1 and is_numeric(args[1]) else 10
+                tool = args[2] if len(args) > 2 else "cprofile"
+                print(cricketprofile.capture(matches, tool))
+            else:
+                raise (Exception("Unknown profile option %s" % args[0]))
+
+        except Exception as err:
+            print(str(err))
+
     def do_score(self, arg):
         self.match.score_card()
 
@@ -0,0 +1,175 @@
+__author__ = 'user'
+
+import mmap
+import os
+import struct
+from pycricket import *
+
+# Ball by ball archive of many matches in a single append-only file.
+#
+# The file is a 16 byte header followed by one 16 byte little endian record per delivery. Innings, overs and
+# balls are numbered from 1 as they are on the score card, and batters and bowlers are their positions in
+# their teams. Records are only ever appended so a file can be read while more matches are being written to it;
+# a record that is only partly written is ignored.
+
+MAGIC = b"PYCKBALL"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHH4x")
+
+# match id, runs, over, batter, bowler, innings, ball, type and a spare byte to keep the records aligned
+RECORD = struct.Struct("<IhHHHBBbx")
+FIELDS = ("match", "runs", "over", "batter", "bowler", "innings", "ball", "type")
+_FORMATS = ("<u4", "<i2", "<u2", "<u2", "<u2", "u1", "u1", "i1")
+_OFFSETS = (0, 4, 6, 8, 10, 12, 13, 14)
+
+
+def record_dtype():
+    """The NumPy structured dtype of a record in the archive."""
+    import numpy
+    return numpy.dtype({"names": list(FIELDS), "formats": list(_FORMATS), "offsets": list(_OFFSETS),
+                        "itemsize": RECORD.size})
+
+
+def _check_header(data):
+    magic, version, record_size = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise (Exception("Not a PyCricket ball by ball archive."))
+    if version != VERSION or record_size != RECORD.size:
+        raise (Exception("Unsupported ball by ball archive version %i." % version))
+
+
+class CricketArchive():
+    """Writes the deliveries of whole innings to the end of an archive file, creating it if needed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab+")
+        self.next_match_id = 1
+
+        # Matches being recorded as they are played and their callbacks
+        self.recording = {}
+
+        size = self.file.seek(0, os.SEEK_END)
+        if size == 0:
+            self.file.write(_HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+        else:
+            self.file.seek(0)
+            _check_header(self.file.read(_HEADER.size))
+
+            # Carry on numbering matches from the last complete record
+            records = (size - _HEADER.size) // RECORD.size
+            if records > 0:
+                self.file.seek(_HEADER.size + (records - 1) * RECORD.size)
+                self.next_match_id = RECORD.unpack(self.file.read(RECORD.size))[0] + 1
+
+            # Drop any partly written record so the new ones line up
+            self.file.truncate(_HEADER.size + records * RECORD.size)
+            self.file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for match in list(self.recording):
+            self.stop_recording(match)
+        self.file.close()
+
+    def flush(self):
+        """Write out buffered records so that readers opened from now on can see them."""
+        self.file.flush()
+
+    def new_match_id(self):
+        match_id = self.next_match_id
+        self.next_match_id += 1
+        return match_id
+
+    def add_innings(self, match_id: int, innings_number: int, innings: CricketInnings):
+        """Append every delivery of an innings."""
+        log = innings.log
+        pack = RECORD.pack
+        types, runs, batsmen, bowlers = log.types, log.runs, log.batsmen, log.bowlers
+        records = []
+        for over in innings.overs:
+            for i in range(over.start, over.start + over.balls):
+                records.append(pack(match_id, runs[i], over.number + 1, batsmen[i], bowlers[i], innings_number,
+                                    i - over.start + 1, types[i]))
+        self.file.write(b"".join(records))
+
+    def add_match(self, match: CricketMatch, match_id: int = None):
+        """Append every delivery of every innings of a match and return the match id they were given."""
+        if match_id is None:
+            match_id = self.new_match_id()
+        for i in range(len(match.innings)):
+            self.add_innings(match_id, i + 1, match.innings[i])
+        return match_id
+
+    def record(self, match: CricketMatch, match_id: int = None):
+        """Append each innings of a match as soon as it is completed and return the match id they will be given.
+
+        Recording stops by itself when the match is over."""
+        if match_id is None:
+            match_id = self.new_match_id()
+
+        def on_innings_complete(innings: CricketInnings):
+            self.add_innings(match_id, match.innings.index(innings) + 1, innings)
+
+        def on_match_complete(match: CricketMatch):
+            self.stop_recording(match)
+
+        match.subscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.subscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+        self.recording[match] = (on_innings_complete, on_match_complete)
+        return match_id
+
+    def stop_recording(self, match: CricketMatch):
+        on_innings_complete, on_match_complete = self.recording.pop(match)
+        match.unsubscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.unsubscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+
+
+class CricketArchiveReader():
+    """Memory maps an archive file so that its records can be scanned without reading them into Python objects.
+
+    The NumPy views returned by records() and column() share memory with the file, so the reader must stay open
+    for as long as they are being used. Records added to the file after it was opened are not seen."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self.map)
+        self.count = (len(self.map) - _HEADER.size) // RECORD.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Tuples of the fields of each record, in the order given by FIELDS; this doesn't need NumPy."""
+        data = memoryview(self.map)[_HEADER.size:_HEADER.size + self.count * RECORD.size]
+        try:
+            yield from RECORD.iter_unpack(data)
+        finally:
+            data.release()
+
+    def records(self):
+        """A NumPy structured array of every record, viewing the file rather than copying it."""
+        import numpy
+        return numpy.frombuffer(self.map, dtype=record_dtype(), count=self.count, offset=_HEADER.size)
+
+    def column(self, field: str):
+        """A NumPy view of one field of every record, for example column("runs")."""
+        return self.records()[field]
@@ -0,0 +1,287 @@
+__author__ = 'user'
+
+import argparse
+import contextlib
+import io
+import json
+import pickle
+import platform
+import sys
+import time
+import cricketprofile
+from pycricket import *
+from cricketsim import simulate_match, simulate_matches
+from cricketsnapshot import snapshot, restore
+
+# Innings lengths in overs to time score() and state at
+INNINGS_LENGTHS = (3, 20, 50, 90)
+
+
+def make_team(name: str, players: int, rng: CricketRandom):
+    team = CricketTeam(name)
+    for i in range(players):
+        team.add_player(CricketPlayer("%s %i" % (name, i + 1), rng))
+    return team
+
+
+def make_match(overs: int, seed: int, players: int = 11):
+    """Create a match between two new teams with the specified number of overs per innings."""
+    rules = CricketRules("Benchmark")
+    rules.overs_per_innings = overs
+    rules.max_player = players
+
+    match = CricketMatch("Benchmark", rules, seed)
+    match.add_team(make_team("Home", players, match.rng.child("team", 0)))
+    match.add_team(make_team("Away", players, match.rng.child("team", 1)))
+    return match
+
+
+def play_match(match: CricketMatch):
+    """Play a match to the end with CricketBrain picking every delivery."""
+    match.start(match.list_teams[0])
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        pass
+
+
+def best_of(repeats: int, function):
+    """Run the function several times and return the quickest time in seconds."""
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_delivery(scale: int):
+    rng = CricketRandom(1)
+    batsmen = CricketPlayer("Batsmen", rng)
+    bowler = CricketPlayer("Bowler", rng)
+    count = 20000 * scale
+
+    def run():
+        for i in range(count):
+            CricketBrain.delivery(batsmen, bowler, rng)
+
+    return {"brain.deliveries_per_second": (count / best_of(3, run), "deliveries/s", True)}
+
+
+def bench_score(scale: int):
+    results = {}
+    calls = 2000 * scale
+    for overs in INNINGS_LENGTHS:
+
+        # Bowl out a full innings of the required length, alternating dots and runs
+        match = make_match(overs, overs)
+        home, away = match.list_teams
+        innings = CricketInnings(home, away, overs, match.rng, match.events)
+        innings.start()
+        for ball in range(overs * match.rules.deliveries_per_over):
+            if ball % 2 == 0:
+                innings.play(CricketDelivery(CricketDelivery.DOT))
+            else:
+                innings.play(CricketDelivery(CricketDelivery.RUNS, 1))
+
+        def run_score():
+            for i in range(calls):
+                innings.score()
+
+        def run_state():
+            for i in range(calls):
+                innings.state
+
+        results["innings.score_us.%i_overs" % overs] = (best_of(3, run_score) * 1e6 / calls, "us", False)
+        results["innings.state_us.%i_overs" % overs] = (best_of(3, run_state) * 1e6 / calls, "us", False)
+
+    return results
+
+
+def bench_score_card(scale: int):
+    # Stop halfway through the second innings: finished innings are rendered once and kept, so only a match that is
+    # still being played shows what rendering costs after each ball. The seed is fixed so the match always gets there,
+    # but stop anyway if it finishes first rather than playing on into a finished match
+    match = make_match(20, 2)
+    match.start(match.list_teams[0])
+    while match.state != CricketMatch.FINISHED and (len(match.innings) < 2 or match.current_innings.balls < 60):
+        match.play(match.auto_delivery())
+    if match.state == CricketMatch.FINISHED or match.current_innings.balls != 60:
+        raise (Exception("The score card benchmark's match finished before 60 balls of the second innings"))
+    calls = 100 * scale
+
+    def run_score_card():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(calls):
+                match.score_card()
+
+    def run_print():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(calls):
+                match.print()
+
+    return {"match.score_card_ms": (best_of(3, run_score_card) * 1e3 / calls, "ms", False),
+            "match.print_ms": (best_of(3, run_print) * 1e3 / calls, "ms", False)}
+
+
+def bench_projection(scale: int):
+    """Project the innings' total after every ball of a match, as a live display would, and see how often the
+    outcome tables it needs are already cached."""
+    projections = 0
+    start = time.perf_counter()
+    before = CricketBrain.table_cache_info()
+    for i in range(scale):
+        match = make_match(20, 5 + i)
+        match.start(match.list_teams[0])
+        while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+            match.current_innings.project_innings()
+            projections += 1
+    elapsed = time.perf_counter() - start
+    after = CricketBrain.table_cache_info()
+
+    hits = after.hits - before.hits
+    lookups = hits + after.misses - before.misses
+    return {"innings.projection_ms": (elapsed * 1e3 / projections, "ms", False),
+            "brain.table_hit_rate": (hits / max(lookups, 1), "hits/lookup", True)}
+
+
+def bench_match(scale: int):
+    count = 20 * scale
+
+    def run_engine():
+        for i in range(count):
+            play_match(make_match(20, i))
+
+    match = make_match(20, 3)
+    team_a, team_b = match.list_teams
+
+    def run_simulation():
+        for i in range(count * 10):
+            simulate_match(match.rules, team_a, team_b, i)
+
+    fixtures = [(team_a, team_b)] * (count * 500)
+
+    def run_batch():
+        simulate_matches(match.rules, fixtures, 0)
+
+    return {"match.matches_per_second": (count / best_of(3, run_engine), "matches/s", True),
+            "simulate.matches_per_second": (count * 10 / best_of(3, run_simulation), "matches/s", True),
+            "simulate.batch_matches_per_second": (len(fixtures) / best_of(3, run_batch), "matches/s", True)}
+
+
+def bench_profile(scale: int):
+    """Play the same matches before cricketprofile has been enabled, while it is enabled and after it has been
+    disabled again, to measure what profiling costs when it is on and check that it costs nothing once it is off."""
+    if cricketprofile.is_enabled():
+        raise (Exception("Can't measure the profiler's overhead while it is enabled"))
+    count = 10 * scale
+
+    def run():
+        for i in range(count):
+            play_match(make_match(20, i))
+
+    unpatched = best_of(5, run)
+
+    # Take turns so that both are timed under the same conditions
+    enabled = []
+    disabled = []
+    for i in range(5):
+        cricketprofile.enable()
+        try:
+            enabled.append(best_of(1, run))
+        finally:
+            cricketprofile.disable()
+        disabled.append(best_of(1, run))
+
+    return {"profile.unpatched_matches_per_second": (count / unpatched, "matches/s", True),
+            "profile.enabled_matches_per_second": (count / min(enabled), "matches/s", True),
+            "profile.disabled_matches_per_second": (count / min(disabled), "matches/s", True)}
+
+
+def bench_snapshot(scale: int):
+    match = make_match(20, 4)
+    play_match(match)
+    data = snapshot(match)
+    calls = 200 * scale
+
+    def run_snapshot():
+        for i in range(calls):
+            snapshot(match)
+
+    def run_restore():
+        for i in range(calls):
+            restore(data)
+
+    def run_pickle():
+        for i in range(calls):
+            pickle.dumps(match, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return {"snapshot.snapshot_us": (best_of(3, run_snapshot) * 1e6 / calls, "us", False),
+            "snapshot.restore_us": (best_of(3, run_restore) * 1e6 / calls, "us", False),
+            "snapshot.pickle_us": (best_of(3, run_pickle) * 1e6 / calls, "us", False),
+            "snapshot.bytes": (len(data), "bytes", False)}
+
+
+BENCHMARKS = (bench_delivery, bench_score, bench_score_card, bench_projection, bench_match, bench_profile,
+              bench_snapshot)
+
+
+def run_benchmarks(scale: int = 1):
+    results = {}
+    for benchmark in BENCHMARKS:
+        for name, (value, unit, higher_is_better) in benchmark(scale).items():
+            results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+    return {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Return a list of descriptions of the benchmarks that are worse than the baseline by more than the threshold."""
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["value"]
+        new = result["value"]
+        if old == 0:
+            continue
+        if result["higher_is_better"]:
+            change = (old - new) / old
+        else:
+            change = (new - old) / old
+        if change > threshold:
+            regressions.append("%s: %.4g %s against baseline %.4g (%.0f%% worse)" %
+                               (name, new, result["unit"], old, change * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PyCricket match engine.")
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="fail if any benchmark is worse than the baseline by more than this fraction")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the amount of work done by each benchmark")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scale)
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("Regression: %s" % regression, file=sys.stderr)
+        if len(regressions) > 0:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
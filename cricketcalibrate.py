@@ -0,0 +1,405 @@
+__author__ = 'user'
+
+import argparse
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pycricket import *
+from cricketsim import simulate_innings, BOUNDARIES
+
+# Tunes CricketBrain's constants to hit target statistics.
+#
+# A parameter point is evaluated by simulating a fixed set of innings with it, always with the same players and
+# luck draws, so the statistics of a point never change and nearby points can be compared without noise. The
+# search samples the space at random and then refines the best point found with a compass search, evaluating
+# each round's points across a pool of worker processes. Evaluations are cached by point, so revisited points
+# are free and a cache saved from one run can be reused when the same format is tuned to different targets.
+
+# Statistics that can be targeted, all per over
+RUN_RATE = "run_rate"
+WIDE_RATE = "wide_rate"
+NO_BALL_RATE = "no_ball_rate"
+WICKET_RATE = "wicket_rate"
+BOUNDARY_RATE = "boundary_rate"
+STATISTICS = (RUN_RATE, WIDE_RATE, NO_BALL_RATE, WICKET_RATE, BOUNDARY_RATE)
+
+# Lowest value, highest value and resolution searched for each of CricketBrain's parameters
+SEARCH_SPACE = {"LUCK_MULTIPLIER": (1.0, 20.0, 0.01),
+                "SKILL_MULTIPLIER": (1.0, 20.0, 0.01),
+                "SPEED_MULTIPLIER": (0.0, 10.0, 0.01),
+                "ACCURATE_BOWL_LIMIT": (0.0, 20.0, 0.01),
+                "NO_BALL_LIMIT": (0.0, 10.0, 0.01),
+                "WIDE_LIMIT": (0.0, 20.0, 0.01),
+                "SHOT_LIMIT": (0.0, 25.0, 0.01),
+                "WICKET_LIMIT": (-10.0, 15.0, 0.01),
+                "SKILL_BONUS": (0.0, 0.5, 0.001)}
+
+FILE_VERSION = 1
+
+# Targets this close to zero are compared on an absolute rather than relative scale
+_SCALE_FLOOR = 0.1
+
+
+def validate_parameters(parameters: dict, complete: bool = True):
+    """Raise an exception if the parameters are not a sensible set of CricketBrain constants.
+
+    Unless complete is False every parameter must be given."""
+    for name, value in parameters.items():
+        if name not in CricketBrain.PARAMETERS:
+            raise (Exception("Unknown CricketBrain parameter %s" % name))
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise (Exception("CricketBrain parameter %s must be a finite number, not %r" % (name, value)))
+
+    if complete is True:
+        missing = [name for name in CricketBrain.PARAMETERS if name not in parameters]
+        if len(missing) > 0:
+            raise (Exception("Missing CricketBrain parameters %s" % ", ".join(missing)))
+
+    values = dict(CricketBrain.parameters())
+    values.update(parameters)
+
+    if values["LUCK_MULTIPLIER"] <= 0 or values["SKILL_MULTIPLIER"] <= 0 or values["SPEED_MULTIPLIER"] < 0:
+        raise (Exception("CricketBrain multipliers must be positive"))
+    if values["SKILL_BONUS"] < 0:
+        raise (Exception("CricketBrain SKILL_BONUS must not be negative"))
+    if not values["NO_BALL_LIMIT"] <= values["WIDE_LIMIT"] <= values["ACCURATE_BOWL_LIMIT"]:
+        raise (Exception("CricketBrain limits must be NO_BALL_LIMIT <= WIDE_LIMIT <= ACCURATE_BOWL_LIMIT"))
+    if values["WICKET_LIMIT"] > values["SHOT_LIMIT"]:
+        raise (Exception("CricketBrain limits must be WICKET_LIMIT <= SHOT_LIMIT"))
+
+
+def is_valid(parameters: dict):
+    try:
+        validate_parameters(parameters)
+    except Exception:
+        return False
+    return True
+
+
+def round_point(parameters: dict):
+    """Snap every parameter to the resolution it is searched at."""
+    point = {}
+    for name in CricketBrain.PARAMETERS:
+        resolution = SEARCH_SPACE[name][2]
+        point[name] = round(round(parameters[name] / resolution) * resolution, 10)
+    return point
+
+
+def measure(parameters: dict, overs: int = 20, deliveries_per_over: int = 6, players: int = 4,
+            innings: int = 1000, seed: int = 0):
+    """Simulate innings with the parameters and return the statistics they give.
+
+    Each innings is between two new sides of random players. The same seed always gives the same players and luck
+    draws. CricketBrain's own constants are put back afterwards."""
+    previous = CricketBrain.parameters()
+    CricketBrain.configure(**parameters)
+    try:
+        rng = CricketRandom(seed)
+        max_balls = overs * deliveries_per_over
+        counts = {}
+        runs = 0
+        balls = 0
+
+        for i in range(innings):
+            innings_rng = rng.child("calibrate", i)
+            squads = []
+            for side in range(2):
+                squads.append([CricketPlayer("Player", innings_rng) for player in range(players)])
+
+            innings_runs, innings_wickets, innings_balls = simulate_innings(squads[0], squads[1], max_balls,
+                                                                            deliveries_per_over, innings_rng, counts)
+            runs += innings_runs
+            balls += innings_balls
+
+    finally:
+        CricketBrain.configure(**previous)
+
+    overs_bowled = max(balls, 1) / deliveries_per_over
+    return {RUN_RATE: runs / overs_bowled,
+            WIDE_RATE: counts.get(CricketDelivery.WIDE, 0) / overs_bowled,
+            NO_BALL_RATE: counts.get(CricketDelivery.NO_BALL, 0) / overs_bowled,
+            WICKET_RATE: counts.get(CricketDelivery.WICKET, 0) / overs_bowled,
+            BOUNDARY_RATE: counts.get(BOUNDARIES, 0) / overs_bowled}
+
+
+# How each worker process simulates, set once when the worker starts
+_worker_settings = None
+
+
+def _init_worker(settings: tuple):
+    global _worker_settings
+    _worker_settings = settings
+
+
+def _evaluate(values: tuple):
+    parameters = dict(zip(CricketBrain.PARAMETERS, values))
+    return values, measure(parameters, *_worker_settings)
+
+
+class CricketCalibration():
+    """Searches CricketBrain's constants for the set whose statistics come closest to the targets.
+
+    targets maps some of STATISTICS to the value wanted and weights, if given, how much each one counts.
+    Only the parameters named in tune are changed; the others keep their current values."""
+
+    def __init__(self, targets: dict, rules: CricketRules = None, players: int = 4, innings: int = 1000,
+                 seed: int = 0, workers: int = None, tune: tuple = None, weights: dict = None):
+
+        for name in targets:
+            if name not in STATISTICS:
+                raise (Exception("Unknown calibration statistic %s" % name))
+
+        if rules is None:
+            rules = CricketRules("Calibration")
+            rules.overs_per_innings = 20
+
+        if tune is None:
+            tune = CricketBrain.PARAMETERS
+        for name in tune:
+            if name not in CricketBrain.PARAMETERS:
+                raise (Exception("Unknown CricketBrain parameter %s" % name))
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self.targets = dict(targets)
+        self.weights = dict(weights) if weights is not None else {}
+        self.rules = rules
+        self.seed = seed
+        self.workers = workers
+        self.tune = tuple(tune)
+        self.settings = (rules.overs_per_innings, rules.deliveries_per_over, players, innings, seed)
+
+        # Statistics of every point evaluated so far, keyed by the settings and the point's values
+        self.cache = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+
+        self.best = None
+        self.best_loss = None
+
+    def _key(self, point: dict):
+        return self.settings + tuple(point[name] for name in CricketBrain.PARAMETERS)
+
+    def loss(self, stats: dict):
+        """Weighted sum of the squared relative differences between the statistics and the targets."""
+        total = 0.0
+        for name, target in self.targets.items():
+            scale = max(abs(target), _SCALE_FLOOR)
+            total += self.weights.get(name, 1.0) * ((stats[name] - target) / scale) ** 2
+        return total
+
+    def evaluate(self, points: list, executor=None):
+        """Statistics for each of the points, simulating only those that aren't in the cache."""
+        keys = [self._key(point) for point in points]
+        missing = []
+        for key in keys:
+            if key in self.cache or key in missing:
+                self.cache_hits += 1
+            else:
+                missing.append(key)
+
+        values = [key[len(self.settings):] for key in missing]
+        if executor is None:
+            _init_worker(self.settings)
+            results = map(_evaluate, values)
+        else:
+            results = executor.map(_evaluate, values)
+
+        for point_values, stats in results:
+            self.cache[self.settings + point_values] = stats
+            self.evaluations += 1
+
+        return [self.cache[key] for key in keys]
+
+    def _consider(self, points: list, executor):
+        """Evaluate the valid points and return the best one, its loss and its statistics."""
+        points = [point for point in points if is_valid(point)]
+        best = None
+        for point, stats in zip(points, self.evaluate(points, executor)):
+            loss = self.loss(stats)
+            if best is None or loss < best[1]:
+                best = (point, loss, stats)
+        return best
+
+    def search(self, start: dict = None, samples: int = 64, max_rounds: int = 100, tolerance: float = 1e-4):
+        """Find the parameters that best match the targets and return them.
+
+        The start point, CricketBrain's current constants if not given, and a number of random samples are
+        evaluated first. The best of them is refined by trying a step up and down in each tuned parameter, moving
+        to the best improvement or halving the steps when there isn't one, until the steps are down to the
+        search resolution, the loss is below tolerance or max_rounds is reached."""
+        if start is None:
+            start = CricketBrain.parameters()
+        current = round_point(dict(CricketBrain.parameters(), **start))
+
+        rng = CricketRandom(self.seed).child("samples")
+        points = [current]
+        for i in range(samples):
+            point = dict(current)
+            for name in self.tune:
+                low, high, resolution = SEARCH_SPACE[name]
+                point[name] = low + (high - low) * rng.random()
+            points.append(round_point(point))
+
+        steps = {name: (SEARCH_SPACE[name][1] - SEARCH_SPACE[name][0]) / 8 for name in self.tune}
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                           initargs=(self.settings,))
+        try:
+            best = self._consider(points, executor)
+            if best is None:
+                raise (Exception("No valid starting point for the calibration"))
+            current, loss, stats = best
+
+            for round_number in range(max_rounds):
+                logging.info("Calibration round %i: loss %.6f after %i evaluations" %
+                             (round_number, loss, self.evaluations))
+                if loss <= tolerance:
+                    break
+
+                neighbours = []
+                for name in self.tune:
+                    low, high, resolution = SEARCH_SPACE[name]
+                    for direction in (-1, 1):
+                        point = dict(current)
+                        point[name] = min(high, max(low, current[name] + direction * steps[name]))
+                        neighbours.append(round_point(point))
+
+                best = self._consider(neighbours, executor)
+                if best is not None and best[1] < loss:
+                    current, loss, stats = best
+                else:
+                    finished = True
+                    for name in self.tune:
+                        steps[name] /= 2
+                        if steps[name] >= SEARCH_SPACE[name][2]:
+                            finished = False
+                    if finished is True:
+                        break
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        self.best = current
+        self.best_loss = loss
+        return dict(current)
+
+    def validate(self, parameters: dict = None):
+        """Check the parameters and measure them on innings that the search didn't see."""
+        if parameters is None:
+            parameters = self.best
+        validate_parameters(parameters)
+        overs, deliveries_per_over, players, innings, seed = self.settings
+        return measure(parameters, overs, deliveries_per_over, players, innings,
+                       CricketRandom(seed).child("validate").root_seed)
+
+    def save(self, path: str, parameters: dict = None):
+        """Write the parameters, best found by default, with the targets and the statistics they achieve."""
+        if parameters is None:
+            parameters = self.best
+        save_parameters(path, parameters, self.targets, self.evaluate([round_point(parameters)])[0],
+                        self.validate(parameters))
+
+    def save_cache(self, path: str):
+        with open(path, "w") as cache_file:
+            json.dump([{"key": list(key), "stats": stats} for key, stats in self.cache.items()], cache_file)
+
+    def load_cache(self, path: str):
+        """Add the evaluations saved by save_cache(); ones for other formats are kept but won't be used."""
+        with open(path) as cache_file:
+            for entry in json.load(cache_file):
+                self.cache[tuple(entry["key"])] = entry["stats"]
+
+    def print(self, stats: dict = None):
+        if stats is None:
+            stats = self.evaluate([self.best])[0]
+        print("Statistic\t\tTarget\tAchieved")
+        for name in STATISTICS:
+            target = self.targets.get(name)
+            print("%-20s\t%s\t%7.3f" % (name, "%7.3f" % target if target is not None else "      -", stats[name]))
+        print("Loss %.6f after %i evaluations (%i from the cache)" % (self.loss(stats), self.evaluations,
+                                                                      self.cache_hits))
+
+
+def save_parameters(path: str, parameters: dict, targets: dict = None, achieved: dict = None,
+                    validation: dict = None):
+    """Write a checked set of CricketBrain constants to a JSON file that load_parameters() can read."""
+    validate_parameters(parameters)
+    data = {"version": FILE_VERSION,
+            "parameters": {name: parameters[name] for name in CricketBrain.PARAMETERS}}
+    if targets is not None:
+        data["targets"] = targets
+    if achieved is not None:
+        data["achieved"] = achieved
+    if validation is not None:
+        data["validation"] = validation
+
+    with open(path, "w") as parameters_file:
+        json.dump(data, parameters_file, indent=2)
+
+
+def load_parameters(path: str, configure: bool = True):
+    """Read and check the constants saved by save_parameters() and, unless configure is False, apply them."""
+    with open(path) as parameters_file:
+        data = json.load(parameters_file)
+
+    if data.get("version") != FILE_VERSION:
+        raise (Exception("Unsupported CricketBrain parameters version %s." % data.get("version")))
+
+    parameters = data["parameters"]
+    validate_parameters(parameters)
+    if configure is True:
+        CricketBrain.configure(**parameters)
+    return parameters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune CricketBrain's constants to match target statistics.")
+    for name in STATISTICS:
+        parser.add_argument("--" + name.replace("_", "-"), type=float, default=None, help="target per over")
+    parser.add_argument("--overs", type=int, default=20)
+    parser.add_argument("--deliveries-per-over", type=int, default=6)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--innings", type=int, default=1000, help="innings simulated for each point")
+    parser.add_argument("--samples", type=int, default=64, help="random points tried before refining")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--tune", nargs="+", default=None, help="parameters to change, default all of them")
+    parser.add_argument("--cache", help="JSON file of evaluations to reuse and add to")
+    parser.add_argument("--output", default="brain.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    targets = {}
+    for name in STATISTICS:
+        if getattr(args, name) is not None:
+            targets[name] = getattr(args, name)
+    if len(targets) == 0:
+        parser.error("give at least one target")
+
+    rules = CricketRules("Calibration")
+    rules.overs_per_innings = args.overs
+    rules.deliveries_per_over = args.deliveries_per_over
+
+    calibration = CricketCalibration(targets, rules, args.players, args.innings, args.seed, args.workers, args.tune)
+    if args.cache is not None and os.path.exists(args.cache):
+        calibration.load_cache(args.cache)
+
+    calibration.search(samples=args.samples, max_rounds=args.rounds)
+    calibration.print()
+    calibration.save(args.output)
+    if args.cache is not None:
+        calibration.save_cache(args.cache)
+
+    print("Saved to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+__author__ = 'user'
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pycricket import *
+
+# Searches for the batting order and bowling rotation that give a team the best expected margin against an opponent.
+#
+# A lineup is scored analytically with expected_score(), the mean of project_score(): the expected total the team
+# makes batting in that order against the opponent's bowling rotation, less the expected total the opponent makes
+# against the team's rotation.
+# The two halves are independent so the batting order and the bowling rotation are searched separately.
+#
+# Each search builds the order one position at a time, keeping a beam of the best partial orders. A partial order
+# is scored by completing it with the remaining players strongest first, so different partial orders often complete
+# to the same order and their evaluations are memoized. Candidates are pruned when they put a player ahead of
+# someone who is at least as good in every skill that matters, and when another partial order with the same
+# players placed scores better. Each position's candidates are evaluated together across a pool of worker
+# processes, and the best order found is then polished by trying every swap of two positions.
+
+
+# The batting and bowling sides' players, how many balls an innings has and how many balls an over has, set once
+# when each worker process starts
+_worker_sides = None
+_worker_balls = None
+_worker_per_over = None
+
+
+def _init_worker(sides: tuple, balls: int, per_over: int, parameters: dict = None):
+    global _worker_sides, _worker_balls, _worker_per_over
+    _worker_sides = sides
+    _worker_balls = balls
+    _worker_per_over = per_over
+
+    # Worker processes start with the default constants so use the same ones as the process that started them
+    if parameters is not None and parameters != CricketBrain.parameters():
+        CricketBrain.configure(**parameters)
+
+
+def _project(task: tuple):
+    """Expected total when side batting bats in batting_order against the other side's bowling_order."""
+    batting, batting_order, bowling_order = task
+    batsmen = [_worker_sides[batting][i] for i in batting_order]
+    bowlers = [_worker_sides[1 - batting][i] for i in bowling_order]
+    return task, expected_score(batsmen[:2], batsmen[2:], bowlers, 0, 0, _worker_balls, _worker_per_over)
+
+
+def _dominates(a: CricketPlayer, b: CricketPlayer, skills: tuple):
+    """True if a is at least as good as b in all of the skills and better in at least one."""
+    better = False
+    for skill in skills:
+        if a.skills[skill] < b.skills[skill]:
+            return False
+        if a.skills[skill] > b.skills[skill]:
+            better = True
+    return better
+
+
+class CricketLineup():
+    """A batting order and bowling rotation for a team and the totals they are expected to give."""
+
+    def __init__(self, team: CricketTeam, batting_order: list, bowling_order: list, runs_for: float,
+                 runs_against: float):
+        self.team = team
+        self.batting_order = batting_order
+        self.bowling_order = bowling_order
+
+        # Expected total when batting and when bowling, per innings
+        self.runs_for = runs_for
+        self.runs_against = runs_against
+
+    @property
+    def margin(self):
+        return self.runs_for - self.runs_against
+
+    def apply(self):
+        """Set the team's batting order and bowling rotation to this lineup's."""
+        self.team.batting_order = self.batting_order
+        self.team.bowling_order = self.bowling_order
+
+    def __str__(self):
+        return "Batting: %s\nBowling: %s\nExpected %.1f for, %.1f against, margin %+.1f" % (
+            ", ".join(str(player) for player in self.batting_order),
+            ", ".join(str(player) for player in self.bowling_order),
+            self.runs_for, self.runs_against, self.margin)
+
+
+class CricketLineupOptimizer():
+    """Finds a good batting order and bowling rotation for a team against an opponent's current orders.
+
+    bowlers is how many players the rotation should have, all of the team by default. A wider beam searches
+    more partial orders at each position. Skill bonuses earned during the innings are not modelled."""
+
+    BATTING_SKILLS = (CricketPlayer.BATTING, CricketPlayer.SPEED, CricketPlayer.LUCK)
+    BOWLING_SKILLS = (CricketPlayer.BOWLING, CricketPlayer.SPEED, CricketPlayer.LUCK)
+
+    def __init__(self, team: CricketTeam, opponent: CricketTeam, rules: CricketRules, bowlers: int = None,
+                 beam_width: int = 6, polish_rounds: int = 3, workers: int = None):
+        if team.players < 2 or opponent.players < 2:
+            raise (Exception("Both teams need at least 2 players"))
+
+        if bowlers is None:
+            bowlers = team.players
+        if bowlers < 1 or bowlers > team.players:
+            raise (Exception("The rotation must have between 1 and %i bowlers" % team.players))
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        self.team = team
+        self.opponent = opponent
+        self.rules = rules
+        self.bowlers = bowlers
+        self.beam_width = beam_width
+        self.polish_rounds = polish_rounds
+        self.workers = workers
+
+        # Copies of the players so that the teams, which may be pooled, aren't sent to the workers
+        self.sides = tuple([CricketPlayer(player.name, skills=dict(player.skills)) for player in side.list_players]
+                           for side in (team, opponent))
+        self.balls = rules.overs_per_innings * rules.deliveries_per_over
+
+        # The opponent's orders stay as they are, as positions in their team
+        self.opponent_batting = tuple(opponent.list_players.index(player) for player in opponent.batting_order)
+        self.opponent_bowling = tuple(opponent.list_players.index(player) for player in opponent.bowling_order)
+
+        # Expected totals of every (batting side, batting order, bowling order) evaluated so far
+        self.cache = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+
+        self.executor = None
+
+    def evaluate(self, tasks: list):
+        """Expected totals for each (batting side, batting order, bowling order), working out only new ones."""
+        missing = []
+        for task in tasks:
+            if task in self.cache or task in missing:
+                self.cache_hits += 1
+            else:
+                missing.append(task)
+
+        if self.executor is None:
+            _init_worker(self.sides, self.balls, self.rules.deliveries_per_over)
+            results = map(_project, missing)
+        else:
+            results = self.executor.map(_project, missing, chunksize=max(1, len(missing) // (self.workers * 4)))
+
+        for task, mean in results:
+            self.cache[task] = mean
+            self.evaluations += 1
+
+        return [self.cache[task] for task in tasks]
+
+    def _strength_order(self, batting: bool):
+        """The team's players strongest first, as a batsmen against the opponent's bowlers or as a bowler."""
+        team, opponent = self.sides
+        strengths = []
+        for i in range(len(team)):
+            total = 0.0
+            if batting is True:
+                for j in self.opponent_bowling:
+                    table = CricketBrain.outcome_table(team[i], opponent[j])
+                    total += table.expected_runs / max(table.wicket_probability, 1e-3)
+                strengths.append(total / len(self.opponent_bowling))
+            else:
+                for j in self.opponent_batting:
+                    table = CricketBrain.outcome_table(opponent[j], team[i])
+                    total += table.wicket_probability * 10 - table.expected_runs
+                strengths.append(total / len(self.opponent_batting))
+        return sorted(range(len(team)), key=lambda i: strengths[i], reverse=True)
+
+    def _task(self, batting: bool, order: tuple):
+        if batting is True:
+            return 0, order, self.opponent_bowling
+        return 1, self.opponent_batting, order
+
+    def _score(self, batting: bool, orders: list):
+        """Higher is better: runs made when batting and runs kept down when bowling."""
+        means = self.evaluate([self._task(batting, order) for order in orders])
+        if batting is True:
+            return means
+        return [-mean for mean in means]
+
+    def _search(self, batting: bool):
+        team = self.sides[0]
+        skills = CricketLineupOptimizer.BATTING_SKILLS if batting is True else CricketLineupOptimizer.BOWLING_SKILLS
+        length = len(team) if batting is True else self.bowlers
+        strongest = self._strength_order(batting)
+
+        def complete(prefix: tuple):
+            rest = [i for i in strongest if i not in prefix]
+            return prefix + tuple(rest[:length - len(prefix)])
+
+        beam = [()]
+        best_order = None
+        best_score = None
+        for position in range(length):
+            candidates = []
+            for prefix in beam:
+                remaining = [i for i in range(len(team)) if i not in prefix]
+                for i in remaining:
+                    # Never put a player in ahead of someone who is better in every way
+                    if any(_dominates(team[j], team[i], skills) for j in remaining if j != i):
+                        continue
+                    candidates.append(prefix + (i,))
+
+            completed = [complete(candidate) for candidate in candidates]
+            scores = self._score(batting, completed)
+
+            # Keep the best partial order for each set of players placed and then the best of those
+            best_by_players = {}
+            for candidate, order, score in zip(candidates, completed, scores):
+                players = frozenset(candidate)
+                if players not in best_by_players or score > best_by_players[players][1]:
+                    best_by_players[players] = (candidate, score)
+                if best_score is None or score > best_score:
+                    best_order, best_score = order, score
+
+            ranked = sorted(best_by_players.values(), key=lambda entry: entry[1], reverse=True)
+            beam = [candidate for candidate, score in ranked[:self.beam_width]]
+
+        # Try swapping every pair of positions, and bringing in each player not in the rotation, until nothing helps
+        for round_number in range(self.polish_rounds):
+            neighbours = []
+            for i in range(length):
+                for j in range(i + 1, length):
+                    order = list(best_order)
+                    order[i], order[j] = order[j], order[i]
+                    neighbours.append(tuple(order))
+                for j in range(len(team)):
+                    if j not in best_order:
+                        neighbours.append(best_order[:i] + (j,) + best_order[i + 1:])
+            if len(neighbours) == 0:
+                break
+
+            scores = self._score(batting, neighbours)
+            index = max(range(len(neighbours)), key=lambda k: scores[k])
+            if scores[index] <= best_score:
+                break
+            best_order, best_score = neighbours[index], scores[index]
+
+        return best_order, best_score
+
+    def current(self):
+        """The team's current lineup with its expected totals."""
+        batting = tuple(self.team.list_players.index(player) for player in self.team.batting_order)
+        bowling = tuple(self.team.list_players.index(player) for player in self.team.bowling_order)
+        runs_for, runs_against = self.evaluate([self._task(True, batting), self._task(False, bowling)])
+        return CricketLineup(self.team, self.team.batting_order, self.team.bowling_order, runs_for, runs_against)
+
+    def optimize(self):
+        """Search for the best batting order and bowling rotation and return them as a CricketLineup."""
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.sides, self.balls, self.rules.deliveries_per_over,
+                                                          CricketBrain.parameters()))
+        try:
+            batting, runs_for = self._search(True)
+            bowling, runs_against = self._search(False)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+        logging.info("Lineup optimized with %i evaluations and %i cache hits" % (self.evaluations, self.cache_hits))
+
+        players = self.team.list_players
+        return CricketLineup(self.team, [players[i] for i in batting], [players[i] for i in bowling], runs_for,
+                             -runs_against)
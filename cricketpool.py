@@ -0,0 +1,342 @@
+__author__ = 'user'
+
+from collections.abc import MutableMapping
+import numpy
+from pycricket import *
+
+# Array backed pools of players for leagues and seasons with many thousands of players.
+#
+# A pool keeps every player's skills in one contiguous matrix with a column for each of CricketPlayer.SKILLS,
+# alongside id and name columns, so whole squads or the whole league can be generated and analysed with NumPy.
+# The match engine still works with CricketPlayer objects: pool.player(id) gives a CricketPooledPlayer whose
+# skills read and write its row of the matrix, and a CricketPoolTeam's roster is just an array of rows.
+#
+# The matrix is read only outside the pool's own methods. Players keep their skills packed for CricketBrain, so
+# every write goes through the pool, which makes the players of the rows it changes re-pack them.
+
+# Skill distributions for generate(), each given as (kind, parameters...) and clipped to [0, 1] where they could
+# fall outside it
+UNIFORM = "uniform"     # (UNIFORM, low, high)
+NORMAL = "normal"       # (NORMAL, mean, standard deviation)
+BETA = "beta"           # (BETA, a, b)
+CONSTANT = "constant"   # (CONSTANT, value)
+
+# The same distribution as CricketPlayer gives its random skills
+DEFAULT_DISTRIBUTION = (UNIFORM, 0.0, 1.0)
+
+
+def sample_skills(rng: numpy.random.Generator, distribution: tuple, count: int):
+    """Draw count skill values from a distribution."""
+    kind = distribution[0]
+    if kind == UNIFORM:
+        return rng.uniform(distribution[1], distribution[2], count)
+    elif kind == NORMAL:
+        return numpy.clip(rng.normal(distribution[1], distribution[2], count), 0.0, 1.0)
+    elif kind == BETA:
+        return rng.beta(distribution[1], distribution[2], count)
+    elif kind == CONSTANT:
+        return numpy.full(count, float(distribution[1]))
+    else:
+        raise (Exception("Unknown skill distribution %s" % kind))
+
+
+class _PoolSkills(MutableMapping):
+    """A pooled player's skills dictionary, reading and writing the player's row of the pool's matrix."""
+
+    __slots__ = ("pool", "row")
+
+    def __init__(self, pool, row: int):
+        self.pool = pool
+        self.row = row
+
+    def __getitem__(self, skill: str):
+        return float(self.pool.skills[self.row, CricketPlayerPool.COLUMNS[skill]])
+
+    def __setitem__(self, skill: str, value: float):
+        self.pool._write(self.row, CricketPlayerPool.COLUMNS[skill], value)
+
+    def __delitem__(self, skill: str):
+        raise (Exception("Can't remove the %s skill of a pooled player" % skill))
+
+    def __iter__(self):
+        return iter(CricketPlayer.SKILLS)
+
+    def __len__(self):
+        return len(CricketPlayer.SKILLS)
+
+    def __contains__(self, skill):
+        return skill in CricketPlayerPool.COLUMNS
+
+
+class CricketPooledPlayer(CricketPlayer):
+    """A CricketPlayer whose skills are a row of a CricketPlayerPool; get these from the pool, not by creating them."""
+
+    __slots__ = ("pool", "row")
+
+    def __init__(self, pool, row: int):
+        self.pool = pool
+        self.row = row
+        self.name = pool.names[row]
+        self.skills = _PoolSkills(pool, row)
+        self._packed = None
+        self._packed_generation = None
+
+    @property
+    def id(self):
+        return int(self.pool.ids[self.row])
+
+    def award_bonus(self, skill: str, packed_index: int, multiplier: float, bonus: float):
+        """As CricketPlayer.award_bonus(), updating just the one term of the packed skills rather than re-packing."""
+        column = CricketPlayerPool.COLUMNS[skill]
+        value = float(self.pool.skills[self.row, column]) + bonus
+        self.pool._write(self.row, column, value, repack=False)
+        self._packed[packed_index] = value * multiplier
+
+    def skill_vector(self):
+        return self.pool.skills[self.row].tolist()
+
+
+class CricketPlayerPool():
+    """Skills, ids and names of many players held in contiguous arrays.
+
+    Players are stored in rows in the order they were added. Each has a unique id, allocated in sequence unless
+    one is given, which finds their row in constant time."""
+
+    # Column of each skill in the skills matrix, in CricketPlayer.SKILLS order as used by delivery_batch()
+    COLUMNS = {skill: i for i, skill in enumerate(CricketPlayer.SKILLS)}
+
+    def __init__(self, capacity: int = 1024):
+        capacity = max(capacity, 1)
+        self.skills = numpy.zeros((capacity, len(CricketPlayer.SKILLS)))
+        self.skills.flags.writeable = False
+        self.ids = numpy.zeros(capacity, dtype=numpy.int64)
+        self.names = []
+        self.count = 0
+        self.next_id = 1
+
+        # Row of each player id and the player objects handed out so far, by row
+        self._rows = {}
+        self._players = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        # Leave out the spare capacity and the player objects so that pools are quick to send to worker processes
+        state = dict(self.__dict__)
+        state["skills"] = self.skills[:self.count].copy()
+        state["ids"] = self.ids[:self.count].copy()
+        state["_players"] = {}
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+
+        # The unpickled matrix may not own its memory, and _write() can only make it writeable if it does
+        self.skills = numpy.array(self.skills)
+        self.skills.flags.writeable = False
+
+    def _reserve(self, extra: int):
+        """Make room for more players, at least doubling the capacity so that adding players stays cheap."""
+        needed = self.count + extra
+        capacity = self.skills.shape[0]
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            skills = numpy.zeros((capacity, len(CricketPlayer.SKILLS)))
+            skills[:self.count] = self.skills[:self.count]
+            skills.flags.writeable = False
+            ids = numpy.zeros(capacity, dtype=numpy.int64)
+            ids[:self.count] = self.ids[:self.count]
+            self.skills = skills
+            self.ids = ids
+
+    def _allocate_ids(self, count: int, ids=None):
+        if ids is None:
+            ids = numpy.arange(self.next_id, self.next_id + count, dtype=numpy.int64)
+        else:
+            ids = numpy.asarray(ids, dtype=numpy.int64)
+            if len(ids) != count:
+                raise (Exception("Expected %i player ids but got %i" % (count, len(ids))))
+            if len(numpy.unique(ids)) != count:
+                raise (Exception("Player ids must be unique"))
+
+        for player_id in ids.tolist():
+            if player_id in self._rows:
+                raise (Exception("There is already a player with id %i" % player_id))
+
+        if count > 0:
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+        return ids
+
+    def _append(self, names: list, skills, ids):
+        count = len(names)
+        ids = self._allocate_ids(count, ids)
+        self._reserve(count)
+
+        start = self.count
+        self._write(slice(start, start + count), slice(None), skills, repack=False)
+        self.ids[start:start + count] = ids
+        self.names.extend(names)
+        self._rows.update(zip(ids.tolist(), range(start, start + count)))
+        self.count += count
+        return range(start, start + count)
+
+    def add(self, name: str, skills: dict = None, player_id: int = None):
+        """Add one player, with random skills if none are given, and return their row."""
+        if skills is None:
+            skills = CricketPlayer(name).skills
+        vector = [skills[skill] for skill in CricketPlayer.SKILLS]
+        ids = None if player_id is None else [player_id]
+        return self._append([name], [vector], ids)[0]
+
+    def add_player(self, player: CricketPlayer, player_id: int = None):
+        """Copy an existing player into the pool and return their row."""
+        return self.add(player.name, player.skills, player_id)
+
+    def generate(self, count: int, distributions: dict = None, rng=None, name_format: str = "Player %i"):
+        """Add count new players with skills drawn from the distributions and return the range of their rows.
+
+        distributions maps skills to a distribution such as (NORMAL, 0.5, 0.15), with DEFAULT_DISTRIBUTION for
+        any skill not given. rng is a NumPy Generator or a seed for one. Names are made from name_format and
+        each player's id."""
+        if distributions is None:
+            distributions = {}
+        for skill in distributions:
+            if skill not in CricketPlayerPool.COLUMNS:
+                raise (Exception("Unknown skill %s" % skill))
+        if not isinstance(rng, numpy.random.Generator):
+            rng = numpy.random.default_rng(rng)
+
+        skills = numpy.empty((count, len(CricketPlayer.SKILLS)))
+        for skill, column in CricketPlayerPool.COLUMNS.items():
+            skills[:, column] = sample_skills(rng, distributions.get(skill, DEFAULT_DISTRIBUTION), count)
+
+        ids = self._allocate_ids(count)
+        names = [name_format % player_id for player_id in ids.tolist()]
+        return self._append(names, skills, ids)
+
+    def row(self, player_id: int):
+        row = self._rows.get(player_id)
+        if row is None:
+            raise (Exception("No player with id %i" % player_id))
+        return row
+
+    def player(self, player_id: int):
+        """The CricketPooledPlayer with the id; the same object is returned each time."""
+        return self.player_at(self.row(player_id))
+
+    def _check_row(self, row: int):
+        if row < 0 or row >= self.count:
+            raise (Exception("No player in row %i" % row))
+        return row
+
+    def player_at(self, row: int):
+        self._check_row(row)
+        player = self._players.get(row)
+        if player is None:
+            player = CricketPooledPlayer(self, row)
+            self._players[row] = player
+        return player
+
+    def _write(self, rows, columns, values, repack: bool = True):
+        """Write into the skills matrix, which is read only otherwise, and make the players of the rows re-pack their
+        skills the next time CricketBrain needs them."""
+        # Find the rows first so that rows outside the pool are rejected before anything is written
+        if not repack:
+            changed = ()
+        elif isinstance(rows, (int, numpy.integer)):
+            changed = (self._check_row(rows),)
+        else:
+            changed = numpy.atleast_1d(numpy.arange(self.count)[rows]).tolist()
+
+        skills = self.skills
+        skills.flags.writeable = True
+        try:
+            skills[rows, columns] = values
+        finally:
+            skills.flags.writeable = False
+
+        for row in changed:
+            player = self._players.get(row)
+            if player is not None:
+                player._packed_generation = None
+
+    @property
+    def skill_matrix(self):
+        """Read only view of every player's skills, one row per player in CricketPlayer.SKILLS order."""
+        return self.skills[:self.count]
+
+    def set_skill_matrix(self, values, rows=None):
+        """Set every skill of the rows, or of every player if none are given, e.g. from a changed skill_matrix."""
+        if rows is None:
+            rows = slice(0, self.count)
+        self._write(rows, slice(None), values)
+
+    def column(self, skill: str):
+        """Read only view of one skill of every player."""
+        return self.skills[:self.count, CricketPlayerPool.COLUMNS[skill]]
+
+    def set_column(self, skill: str, values, rows=None):
+        """Set one skill of the rows, or of every player if none are given, e.g. set_column(BATTING, 0.5)."""
+        if rows is None:
+            rows = slice(0, self.count)
+        self._write(rows, CricketPlayerPool.COLUMNS[skill], values)
+
+    def team(self, name: str, rows=None):
+        """A CricketPoolTeam made up of the rows, e.g. pool.team("Home", range(0, 11))."""
+        return CricketPoolTeam(name, self, rows)
+
+    def teams(self, names: list, size: int, start: int = 0):
+        """Split consecutive rows from start into a team of size players for each name."""
+        if start + len(names) * size > self.count:
+            raise (Exception("Not enough players in the pool for %i teams of %i" % (len(names), size)))
+        return [self.team(names[i], range(start + i * size, start + (i + 1) * size)) for i in range(len(names))]
+
+
+class CricketPoolTeam(CricketTeam):
+    """A team whose roster is an array of rows of a CricketPlayerPool rather than a list of player objects."""
+
+    def __init__(self, name: str, pool: CricketPlayerPool, rows=None):
+        self.name = name
+        self.pool = pool
+        if rows is None:
+            rows = ()
+        self.roster = numpy.asarray(rows, dtype=numpy.int64)
+        self._list_players = None
+        self._batting_order = None
+        self._bowling_order = None
+
+        if len(self.roster) > 0 and (self.roster.min() < 0 or self.roster.max() >= pool.count):
+            raise (Exception("Team %s has rows that aren't in the pool" % name))
+
+    @property
+    def list_players(self):
+        """The roster's pooled players, created the first time they are needed."""
+        if self._list_players is None:
+            self._list_players = [self.pool.player_at(row) for row in self.roster.tolist()]
+        return self._list_players
+
+    def add_player(self, new_player: CricketPlayer):
+        """Add a player from the pool to the roster; other players are copied into the pool first."""
+        logging.info("Trying to add player %s to team %s." % (new_player.name, self.name))
+        if isinstance(new_player, CricketPooledPlayer) and new_player.pool is self.pool:
+            row = new_player.row
+        else:
+            row = self.pool.add_player(new_player)
+        self.roster = numpy.append(self.roster, row)
+        self._list_players = None
+        if self._batting_order is not None:
+            self._batting_order.append(self.pool.player_at(row))
+
+    @property
+    def players(self):
+        return len(self.roster)
+
+    @property
+    def ids(self):
+        return self.pool.ids[self.roster]
+
+    @property
+    def skill_matrix(self):
+        """The roster's skills, one row per player in roster order."""
+        return self.pool.skills[self.roster]
@@ -0,0 +1,166 @@
+__author__ = 'user'
+
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import time
+from pycricket import *
+
+# Opt-in timing of the match engine's main phases.
+#
+# enable() wraps the methods in PHASES with counting timers and disable() puts the original methods back, so while
+# profiling is off the engine runs exactly the code it always does; cricketbench's bench_profile() measures the
+# engine before enable(), while enabled and after disable(). Timings are inclusive: CricketMatch.play's time includes
+# the CricketInnings.play and CricketOver.bowl calls it makes.
+
+# Phase name, class and attribute of each method that is timed
+PHASES = (("brain.delivery", CricketBrain, "delivery"),
+          ("over.bowl", CricketOver, "bowl"),
+          ("innings.bowl", CricketInnings, "bowl"),
+          ("innings.play", CricketInnings, "play"),
+          ("match.bowl", CricketMatch, "bowl"),
+          ("match.play", CricketMatch, "play"))
+
+# Calls to the logging module's functions are timed as one more phase. The functions themselves are wrapped, so the
+# time is that of the real calls, but it includes calls from outside the engine while profiling is on. Formatting
+# messages before the call is counted in the caller's phase.
+LOGGING = "logging"
+LOGGING_FUNCTIONS = ("debug", "info", "warning", "error")
+
+# Calls and nanoseconds for each phase
+_counters = {}
+
+# The original class attributes while profiling is on
+_originals = {}
+
+
+def _timed(counter: list, function):
+    perf_counter_ns = time.perf_counter_ns
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += perf_counter_ns() - start
+
+    return timed
+
+
+def _counter(phase: str):
+    counter = _counters.get(phase)
+    if counter is None:
+        counter = [0, 0]
+        _counters[phase] = counter
+    return counter
+
+
+def is_enabled():
+    return len(_originals) > 0
+
+
+def enable():
+    """Start timing the engine's phases; the counts carry on from where they were unless reset()."""
+    if is_enabled():
+        return
+
+    for phase, cls, name in PHASES:
+        original = cls.__dict__[name]
+        _originals[(cls, name)] = original
+        counter = _counter(phase)
+
+        if isinstance(original, staticmethod):
+            setattr(cls, name, staticmethod(_timed(counter, original.__func__)))
+        elif isinstance(original, property):
+            setattr(cls, name, property(_timed(counter, original.fget), original.fset, original.fdel,
+                                        original.__doc__))
+        else:
+            setattr(cls, name, _timed(counter, original))
+
+    counter = _counter(LOGGING)
+    for name in LOGGING_FUNCTIONS:
+        original = getattr(logging, name)
+        _originals[(logging, name)] = original
+        setattr(logging, name, _timed(counter, original))
+
+
+def disable():
+    """Stop timing and put the original methods back."""
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+
+
+def reset():
+    for counter in _counters.values():
+        counter[0] = 0
+        counter[1] = 0
+
+
+def stats():
+    """Calls, total seconds and mean microseconds per call of each phase that has been timed."""
+    results = {}
+    for phase, (calls, nanoseconds) in _counters.items():
+        results[phase] = {"calls": calls,
+                          "seconds": nanoseconds / 1e9,
+                          "mean_us": nanoseconds / calls / 1e3 if calls > 0 else 0.0}
+    return results
+
+
+def print_stats():
+    print("Phase\t\t\tCalls\tSeconds\tMean us")
+    for phase, result in sorted(stats().items(), key=lambda item: item[1]["seconds"], reverse=True):
+        print("%-20s\t%#8i\t%7.3f\t%7.2f" % (phase, result["calls"], result["seconds"], result["mean_us"]))
+
+
+def play_matches(matches: int, overs: int = 20, seed: int = 0):
+    """Auto-play a number of matches the same way cricketbench does."""
+    from cricketbench import make_match, play_match
+    for i in range(matches):
+        play_match(make_match(overs, seed + i))
+
+
+def capture(matches: int, tool: str = "cprofile", overs: int = 20, seed: int = 0, output: str = None):
+    """Auto-play a number of matches under cProfile or pyinstrument and return the profiler's report.
+
+    For cProfile the full statistics can also be saved to the output file for pstats or snakeviz."""
+    if tool == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            play_matches(matches, overs, seed)
+        finally:
+            profiler.disable()
+
+        if output is not None:
+            profiler.dump_stats(output)
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(25)
+        return report.getvalue()
+
+    elif tool == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise (Exception("pyinstrument is not installed."))
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            play_matches(matches, overs, seed)
+        finally:
+            profiler.stop()
+
+        if output is not None:
+            with open(output, "w") as output_file:
+                output_file.write(profiler.output_html())
+
+        return profiler.output_text()
+
+    else:
+        raise (Exception("Unknown profiler %s; use cprofile or pyinstrument." % tool))
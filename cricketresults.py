@@ -0,0 +1,437 @@
+__author__ = 'user'
+
+import numpy
+from pycricket import *
+
+# Ball by ball results of many matches held as NumPy columns, with indexes for answering questions like
+# "Keith's strike rate against Rosie in overs 15 to 20" without looping over the matches.
+#
+# Every delivery is a row. Players and teams are given ids when they are first seen, keyed by team name and player
+# name as in cricketstats. Innings, overs and balls are numbered from 1 as they are on the score card and in
+# cricketarchive.
+#
+# An index sorts the rows by its key and then by over, so the rows for a key are a contiguous run of the sorted
+# order and the rows for a key in a range of overs are a contiguous run within that. Indexes are built the first
+# time a query needs them and dropped whenever rows are added. A query takes the rows from whichever of its indexed
+# filters matches the fewest rows and only checks its other filters against those.
+
+COLUMNS = {"match": numpy.uint32,
+           "innings": numpy.uint8,
+           "over": numpy.uint16,
+           "ball": numpy.uint8,
+           "batter": numpy.int32,
+           "bowler": numpy.int32,
+           "type": numpy.int8,
+           "runs": numpy.int16}
+
+# Indexed filters; batter and bowler together use the pair index
+INDEXES = ("batter", "bowler", "pair", "batting_team", "bowling_team", "over", "type")
+
+# Groups that query results can be totalled by
+GROUPS = ("match", "innings", "over")
+
+
+class _Index():
+    """Rows sorted by a key and then by over, with where each key's run of rows starts."""
+
+    __slots__ = ("keys", "starts", "order", "overs")
+
+    def __init__(self, key, over):
+        # One sort of the key and over packed together is much quicker than sorting by each in turn
+        order = numpy.argsort(key.astype(numpy.int64) * 65536 + over)
+        if len(order) < 2 ** 32:
+            order = order.astype(numpy.uint32)
+        self.order = order
+        self.overs = over[order]
+        self.keys, starts = numpy.unique(key[order], return_index=True)
+        self.starts = numpy.append(starts, len(order))
+
+    def span(self, key: int, overs: tuple = None):
+        """Start and end positions in the sorted order of the rows with the key, optionally in a range of overs."""
+        i = numpy.searchsorted(self.keys, key)
+        if i >= len(self.keys) or self.keys[i] != key:
+            return 0, 0
+        start, end = int(self.starts[i]), int(self.starts[i + 1])
+        if overs is not None:
+            run = self.overs[start:end]
+            start, end = start + int(numpy.searchsorted(run, overs[0], "left")), \
+                         start + int(numpy.searchsorted(run, overs[1], "right"))
+        return start, end
+
+    def key_range(self, first: int, last: int):
+        """Start and end positions of the rows with keys from first to last, which is one run for the over index."""
+        return int(self.starts[numpy.searchsorted(self.keys, first, "left")]), \
+               int(self.starts[numpy.searchsorted(self.keys, last, "right")])
+
+
+def _values(value):
+    if isinstance(value, (list, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+class CricketQueryResult():
+    """The rows that matched a query, with aggregates over any of their columns."""
+
+    def __init__(self, store, rows):
+        self.store = store
+        self.rows = rows
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def column(self, name: str = "runs"):
+        """The values of a column for the matching rows."""
+        return self.store.column(name)[self.rows]
+
+    def sum(self, column: str = "runs"):
+        return int(self.column(column).sum(dtype=numpy.int64))
+
+    def mean(self, column: str = "runs"):
+        if self.count == 0:
+            return 0.0
+        return float(self.column(column).mean(dtype=numpy.float64))
+
+    def totals(self, column: str = "runs", by: str = "innings"):
+        """The sum of the column for each match, innings or over that has matching rows."""
+        if by not in GROUPS:
+            raise (Exception("Can't total by %s; use one of %s" % (by, ", ".join(GROUPS))))
+
+        group = self.store.column("match")[self.rows].astype(numpy.int64)
+        if by != "match":
+            group = group * 256 + self.store.column("innings")[self.rows]
+        if by == "over":
+            group = group * 65536 + self.store.column("over")[self.rows]
+
+        groups, inverse = numpy.unique(group, return_inverse=True)
+        return numpy.bincount(inverse, weights=self.column(column), minlength=len(groups))
+
+    def percentile(self, percent, column: str = "runs", by: str = None):
+        """Percentiles of the column, or of its totals for each match, innings or over if by is given.
+
+        percent can be a single value or a list of them."""
+        values = self.column(column) if by is None else self.totals(column, by)
+        if len(values) == 0:
+            return None
+        result = numpy.percentile(values, percent)
+        return result.tolist() if numpy.ndim(result) > 0 else float(result)
+
+    @property
+    def strike_rate(self):
+        """Runs per 100 balls, for queries about a batter."""
+        if self.count == 0:
+            return 0.0
+        return self.sum("runs") * 100 / self.count
+
+
+class CricketResultsStore():
+    """Every delivery of many matches, with indexes by player, batter and bowler pair, team, over and type."""
+
+    def __init__(self):
+        self.count = 0
+        self.next_match_id = 1
+
+        # Names of the teams and of the players with the id of their team
+        self.team_names = []
+        self.player_names = []
+        self.player_teams = []
+        self._team_ids = {}
+        self._player_ids = {}
+
+        # Rows are added in chunks that are joined into one array per column when the columns are next needed
+        self._chunks = {name: [] for name in COLUMNS}
+        self._columns = None
+        self._indexes = {}
+
+        # Matches subscribed to and their callbacks
+        self.subscriptions = {}
+
+    def __len__(self):
+        return self.count
+
+    def team_id(self, team_name: str):
+        team_id = self._team_ids.get(team_name)
+        if team_id is None:
+            team_id = len(self.team_names)
+            self.team_names.append(team_name)
+            self._team_ids[team_name] = team_id
+        return team_id
+
+    def player_id(self, team_name: str, player_name: str):
+        key = (team_name, player_name)
+        player_id = self._player_ids.get(key)
+        if player_id is None:
+            player_id = len(self.player_names)
+            self.player_names.append(player_name)
+            self.player_teams.append(self.team_id(team_name))
+            self._player_ids[key] = player_id
+        return player_id
+
+    def _append(self, columns: dict):
+        """Add rows given as an array for each of COLUMNS."""
+        length = len(columns["match"])
+        if length == 0:
+            return
+        for name, dtype in COLUMNS.items():
+            self._chunks[name].append(numpy.asarray(columns[name], dtype=dtype))
+        self.count += length
+        self._columns = None
+        self._indexes = {}
+
+    def new_match_id(self):
+        match_id = self.next_match_id
+        self.next_match_id += 1
+        return match_id
+
+    def add_innings(self, match_id: int, innings_number: int, innings: CricketInnings):
+        """Add every delivery of an innings."""
+        log = innings.log
+        count = len(log)
+        if count == 0:
+            return
+
+        batting = innings.batting_team.name
+        bowling = innings.bowling_team.name
+        batters = numpy.array([self.player_id(batting, player.name) for player in log.batting_players],
+                              dtype=numpy.int32)
+        bowlers = numpy.array([self.player_id(bowling, player.name) for player in log.bowling_players],
+                              dtype=numpy.int32)
+
+        overs = numpy.frombuffer(log.overs, dtype=numpy.uint16)
+        over_starts = numpy.zeros(int(overs.max()) + 1, dtype=numpy.int64)
+        for over in innings.overs:
+            over_starts[over.number] = over.start
+
+        self._append({"match": numpy.full(count, match_id),
+                      "innings": numpy.full(count, innings_number),
+                      "over": overs + 1,
+                      "ball": numpy.arange(count) - over_starts[overs] + 1,
+                      "batter": batters[numpy.frombuffer(log.batsmen, dtype=numpy.uint16)],
+                      "bowler": bowlers[numpy.frombuffer(log.bowlers, dtype=numpy.uint16)],
+                      "type": numpy.frombuffer(log.types, dtype=numpy.int8),
+                      "runs": numpy.frombuffer(log.runs, dtype=numpy.int16)})
+
+    def add_match(self, match: CricketMatch, match_id: int = None):
+        """Add every delivery of every innings of a match and return the match id they were given."""
+        if match_id is None:
+            match_id = self.new_match_id()
+        for i in range(len(match.innings)):
+            self.add_innings(match_id, i + 1, match.innings[i])
+        return match_id
+
+    def subscribe(self, match: CricketMatch, match_id: int = None):
+        """Add each innings of a match as soon as it is completed and return the match id they will be given.
+
+        The store unsubscribes itself when the match is over."""
+        if match_id is None:
+            match_id = self.new_match_id()
+
+        def on_innings_complete(innings: CricketInnings):
+            self.add_innings(match_id, match.innings.index(innings) + 1, innings)
+
+        def on_match_complete(match: CricketMatch):
+            self.unsubscribe(match)
+
+        match.subscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.subscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+        self.subscriptions[match] = (on_innings_complete, on_match_complete)
+        return match_id
+
+    def unsubscribe(self, match: CricketMatch):
+        on_innings_complete, on_match_complete = self.subscriptions.pop(match)
+        match.unsubscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.unsubscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+
+    def load_archive(self, reader, teams: tuple = None):
+        """Add every record of a cricketarchive.CricketArchiveReader.
+
+        The archive only has players' positions in their teams, so give teams as the (team batting first, team
+        bowling first) of every match in it to know who they are; otherwise they are named by side and position.
+        Match ids are moved on past the ones already in the store. Returns how many records were added."""
+        records = reader.records()
+        if len(records) == 0:
+            return 0
+
+        innings = records["innings"]
+        side = (innings.astype(numpy.int64) - 1) % 2
+        players = int(max(records["batter"].max(), records["bowler"].max())) + 1
+
+        # Work out the id of each position in each side, batting first and then bowling first
+        ids = numpy.zeros((2, players), dtype=numpy.int32)
+        for s in range(2):
+            if teams is not None:
+                team = teams[s]
+                if team.players < players:
+                    raise (Exception("Team %s has %i players but the archive has %i" % (team, team.players, players)))
+                for p in range(players):
+                    ids[s, p] = self.player_id(team.name, team.list_players[p].name)
+            else:
+                for p in range(players):
+                    ids[s, p] = self.player_id("Side %i" % (s + 1), "Player %i" % (p + 1))
+
+        offset = self.next_match_id - 1
+        match = records["match"].astype(numpy.int64) + offset
+        self.next_match_id = int(match.max()) + 1
+
+        # Copy the columns so that nothing is left pointing into the reader's mapping once it is closed
+        self._append({"match": match,
+                      "innings": innings.astype(COLUMNS["innings"]),
+                      "over": records["over"].astype(COLUMNS["over"]),
+                      "ball": records["ball"].astype(COLUMNS["ball"]),
+                      "batter": ids[side, records["batter"]],
+                      "bowler": ids[1 - side, records["bowler"]],
+                      "type": records["type"].astype(COLUMNS["type"]),
+                      "runs": records["runs"].astype(COLUMNS["runs"])})
+        return len(records)
+
+    def column(self, name: str):
+        """One of COLUMNS for every row, or batting_team or bowling_team."""
+        if name == "batting_team":
+            return numpy.asarray(self.player_teams, dtype=numpy.int32)[self.column("batter")]
+        if name == "bowling_team":
+            return numpy.asarray(self.player_teams, dtype=numpy.int32)[self.column("bowler")]
+
+        if self._columns is None:
+            self._columns = {}
+            for column, chunks in self._chunks.items():
+                if len(chunks) == 0:
+                    joined = numpy.zeros(0, dtype=COLUMNS[column])
+                elif len(chunks) == 1:
+                    joined = chunks[0]
+                else:
+                    joined = numpy.concatenate(chunks)
+                self._chunks[column] = [joined]
+                self._columns[column] = joined
+        return self._columns[name]
+
+    def index(self, name: str):
+        """One of INDEXES, built the first time it is needed."""
+        index = self._indexes.get(name)
+        if index is None:
+            if name == "pair":
+                key = self.column("batter").astype(numpy.int64) * len(self.player_names) + self.column("bowler")
+            elif name in INDEXES:
+                key = self.column(name)
+            else:
+                raise (Exception("There is no %s index" % name))
+            index = _Index(key, self.column("over"))
+            self._indexes[name] = index
+        return index
+
+    def build_indexes(self, names: tuple = INDEXES):
+        """Build indexes up front so that the first queries to need them are as quick as the rest."""
+        for name in names:
+            self.index(name)
+
+    def _player_filter(self, value):
+        """Player ids from an id, a (team name, player name) or a player name that only one team has."""
+        ids = []
+        for player in _values(value):
+            if isinstance(player, tuple):
+                player_id = self._player_ids.get(player)
+                if player_id is None:
+                    raise (Exception("No player %s in team %s" % (player[1], player[0])))
+                ids.append(player_id)
+            elif isinstance(player, str):
+                matches = [i for i in range(len(self.player_names)) if self.player_names[i] == player]
+                if len(matches) != 1:
+                    raise (Exception("%s players called %s; give (team name, player name) instead" %
+                                     ("No" if len(matches) == 0 else "Several", player)))
+                ids.append(matches[0])
+            else:
+                ids.append(int(player))
+        return ids
+
+    def _team_filter(self, value):
+        ids = []
+        for team in _values(value):
+            if isinstance(team, str):
+                if team not in self._team_ids:
+                    raise (Exception("No team %s" % team))
+                ids.append(self._team_ids[team])
+            else:
+                ids.append(int(team))
+        return ids
+
+    def query(self, batter=None, bowler=None, batting_team=None, bowling_team=None, over=None, type=None,
+              match=None, innings=None):
+        """Find the rows that match every filter given and return them as a CricketQueryResult.
+
+        Each filter can be a single value or a list of values to match any of. Players are ids, names or
+        (team name, player name), teams are ids or names, over is an over number or an inclusive (first, last)
+        range and type is a CricketDelivery type. match and innings aren't indexed so are only checked
+        against the rows found with the other filters."""
+        filters = {}
+        if batter is not None:
+            filters["batter"] = self._player_filter(batter)
+        if bowler is not None:
+            filters["bowler"] = self._player_filter(bowler)
+        if batting_team is not None:
+            filters["batting_team"] = self._team_filter(batting_team)
+        if bowling_team is not None:
+            filters["bowling_team"] = self._team_filter(bowling_team)
+        if type is not None:
+            filters["type"] = _values(type)
+        if match is not None:
+            filters["match"] = _values(match)
+        if innings is not None:
+            filters["innings"] = _values(innings)
+
+        overs = None
+        if over is not None:
+            overs = tuple(over) if isinstance(over, (tuple, list, range)) else (over, over)
+            if isinstance(over, range):
+                overs = (over.start, over.stop - 1)
+
+        # Indexed filters from the most selective: the batter and bowler pair, either player, either team, the
+        # overs and then the delivery type. Only the filters of the first of these that the query has are compared,
+        # taking whichever matches the fewest rows, so a query never builds indexes it is unlikely to use.
+        plans = []
+        if "batter" in filters and "bowler" in filters:
+            keys = [batter_id * len(self.player_names) + bowler_id
+                    for batter_id in filters["batter"] for bowler_id in filters["bowler"]]
+            plans.append(("pair", keys, ("batter", "bowler")))
+        else:
+            for tier in (("batter", "bowler"), ("batting_team", "bowling_team")):
+                plans = [(name, filters[name], (name,)) for name in tier if name in filters]
+                if len(plans) > 0:
+                    break
+        if len(plans) == 0 and overs is None and "type" in filters:
+            plans.append(("type", filters["type"], ("type",)))
+
+        best = None
+        for name, keys, covers in plans:
+            index = self.index(name)
+            spans = [index.span(key, overs) for key in keys]
+            size = sum(end - start for start, end in spans)
+            if best is None or size < best[0]:
+                best = (size, index, spans, covers)
+        if best is None and overs is not None:
+            index = self.index("over")
+            best = (0, index, [index.key_range(overs[0], overs[1])], ())
+
+        # Every index narrows its rows down to the overs, so only the other filters are left to check
+        if best is None:
+            rows = numpy.arange(self.count)
+            covered = ()
+        else:
+            size, index, spans, covered = best
+            parts = [index.order[start:end] for start, end in spans if end > start]
+            rows = numpy.concatenate(parts) if len(parts) > 0 else numpy.zeros(0, dtype=index.order.dtype)
+
+        mask = None
+        for name, values in filters.items():
+            if name in covered or len(rows) == 0:
+                continue
+            if name == "batting_team" or name == "bowling_team":
+                player = self.column("batter" if name == "batting_team" else "bowler")[rows]
+                column = numpy.asarray(self.player_teams, dtype=numpy.int32)[player]
+            else:
+                column = self.column(name)[rows]
+            matches = numpy.isin(column, values)
+            mask = matches if mask is None else mask & matches
+
+        if mask is not None:
+            rows = rows[mask]
+        return CricketQueryResult(self, rows)
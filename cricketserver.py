@@ -0,0 +1,218 @@
+__author__ = 'user'
+
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+from kwutils import *
+from pycricket import *
+from CricketCLI import CricketCLI, CricketConsole
+from main import new_match
+
+# Line protocol server that lets many people play their own match at the same time.
+#
+# Each connection is a session with its own CricketMatch. Commands are the same as CricketCLI's and are sent one
+# per line; everything the command prints is sent back followed by the prompt line. Matches are played
+# synchronously in between reads, so a command's output is captured by redirecting stdout while it runs.
+
+
+class CricketSession():
+    """One connection's match and the queue of commands waiting to be played in it."""
+
+    def __init__(self, match: CricketMatch, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 max_queue: int = 16):
+        self.match = match
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+        # When the queue is full the session stops reading from its connection until it catches up
+        self.commands = asyncio.Queue(maxsize=max_queue)
+        self.output = []
+
+        self.console = CricketConsole(match)
+        self.console.subscribe()
+
+    def print(self, text: str = ""):
+        self.output.append(text)
+
+    async def input(self, prompt: str):
+        """Send the prompt and wait for the next line from the connection."""
+        self.print(prompt)
+        await self.flush()
+        line = await self.commands.get()
+        if line is None:
+            raise (Exception("Session closed."))
+        return line
+
+    async def flush(self):
+        if len(self.output) > 0:
+            self.writer.write(("\n".join(self.output) + "\n").encode())
+            self.output.clear()
+
+            # Wait if the connection isn't keeping up with what it is being sent
+            await self.writer.drain()
+
+    def call(self, function, *args):
+        """Call a function that prints with its output going to the session, printing any exception it raises."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                function(*args)
+            except Exception as err:
+                print(str(err))
+        text = output.getvalue()
+        if len(text) > 0:
+            self.print(text.rstrip("\n"))
+
+    async def read_commands(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if len(line) == 0:
+                    break
+                await self.commands.put(line.decode(errors="replace").strip())
+        except (ConnectionError, ValueError) as err:
+            logging.info("Session read failed: %s" % err)
+        finally:
+            await self.commands.put(None)
+
+    async def run(self):
+        reading = asyncio.create_task(self.read_commands())
+        try:
+            self.print(CricketCLI.intro)
+            while not self.closed:
+                line = await self.input(CricketCLI.prompt)
+                await self.execute(line)
+        except Exception as err:
+            logging.info("Session ended: %s" % err)
+        finally:
+            self.console.unsubscribe()
+            reading.cancel()
+
+    async def execute(self, line: str):
+        if len(line) == 0:
+            return
+
+        command, _, arg = line.partition(" ")
+        handler = getattr(self, "do_" + command, None)
+        if handler is None:
+            self.print("*** Unknown syntax: %s" % line)
+            return
+
+        try:
+            await handler(arg.strip())
+        except Exception as err:
+            self.print(str(err))
+
+    async def do_help(self, arg):
+        commands = [name[3:] for name in dir(self) if name.startswith("do_")]
+        self.print("Commands: %s" % " ".join(commands))
+
+    async def do_quit(self, arg):
+        if await confirm_async("Are you sure you want to quit?", self):
+            self.closed = True
+
+    async def do_start(self, arg):
+        batting_team = await pick_async("Batting side", self.match.list_teams, self)
+        self.call(self.match.start, batting_team)
+
+    def _auto(self, loops: int):
+        for i in range(loops):
+            self.match.bowl(self.match.auto_delivery())
+
+    async def do_auto(self, arg):
+        if self.match.current_innings is None:
+            raise (Exception("The match hasn't started yet."))
+
+        if is_numeric(arg):
+            loops = int(arg)
+        else:
+            loops = 1
+
+        self.call(self._auto, loops)
+
+    async def do_bowl(self, arg):
+        type_id, runs_arg = CricketDelivery.parse_command(arg)
+        if type_id is None:
+            type = await pick_async("delivery", CricketDelivery.DESCRIPTION, self)
+            type_id = CricketDelivery.DESCRIPTION.index(type)
+
+        runs = CricketRules.runs(type_id)
+        if runs == CricketRules.RUNS:
+            if runs_arg is not None:
+                runs = runs_arg
+            else:
+                runs = await pick_async("Runs", (1, 2, 3, 4, 5, 6, 0), self)
+
+        self.call(self.match.bowl, CricketDelivery(type_id, runs))
+
+    async def do_score(self, arg):
+        self.call(self.match.score_card)
+
+    async def do_print(self, arg):
+        self.call(self.match.print)
+
+
+class CricketServer():
+    """Accepts connections and plays a session for each one, all in the one event loop."""
+
+    def __init__(self, match_factory=new_match, max_queue: int = 16, max_sessions: int = None):
+        self.match_factory = match_factory
+        self.max_queue = max_queue
+        self.max_sessions = max_sessions
+        self.sessions = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+                writer.write(b"Sorry, the server is full.\n")
+                await writer.drain()
+                return
+
+            session = CricketSession(self.match_factory(), reader, writer, self.max_queue)
+            self.sessions.add(session)
+            try:
+                await session.run()
+                await session.flush()
+            finally:
+                self.sessions.discard(session)
+
+        except ConnectionError as err:
+            logging.info("Connection lost: %s" % err)
+
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8023, backlog: int = 1024):
+        """Start listening and return the asyncio server.
+
+        The backlog is how many connections can be waiting to be accepted; asyncio's default of 100 makes
+        clients wait for connection retries when many sessions start at once."""
+        return await asyncio.start_server(self.handle, host, port, backlog=backlog)
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8023, backlog: int = 1024):
+        server = await self.start(host, port, backlog)
+        logging.info("PyCricket server listening on %s" %
+                     ", ".join(str(socket.getsockname()) for socket in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PyCricket matches over a line protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--max-sessions", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=16, help="commands each session can have waiting")
+    parser.add_argument("--backlog", type=int, default=1024, help="connections that can be waiting to be accepted")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = CricketServer(max_queue=args.max_queue, max_sessions=args.max_sessions)
+    asyncio.run(server.serve_forever(args.host, args.port, args.backlog))
+
+
+if __name__ == '__main__':
+    main()
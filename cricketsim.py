@@ -0,0 +1,322 @@
+__author__ = 'user'
+
+import random
+from pycricket import *
+
+
+class CricketMatchResult():
+    """Compact result of a simulated match: the score of every innings and who won."""
+
+    def __init__(self, team_names: tuple, innings: list, seed=None):
+        # Names of the team batting first and the team bowling first
+        self.team_names = team_names
+
+        # (team index, runs, wickets, balls) for each innings in the order they were played
+        self.innings = innings
+
+        self.seed = seed
+
+        self.totals = [0, 0]
+        for team, runs, wickets, balls in innings:
+            self.totals[team] += runs
+
+    @property
+    def winner(self):
+        """Index of the winning team or None if the match was tied."""
+        if self.totals[0] > self.totals[1]:
+            return 0
+        elif self.totals[1] > self.totals[0]:
+            return 1
+        else:
+            return None
+
+    @property
+    def margin(self):
+        return self.totals[0] - self.totals[1]
+
+    def __str__(self):
+        description = "%s %i v %s %i" % (self.team_names[0], self.totals[0], self.team_names[1], self.totals[1])
+        if self.winner is None:
+            description += ": match tied"
+        else:
+            description += ": %s won" % self.team_names[self.winner]
+        return description
+
+
+# Key in simulate_innings() counts for the shots of BOUNDARY_RUNS or more
+BOUNDARIES = "boundaries"
+BOUNDARY_RUNS = 4
+
+
+def simulate_innings(batting: list, bowling: list, max_balls: int, deliveries_per_over: int, rng: random.Random,
+                     counts: dict = None):
+    """Play out an innings ball by ball with CricketBrain's delivery model and nothing else.
+
+    batting and bowling are lists of CricketPlayers in batting order and bowling rotation order, who are given
+    their skill bonuses as the innings goes on. The innings is played just as CricketInnings plays it, so with the
+    same players and random number stream it gives the same deliveries.
+    If counts is given the number of wides, no balls, wickets, shots and boundaries are added to it, keyed by
+    delivery type and BOUNDARIES.
+    Returns runs, wickets and balls bowled."""
+
+    # Look everything up once rather than on every ball
+    rand = rng.random
+    delivery = CricketBrain.fast_delivery
+
+    all_out = len(batting) - 1
+    striker = batting[0]
+    non_striker = batting[1]
+    next_in = 2
+
+    runs = 0
+    wickets = 0
+    balls = 0
+    bowler_index = 0
+    bowler = bowling[0]
+    shots = 0
+    boundaries = 0
+    no_balls = 0
+    wides = 0
+
+    while balls < max_balls and wickets < all_out:
+
+        # Start of a new over: next bowler and swap the batsmen ends
+        if balls > 0 and balls % deliveries_per_over == 0:
+            bowler_index = (bowler_index + 1) % len(bowling)
+            bowler = bowling[bowler_index]
+            striker, non_striker = non_striker, striker
+
+        balls += 1
+        type, delivery_runs = delivery(striker, bowler, rand)
+        runs += delivery_runs
+
+        if type == CricketDelivery.RUNS:
+            shots += 1
+            if delivery_runs >= BOUNDARY_RUNS:
+                boundaries += 1
+            if delivery_runs % 2 > 0:
+                striker, non_striker = non_striker, striker
+
+        elif type == CricketDelivery.WICKET:
+            wickets += 1
+            if next_in < len(batting):
+                striker = batting[next_in]
+                next_in += 1
+
+        elif type == CricketDelivery.NO_BALL:
+            no_balls += 1
+
+        elif type == CricketDelivery.WIDE:
+            wides += 1
+
+    if counts is not None:
+        for key, count in ((CricketDelivery.WIDE, wides), (CricketDelivery.NO_BALL, no_balls),
+                           (CricketDelivery.WICKET, wickets), (CricketDelivery.RUNS, shots), (BOUNDARIES, boundaries)):
+            counts[key] = counts.get(key, 0) + count
+
+    return runs, wickets, balls
+
+
+def simulate_match(rules: CricketRules, team_a: CricketTeam, team_b: CricketTeam, seed=None, rng=None):
+    """Play a whole match between two teams with no output and no prompts; team_a bats first.
+
+    Gives the same innings as a CricketMatch with the same seed started with team_a batting and played with
+    auto_delivery() for every ball. Each innings' luck is drawn from its own child of rng, or of a CricketRandom
+    for the seed, as in CricketMatch. The players are copied at the start so the teams are left unchanged and
+    every simulated match starts from the same skills. The teams are checked with rules.check_team() as
+    CricketMatch.start() does. Returns a CricketMatchResult."""
+
+    if rng is None:
+        rng = CricketRandom(seed)
+        seed = rng.root_seed
+
+    teams = (team_a, team_b)
+    batting_orders = []
+    bowling_orders = []
+    for team in teams:
+        rules.check_team(team)
+
+        # A player's copy is in both their batting and bowling orders so bonuses carry over between innings
+        copies = {}
+        for player in team.list_players:
+            copies[player] = CricketPlayer(player.name, skills=player.skills)
+        batting_orders.append([copies[player] for player in team.batting_order])
+        bowling_orders.append([copies[player] for player in team.bowling_order])
+
+    max_balls = rules.balls_per_innings
+
+    innings = []
+    for i in range(rules.innings * 2):
+        batting_team = i % 2
+        runs, wickets, balls = simulate_innings(batting_orders[batting_team], bowling_orders[1 - batting_team],
+                                                max_balls, rules.deliveries_per_over, rng.child("innings", i))
+        innings.append((batting_team, runs, wickets, balls))
+
+    return CricketMatchResult((team_a.name, team_b.name), innings, seed)
+
+
+def simulate_innings_batch(skills, batting_order, batting_players, bowling_order, bowlers, max_balls: int,
+                           deliveries_per_over: int, rng, counts: dict = None):
+    """Play out one innings in each of many matches at once with CricketBrain.delivery_batch().
+
+    skills is an array of shape (matches, players, len(CricketPlayer.SKILLS)) of every player's skill vector in
+    each match, which is given the skill bonuses. batting_order and bowling_order are arrays of positions in skills,
+    with batting_players and bowlers saying how many of each match's row are used. rng is a NumPy Generator.
+    The innings are played by the same rules as simulate_innings() and counts is added to in the same way.
+    Returns arrays of runs, wickets and balls bowled."""
+
+    import numpy
+
+    matches, width = skills.shape[0], skills.shape[1]
+    bowling_skill = CricketPlayer.SKILLS.index(CricketPlayer.BOWLING)
+    batting_skill = CricketPlayer.SKILLS.index(CricketPlayer.BATTING)
+    bonus = CricketBrain.SKILL_BONUS
+
+    # Every player of every match is a row of flat so that a ball's players are picked out with one take()
+    flat = skills.reshape(matches * width, skills.shape[2])
+
+    runs = numpy.zeros(matches, dtype=numpy.int64)
+    wickets = numpy.zeros(matches, dtype=numpy.int64)
+    balls = numpy.zeros(matches, dtype=numpy.int64)
+
+    # The state of the matches whose innings is still going, dropping each match as its innings finishes
+    lane = numpy.arange(matches)
+    base = lane * width
+    batting_order = numpy.asarray(batting_order) + base[:, numpy.newaxis]
+    bowling_order = numpy.asarray(bowling_order) + base[:, numpy.newaxis]
+    batting_players = numpy.asarray(batting_players)
+    bowlers = numpy.asarray(bowlers)
+    striker = numpy.zeros(matches, dtype=numpy.intp)
+    non_striker = numpy.ones(matches, dtype=numpy.intp)
+    next_in = numpy.full(matches, 2, dtype=numpy.intp)
+    bowler = numpy.zeros(matches, dtype=numpy.intp)
+    lane_runs = numpy.zeros(matches, dtype=numpy.int64)
+    lane_wickets = numpy.zeros(matches, dtype=numpy.int64)
+    rows = numpy.arange(matches)
+
+    ball = 0
+    while len(lane) > 0:
+
+        # Start of a new over: next bowler and swap the batsmen ends. Every match still going has bowled the
+        # same number of balls so they all start a new over together.
+        if ball > 0 and ball % deliveries_per_over == 0:
+            bowler = (bowler + 1) % bowlers
+            striker, non_striker = non_striker, striker
+
+        ball += 1
+        batsmen = batting_order[rows, striker]
+        bowling = bowling_order[rows, bowler]
+        types, delivery_runs, bowler_bonuses, batsmen_bonuses = CricketBrain.delivery_batch(
+            flat.take(batsmen, axis=0), flat.take(bowling, axis=0), rng, True)
+
+        flat[bowling, bowling_skill] += bowler_bonuses * bonus
+        flat[batsmen, batting_skill] += batsmen_bonuses * bonus
+        lane_runs += delivery_runs
+
+        shot = types == CricketDelivery.RUNS
+        swap = shot & (delivery_runs % 2 > 0)
+        striker, non_striker = numpy.where(swap, non_striker, striker), numpy.where(swap, striker, non_striker)
+
+        wicket = types == CricketDelivery.WICKET
+        lane_wickets += wicket
+        incoming = wicket & (next_in < batting_players)
+        striker = numpy.where(incoming, next_in, striker)
+        next_in += incoming
+
+        if counts is not None:
+            for key, count in ((CricketDelivery.WIDE, types == CricketDelivery.WIDE),
+                               (CricketDelivery.NO_BALL, types == CricketDelivery.NO_BALL),
+                               (CricketDelivery.WICKET, wicket), (CricketDelivery.RUNS, shot),
+                               (BOUNDARIES, shot & (delivery_runs >= BOUNDARY_RUNS))):
+                counts[key] = counts.get(key, 0) + int(numpy.count_nonzero(count))
+
+        # Record the matches whose innings has finished and carry on with the rest
+        going = lane_wickets < batting_players - 1
+        if ball >= max_balls:
+            going[:] = False
+        if not going.all():
+            done = ~going
+            runs[lane[done]] = lane_runs[done]
+            wickets[lane[done]] = lane_wickets[done]
+            balls[lane[done]] = ball
+            lane, batting_order, bowling_order, batting_players, bowlers, striker, non_striker, next_in, bowler, \
+                lane_runs, lane_wickets = (values[going] for values in (
+                    lane, batting_order, bowling_order, batting_players, bowlers, striker, non_striker, next_in,
+                    bowler, lane_runs, lane_wickets))
+            rows = numpy.arange(len(lane))
+
+    return runs, wickets, balls
+
+
+def _team_arrays(team: CricketTeam):
+    """A team's skill vectors and its batting and bowling orders as positions in them."""
+    import numpy
+
+    players = team.list_players
+    positions = {player: i for i, player in enumerate(players)}
+    return (numpy.array([player.skill_vector() for player in players], dtype=numpy.float64),
+            numpy.array([positions[player] for player in team.batting_order], dtype=numpy.intp),
+            numpy.array([positions[player] for player in team.bowling_order], dtype=numpy.intp))
+
+
+def simulate_matches(rules: CricketRules, fixtures: list, seed=None):
+    """Play many matches at once, one ball of every match per step, with CricketBrain.delivery_batch().
+
+    fixtures is a list of (team_a, team_b) with team_a batting first; give the same pair many times to play a
+    fixture over and over. This is the quickest way to simulate many matches. The model and rules are the same as
+    simulate_match() so the results have the same distribution, but the luck comes from one NumPy Generator for the
+    seed so a match can't be replayed on its own. Returns a list of CricketMatchResults."""
+
+    import numpy
+
+    rng = numpy.random.default_rng(seed)
+    matches = len(fixtures)
+    if matches == 0:
+        return []
+
+    # Work out each team's arrays once however many fixtures it is in
+    arrays = {}
+    for fixture in fixtures:
+        for team in fixture:
+            if id(team) not in arrays:
+                rules.check_team(team)
+                arrays[id(team)] = _team_arrays(team)
+
+    width = max(arrays[id(a)][0].shape[0] + arrays[id(b)][0].shape[0] for a, b in fixtures)
+    longest = max(team_skills.shape[0] for team_skills, batting_order, bowling_order in arrays.values())
+    skills = numpy.zeros((matches, width, len(CricketPlayer.SKILLS)))
+    batting_orders = numpy.zeros((2, matches, longest), dtype=numpy.intp)
+    bowling_orders = numpy.zeros((2, matches, longest), dtype=numpy.intp)
+    batting_players = numpy.zeros((2, matches), dtype=numpy.intp)
+    bowlers = numpy.zeros((2, matches), dtype=numpy.intp)
+
+    # Fill in the matches of each distinct fixture together, with team_b's players after team_a's
+    lanes = {}
+    for i, (team_a, team_b) in enumerate(fixtures):
+        lanes.setdefault((id(team_a), id(team_b)), []).append(i)
+    for (a, b), rows in lanes.items():
+        rows = numpy.array(rows)
+        offset = 0
+        for side, key in enumerate((a, b)):
+            team_skills, batting_order, bowling_order = arrays[key]
+            skills[rows, offset:offset + len(team_skills)] = team_skills
+            batting_orders[side, rows, :len(batting_order)] = batting_order + offset
+            bowling_orders[side, rows, :len(bowling_order)] = bowling_order + offset
+            batting_players[side, rows] = len(batting_order)
+            bowlers[side, rows] = len(bowling_order)
+            offset += len(team_skills)
+
+    innings = []
+    for i in range(rules.innings * 2):
+        side = i % 2
+        innings.append(simulate_innings_batch(skills, batting_orders[side], batting_players[side],
+                                              bowling_orders[1 - side], bowlers[1 - side], rules.balls_per_innings,
+                                              rules.deliveries_per_over, rng))
+
+    results = []
+    for m in range(matches):
+        team_a, team_b = fixtures[m]
+        results.append(CricketMatchResult((team_a.name, team_b.name),
+                                          [(i % 2, int(innings[i][0][m]), int(innings[i][1][m]),
+                                            int(innings[i][2][m])) for i in range(len(innings))]))
+    return results
@@ -0,0 +1,302 @@
+__author__ = 'user'
+
+import struct
+import sys
+from array import array
+from collections import deque
+from pycricket import *
+
+# Compact binary checkpoints of a CricketMatch.
+#
+# Everything is written little endian. Players are written once with their team and are referred to everywhere
+# else by their position in their team. Per-ball, per-over and per-player data is written as columns straight
+# out of typed arrays, so the size of a snapshot and the time taken to write it hardly depend on how far the
+# match has got.
+
+MAGIC = b"PYCK"
+VERSION = 2
+
+# Versions that restore() can read; version 1 snapshots have no team batting and bowling orders
+_READABLE_VERSIONS = (1, 2)
+
+# Marks a missing team or player
+NONE = -1
+
+_HEADER = struct.Struct("<4sH")
+_LENGTH = struct.Struct("<I")
+_RULES = struct.Struct("<5I")
+_SIDES = struct.Struct("<hhI")
+_TEAM = struct.Struct("<I")
+_INNINGS = struct.Struct("<HHI4i4I6H")
+_GAUSS = struct.Struct("<?d")
+
+# Columns of the ball log in the order they are written
+_LOG_COLUMNS = ("types", "runs", "batsmen", "bowlers", "overs")
+
+# Each over is the bowler's position in the bowling team, max_deliveries, number, start and its running totals
+_OVER_SIZE = 8
+
+# Each player's figures are which team they are in (0 batting, 1 bowling), their position in it,
+# the position of who dismissed them in the bowling team, their status and then the batting and bowling figures
+_STATS_SIZE = 12
+_STATUS = (CricketPlayerStats.NOT_OUT, CricketPlayerStats.OUT)
+
+
+def _little_endian(values: array):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _Reader():
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, format: struct.Struct):
+        values = format.unpack_from(self.data, self.offset)
+        self.offset += format.size
+        return values
+
+    def string(self):
+        length, = self.unpack(_LENGTH)
+        value = str(self.data[self.offset:self.offset + length], "utf-8")
+        self.offset += length
+        return value
+
+    def column(self, typecode: str, count: int):
+        values = array(typecode)
+        size = values.itemsize * count
+        values.frombytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+
+def _write_string(parts: list, value: str):
+    data = value.encode("utf-8")
+    parts.append(_LENGTH.pack(len(data)))
+    parts.append(data)
+
+
+def _write_rng(parts: list, rng: CricketRandom):
+    version, internal, gauss_next = rng.getstate()
+    _write_string(parts, str(rng.root_seed))
+    parts.append(_little_endian(array("I", (version,) + internal)))
+    parts.append(_GAUSS.pack(gauss_next is not None, gauss_next or 0.0))
+
+
+def _read_rng(reader: _Reader):
+    root_seed = int(reader.string())
+    state = reader.column("I", 626)
+    has_gauss, gauss_next = reader.unpack(_GAUSS)
+    return CricketRandom.from_state(root_seed, (state[0], tuple(state[1:]), gauss_next if has_gauss else None))
+
+
+def _positions(team: CricketTeam):
+    positions = {}
+    for i in range(len(team.list_players)):
+        positions[team.list_players[i]] = i
+    return positions
+
+
+def _write_innings(parts: list, innings: CricketInnings, teams: list):
+    batting = _positions(innings.batting_team)
+    bowling = _positions(innings.bowling_team)
+    log = innings.log
+
+    stats = array("i")
+    for player, figures in innings.player_stats.items():
+        if player in batting:
+            stats.extend((0, batting[player]))
+        else:
+            stats.extend((1, bowling[player]))
+        stats.extend((NONE if figures.dismissed_by is None else bowling[figures.dismissed_by],
+                      _STATUS.index(figures.status),
+                      figures.runs, figures.balls, figures.fours, figures.sixes,
+                      figures.balls_bowled, figures.runs_conceded, figures.maidens, figures.wickets))
+
+    overs = array("i")
+    for over in innings.overs:
+        overs.extend((bowling[over.bowler], over.max_deliveries, over.number, over.start,
+                      over.balls, over.runs, over.wickets, over.extras))
+
+    # The log's player lists and where everyone is in the batting order and bowling rotation
+    players = array("H", [batting[player] for player in log.batting_players])
+    players.extend([bowling[player] for player in log.bowling_players])
+    players.extend([bowling[player] for player in innings.bowlers])
+    for queue in (innings.batsmen, innings.batsmen_in, innings.batsmen_out):
+        players.extend([batting[player] for player in queue])
+
+    parts.append(_INNINGS.pack(teams.index(innings.batting_team), teams.index(innings.bowling_team),
+                               innings.max_overs, innings.runs, innings.wickets, innings.balls, innings.extras,
+                               len(log), len(innings.overs), len(innings.player_stats), len(players),
+                               len(log.batting_players), len(log.bowling_players), len(innings.bowlers),
+                               len(innings.batsmen), len(innings.batsmen_in), len(innings.batsmen_out)))
+    _write_rng(parts, innings.rng)
+
+    for column in _LOG_COLUMNS:
+        parts.append(_little_endian(getattr(log, column)))
+    parts.append(_little_endian(overs))
+    parts.append(_little_endian(stats))
+    parts.append(_little_endian(players))
+
+
+def _read_innings(reader: _Reader, teams: list, events: CricketEvents, deliveries_per_over: int):
+    batting_id, bowling_id, max_overs, runs, wickets, balls, extras, deliveries, over_count, stats_count, \
+        player_count, *queues = reader.unpack(_INNINGS)
+    batting = teams[batting_id].list_players
+    bowling = teams[bowling_id].list_players
+
+    innings = CricketInnings(teams[batting_id], teams[bowling_id], max_overs, _read_rng(reader), events,
+                             deliveries_per_over)
+    innings.runs, innings.wickets, innings.balls, innings.extras = runs, wickets, balls, extras
+
+    log = innings.log
+    for column in _LOG_COLUMNS:
+        setattr(log, column, reader.column(getattr(log, column).typecode, deliveries))
+
+    overs = reader.column("i", over_count * _OVER_SIZE)
+    stats = reader.column("i", stats_count * _STATS_SIZE)
+    players = reader.column("H", player_count)
+
+    # The overs' running totals are restored as they were rather than rescanning the log
+    for i in range(0, len(overs), _OVER_SIZE):
+        over = CricketOver(bowling[overs[i]], overs[i + 1], log, overs[i + 2])
+        over.start, over._balls, over._runs, over._wickets, over._extras = overs[i + 3:i + 8]
+        over.update_state()
+        innings.overs.append(over)
+
+    for i in range(0, len(stats), _STATS_SIZE):
+        team = bowling if stats[i] == 1 else batting
+        figures = innings.get_player_stats(team[stats[i + 1]])
+        if stats[i + 2] != NONE:
+            figures.dismissed_by = bowling[stats[i + 2]]
+        figures.status = _STATUS[stats[i + 3]]
+        figures.runs, figures.balls, figures.fours, figures.sixes, \
+            figures.balls_bowled, figures.runs_conceded, figures.maidens, figures.wickets = stats[i + 4:i + _STATS_SIZE]
+
+    # The new log's player lists start off as the team lists so only players added since need adding
+    batting_players, bowling_players, bowlers, batsmen, batsmen_in, batsmen_out = queues
+    position = 0
+    for player in players[position + len(log.batting_players):position + batting_players]:
+        log.batting_id(batting[player])
+    position += batting_players
+    for player in players[position + len(log.bowling_players):position + bowling_players]:
+        log.bowling_id(bowling[player])
+    position += bowling_players
+    innings.bowlers = deque([bowling[player] for player in players[position:position + bowlers]])
+    position += bowlers
+    innings.batsmen = deque([batting[player] for player in players[position:position + batsmen]])
+    position += batsmen
+    innings.batsmen_in = deque([batting[player] for player in players[position:position + batsmen_in]])
+    position += batsmen_in
+    innings.batsmen_out = deque([batting[player] for player in players[position:position + batsmen_out]])
+
+    innings.update_state()
+    return innings
+
+
+def snapshot(match: CricketMatch):
+    """Write the state of a match to bytes that restore() can turn back into an identical match.
+
+    This covers the rules, teams and player skills, the ball by ball log, overs and figures of every innings,
+    the batting order and bowling rotation, and the match's and every innings' random number streams.
+    Subscribers to the match's events are not included."""
+    parts = [_HEADER.pack(MAGIC, VERSION)]
+
+    _write_string(parts, match.name)
+    rules = match.rules
+    _write_string(parts, rules.name)
+    parts.append(_RULES.pack(rules.max_teams, rules.max_player, rules.innings, rules.overs_per_innings,
+                             rules.deliveries_per_over))
+    _write_rng(parts, match.rng)
+
+    teams = match.list_teams
+    parts.append(_TEAM.pack(len(teams)))
+    for team in teams:
+        _write_string(parts, team.name)
+        _write_string(parts, "\n".join([player.name for player in team.list_players]))
+        parts.append(_TEAM.pack(len(team.list_players)))
+        skills = array("d")
+        for player in team.list_players:
+            skills.extend([player.skills[skill] for skill in CricketPlayer.SKILLS])
+        parts.append(_little_endian(skills))
+
+        # Orders are written as positions in the team, with no positions if the team uses its default order
+        positions = {team.list_players[i]: i for i in range(len(team.list_players))}
+        for order in (team._batting_order, team._bowling_order):
+            order = [] if order is None else [positions[player] for player in order]
+            parts.append(_TEAM.pack(len(order)))
+            parts.append(_little_endian(array("H", order)))
+
+    # The sides are only set once the match has started
+    sides = []
+    for side in (getattr(match, "batting_team", None), getattr(match, "bowling_team", None)):
+        sides.append(NONE if side is None else teams.index(side))
+    parts.append(_SIDES.pack(sides[0], sides[1], len(match.innings)))
+
+    for innings in match.innings:
+        _write_innings(parts, innings, teams)
+
+    return b"".join(parts)
+
+
+def restore(data: bytes, seed: int = None):
+    """Create a new CricketMatch from the bytes written by snapshot().
+
+    Every call returns an independent match, so many continuations can be played from one snapshot.
+    If a seed is given the match and the current innings are given fresh random number streams from it
+    rather than carrying on from where the snapshot was taken."""
+    reader = _Reader(data)
+
+    magic, version = reader.unpack(_HEADER)
+    if magic != MAGIC:
+        raise (Exception("Not a PyCricket match snapshot."))
+    if version not in _READABLE_VERSIONS:
+        raise (Exception("Unsupported match snapshot version %i." % version))
+
+    name = reader.string()
+    rules = CricketRules(reader.string())
+    rules.max_teams, rules.max_player, rules.innings, rules.overs_per_innings, rules.deliveries_per_over = \
+        reader.unpack(_RULES)
+
+    match = CricketMatch(name, rules, 0)
+    match.rng = _read_rng(reader)
+
+    team_count, = reader.unpack(_TEAM)
+    skill_count = len(CricketPlayer.SKILLS)
+    for i in range(team_count):
+        team = CricketTeam(reader.string())
+        names = reader.string().split("\n")
+        player_count, = reader.unpack(_TEAM)
+        skills = reader.column("d", player_count * skill_count)
+        for j in range(player_count):
+            team.list_players.append(CricketPlayer(names[j], skills=dict(
+                zip(CricketPlayer.SKILLS, skills[j * skill_count:(j + 1) * skill_count]))))
+        if version >= 2:
+            for order in ("batting_order", "bowling_order"):
+                length, = reader.unpack(_TEAM)
+                if length > 0:
+                    setattr(team, order, [team.list_players[j] for j in reader.column("H", length)])
+        match.list_teams.append(team)
+
+    teams = match.list_teams
+    batting, bowling, innings_count = reader.unpack(_SIDES)
+    if batting != NONE:
+        match.batting_team = teams[batting]
+    if bowling != NONE:
+        match.bowling_team = teams[bowling]
+
+    for i in range(innings_count):
+        match.innings.append(_read_innings(reader, teams, match.events, rules.deliveries_per_over))
+    match.update_state()
+
+    if seed is not None:
+        match.rng = CricketRandom(seed)
+        if len(match.innings) > 0:
+            match.current_innings.rng = match.rng.child("innings", len(match.innings) - 1)
+
+    return match
@@ -0,0 +1,397 @@
+__author__ = 'user'
+
+import math
+from pycricket import *
+
+# Career and team statistics built up one innings or match at a time.
+#
+# Nothing here keeps hold of the matches it is given: every figure is a running total, an online mean and
+# variance or a fixed size histogram, so matches can be thrown away as soon as they have been added.
+
+
+class CricketRunningStats():
+    """Count, mean, variance, minimum and maximum of a stream of values, updated one value at a time."""
+
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        # Welford's method, which doesn't lose precision the way keeping a sum of squares does
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add in the values seen by another CricketRunningStats, for example one built up by another process."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self._m2, self.min, self.max = other.count, other.mean, other._m2, \
+                                                                   other.min, other.max
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def __str__(self):
+        return "n=%i mean=%.2f sd=%.2f" % (self.count, self.mean, self.stdev)
+
+
+class CricketHistogram():
+    """Counts of values in equal width buckets from 0, with everything beyond the last bucket counted in it."""
+
+    __slots__ = ("width", "counts", "total")
+
+    def __init__(self, width: int = 10, buckets: int = 50):
+        self.width = width
+        self.counts = [0] * buckets
+        self.total = 0
+
+    def add(self, value: float):
+        bucket = int(value // self.width)
+        if bucket < 0:
+            bucket = 0
+        elif bucket >= len(self.counts):
+            bucket = len(self.counts) - 1
+        self.counts[bucket] += 1
+        self.total += 1
+
+    def merge(self, other):
+        if other.width != self.width or len(other.counts) != len(self.counts):
+            raise (Exception("Can't merge histograms with different buckets."))
+        for i in range(len(self.counts)):
+            self.counts[i] += other.counts[i]
+        self.total += other.total
+
+    def percentile(self, percent: float):
+        """Estimate the value that the specified percentage of values are below, assuming they are spread
+        evenly across each bucket."""
+        if self.total == 0:
+            return 0.0
+
+        target = self.total * percent / 100
+        seen = 0
+        for i in range(len(self.counts)):
+            count = self.counts[i]
+            if count > 0 and seen + count >= target:
+                return (i + (target - seen) / count) * self.width
+            seen += count
+
+        return len(self.counts) * self.width
+
+    def probability_at_least(self, value: float):
+        """Fraction of values in buckets starting at or above the value's bucket."""
+        if self.total == 0:
+            return 0.0
+        bucket = max(0, min(int(value // self.width), len(self.counts) - 1))
+        return sum(self.counts[bucket:]) / self.total
+
+
+class CricketCareerStats():
+    """A player's batting and bowling figures added up over every innings they have played in.
+
+    Overs and economy are for overs of deliveries_per_over balls, so only innings with overs of that length can be
+    added."""
+
+    def __init__(self, team_name: str, player_name: str, deliveries_per_over: int = 6):
+        self.team_name = team_name
+        self.player_name = player_name
+        self.deliveries_per_over = deliveries_per_over
+
+        # Batting
+        self.innings = 0
+        self.not_outs = 0
+        self.runs = 0
+        self.balls = 0
+        self.fours = 0
+        self.sixes = 0
+        self.scores = CricketRunningStats()
+        self.score_histogram = CricketHistogram(width=10, buckets=100)
+
+        # Bowling
+        self.bowling_innings = 0
+        self.balls_bowled = 0
+        self.runs_conceded = 0
+        self.maidens = 0
+        self.wickets = 0
+        self.innings_wickets = CricketRunningStats()
+        self.innings_economy = CricketRunningStats()
+
+    def add_batting(self, stats: CricketPlayerStats, out: bool):
+        self.innings += 1
+        if not out:
+            self.not_outs += 1
+        self.runs += stats.runs
+        self.balls += stats.balls
+        self.fours += stats.fours
+        self.sixes += stats.sixes
+        self.scores.add(stats.runs)
+        self.score_histogram.add(stats.runs)
+
+    def add_bowling(self, stats: CricketPlayerStats):
+        if stats.deliveries_per_over != self.deliveries_per_over:
+            raise (Exception("Can't add bowling figures from %i ball overs to %s's figures from %i ball overs" %
+                             (stats.deliveries_per_over, self.player_name, self.deliveries_per_over)))
+        self.bowling_innings += 1
+        self.balls_bowled += stats.balls_bowled
+        self.runs_conceded += stats.runs_conceded
+        self.maidens += stats.maidens
+        self.wickets += stats.wickets
+        self.innings_wickets.add(stats.wickets)
+        self.innings_economy.add(stats.economy)
+
+    def merge(self, other):
+        if other.deliveries_per_over != self.deliveries_per_over:
+            raise (Exception("Can't merge figures from %i ball overs with figures from %i ball overs" %
+                             (other.deliveries_per_over, self.deliveries_per_over)))
+        for name in ("innings", "not_outs", "runs", "balls", "fours", "sixes",
+                     "bowling_innings", "balls_bowled", "runs_conceded", "maidens", "wickets"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.scores.merge(other.scores)
+        self.score_histogram.merge(other.score_histogram)
+        self.innings_wickets.merge(other.innings_wickets)
+        self.innings_economy.merge(other.innings_economy)
+
+    @property
+    def outs(self):
+        return self.innings - self.not_outs
+
+    @property
+    def batting_average(self):
+        """Runs per dismissal, or None if the player has never been out."""
+        if self.outs == 0:
+            return None
+        return self.runs / self.outs
+
+    @property
+    def strike_rate(self):
+        """Runs per 100 balls faced."""
+        if self.balls == 0:
+            return 0.0
+        return self.runs * 100 / self.balls
+
+    @property
+    def overs(self):
+        return CricketOver.balls_to_overs(self.balls_bowled, self.deliveries_per_over)
+
+    @property
+    def economy(self):
+        """Runs conceded per over."""
+        if self.balls_bowled == 0:
+            return 0.0
+        return self.runs_conceded * self.deliveries_per_over / self.balls_bowled
+
+    @property
+    def bowling_average(self):
+        """Runs conceded per wicket, or None if the player hasn't taken a wicket."""
+        if self.wickets == 0:
+            return None
+        return self.runs_conceded / self.wickets
+
+    @property
+    def wicket_rate(self):
+        """Wickets taken per ball bowled."""
+        if self.balls_bowled == 0:
+            return 0.0
+        return self.wickets / self.balls_bowled
+
+
+class CricketTeamStats():
+    """A team's results and innings totals added up over every match they have played."""
+
+    def __init__(self, team_name: str):
+        self.team_name = team_name
+        self.played = 0
+        self.won = 0
+        self.lost = 0
+        self.tied = 0
+        self.totals = CricketRunningStats()
+        self.total_histogram = CricketHistogram(width=25, buckets=80)
+        self.wickets_lost = CricketRunningStats()
+        self.conceded = CricketRunningStats()
+        self.margins = CricketRunningStats()
+
+    def add_innings(self, runs: int, wickets: int):
+        self.totals.add(runs)
+        self.total_histogram.add(runs)
+        self.wickets_lost.add(wickets)
+
+    def add_result(self, runs_for: int, runs_against: int):
+        self.played += 1
+        if runs_for > runs_against:
+            self.won += 1
+        elif runs_for < runs_against:
+            self.lost += 1
+        else:
+            self.tied += 1
+        self.margins.add(runs_for - runs_against)
+
+    def merge(self, other):
+        for name in ("played", "won", "lost", "tied"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.totals.merge(other.totals)
+        self.total_histogram.merge(other.total_histogram)
+        self.wickets_lost.merge(other.wickets_lost)
+        self.conceded.merge(other.conceded)
+        self.margins.merge(other.margins)
+
+
+class CricketStatsAggregator():
+    """Adds up per-player and per-team statistics from innings, matches or simulated match results as they
+    finish, without keeping hold of them. Players are looked up by (team name, player name).
+
+    Players' overs and economy are for overs of deliveries_per_over balls, taken from the first innings added if
+    not given; innings with overs of another length can't be added."""
+
+    def __init__(self, deliveries_per_over: int = None):
+        self.players = {}
+        self.teams = {}
+        self.deliveries_per_over = deliveries_per_over
+
+        # Matches subscribed to and their callbacks
+        self.subscriptions = {}
+
+    def player(self, team_name: str, player_name: str):
+        key = (team_name, player_name)
+        stats = self.players.get(key)
+        if stats is None:
+            stats = CricketCareerStats(team_name, player_name,
+                                       6 if self.deliveries_per_over is None else self.deliveries_per_over)
+            self.players[key] = stats
+        return stats
+
+    def team(self, team_name: str):
+        stats = self.teams.get(team_name)
+        if stats is None:
+            stats = CricketTeamStats(team_name)
+            self.teams[team_name] = stats
+        return stats
+
+    def add_innings(self, innings: CricketInnings):
+        """Add the batting and bowling figures and the total of a finished innings."""
+        if self.deliveries_per_over is None:
+            self.deliveries_per_over = innings.deliveries_per_over
+        elif innings.deliveries_per_over != self.deliveries_per_over:
+            raise (Exception("Can't add an innings of %i ball overs to statistics of %i ball overs" %
+                             (innings.deliveries_per_over, self.deliveries_per_over)))
+
+        batting = innings.batting_team
+        bowling = innings.bowling_team
+
+        # Only the batsmen who went out to bat have had an innings
+        for player in innings.batsmen_out:
+            self.player(batting.name, player.name).add_batting(innings.find_player_stats(player), True)
+        for player in innings.batsmen_in:
+            self.player(batting.name, player.name).add_batting(innings.find_player_stats(player), False)
+
+        for player in bowling.list_players:
+            stats = innings.player_stats.get(player)
+            if stats is not None and stats.balls_bowled > 0:
+                self.player(bowling.name, player.name).add_bowling(stats)
+
+        self.team(batting.name).add_innings(innings.runs, innings.wickets)
+        self.team(bowling.name).conceded.add(innings.runs)
+
+    def add_match_result(self, team_names: tuple, totals: tuple):
+        """Add the result of a match from the two teams' names and their total runs."""
+        for i in range(2):
+            self.team(team_names[i]).add_result(totals[i], totals[1 - i])
+
+    def add_match(self, match: CricketMatch):
+        """Add every innings of a finished match and its result."""
+        for innings in match.innings:
+            self.add_innings(innings)
+        self._add_match_score(match)
+
+    def _add_match_score(self, match: CricketMatch):
+        scores = match.score()
+        teams = match.list_teams
+        self.add_match_result((teams[0].name, teams[1].name), (scores.get(teams[0], 0), scores.get(teams[1], 0)))
+
+    def add_result(self, result):
+        """Add a cricketsim CricketMatchResult; these only have team totals so player figures are unchanged."""
+        for team, runs, wickets, balls in result.innings:
+            self.team(result.team_names[team]).add_innings(runs, wickets)
+            self.team(result.team_names[1 - team]).conceded.add(runs)
+        self.add_match_result(result.team_names, result.totals)
+
+    def subscribe(self, match: CricketMatch):
+        """Add each innings of the match as it is completed and the result when the match is over."""
+
+        def on_innings_complete(innings: CricketInnings):
+            self.add_innings(innings)
+
+        def on_match_complete(match: CricketMatch):
+            self._add_match_score(match)
+            self.unsubscribe(match)
+
+        match.subscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.subscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+        self.subscriptions[match] = (on_innings_complete, on_match_complete)
+
+    def unsubscribe(self, match: CricketMatch):
+        on_innings_complete, on_match_complete = self.subscriptions.pop(match)
+        match.unsubscribe(CricketEvents.INNINGS_COMPLETE, on_innings_complete)
+        match.unsubscribe(CricketEvents.MATCH_COMPLETE, on_match_complete)
+
+    def merge(self, other):
+        """Add in the statistics built up by another aggregator."""
+        if self.deliveries_per_over is None:
+            self.deliveries_per_over = other.deliveries_per_over
+        for (team_name, player_name), stats in other.players.items():
+            self.player(team_name, player_name).merge(stats)
+        for team_name, stats in other.teams.items():
+            self.team(team_name).merge(stats)
+
+    def print(self):
+        print("Team\t\t\tPlayed\tWon\tLost\tTied\tAverage\tSD")
+        for stats in self.teams.values():
+            print("%-20s\t%#6i\t%#6i\t%#6i\t%#6i\t%6.1f\t%5.1f" % (stats.team_name, stats.played, stats.won,
+                                                                  stats.lost, stats.tied, stats.totals.mean,
+                                                                  stats.totals.stdev))
+
+        print("\nBatsmen\t\tInns\tNO\tRuns\tAvg\tSR\tHS")
+        for stats in self.players.values():
+            if stats.innings > 0:
+                average = stats.batting_average
+                print("%-10s\t%#4i\t%#4i\t%#4i\t%6s\t%6.1f\t%#4i" % (stats.player_name, stats.innings, stats.not_outs,
+                                                                   stats.runs,
+                                                                   "-" if average is None else "%.1f" % average,
+                                                                   stats.strike_rate, stats.scores.max))
+
+        print("\nBowler\t\tOvers\tRuns\tWickets\tAvg\tEcon")
+        for stats in self.players.values():
+            if stats.balls_bowled > 0:
+                average = stats.bowling_average
+                print("%-10s\t%5.1f\t%#4i\t%#4i\t%6s\t%5.2f" % (stats.player_name,
+                                                              stats.overs,
+                                                              stats.runs_conceded, stats.wickets,
+                                                              "-" if average is None else "%.1f" % average,
+                                                              stats.economy))
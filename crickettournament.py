@@ -0,0 +1,262 @@
+__author__ = 'user'
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pycricket import *
+from cricketsim import simulate_match
+
+
+class CricketFixture():
+    """A fixture between two teams, given as indexes into the tournament's list of teams."""
+
+    def __init__(self, home: int, away: int, round_number: int = 1):
+        self.home = home
+        self.away = away
+        self.round_number = round_number
+
+    def __str__(self):
+        return "Round %i: %i v %i" % (self.round_number, self.home, self.away)
+
+
+def round_robin_fixtures(teams: list, legs: int = 1):
+    """Every team plays every other team; with 2 legs each pairing is played with both teams batting first."""
+    fixtures = []
+    for leg in range(legs):
+        for home in range(len(teams)):
+            for away in range(home + 1, len(teams)):
+                if leg % 2 == 0:
+                    fixtures.append(CricketFixture(home, away, leg + 1))
+                else:
+                    fixtures.append(CricketFixture(away, home, leg + 1))
+    return fixtures
+
+
+def fixture_seed(seed: int, fixture_id: int, repeat: int):
+    """Derive the seed for one repeat of one fixture so results don't depend on which worker played it."""
+    return CricketRandom(seed).child("fixture", fixture_id, repeat).root_seed
+
+
+class CricketTournamentTable():
+    """Points table, net run rate and head to head records built up as match results come in."""
+
+    WIN_POINTS = 2
+    TIE_POINTS = 1
+
+    def __init__(self, teams: list, rules: CricketRules):
+        self.teams = teams
+        self.rules = rules
+
+        count = len(teams)
+        self.played = [0] * count
+        self.won = [0] * count
+        self.lost = [0] * count
+        self.tied = [0] * count
+        self.points = [0] * count
+        self.runs_for = [0] * count
+        self.balls_for = [0] * count
+        self.runs_against = [0] * count
+        self.balls_against = [0] * count
+
+        # head_to_head[i][j] is the number of times team i has beaten team j
+        self.head_to_head = [[0] * count for i in range(count)]
+
+    def add_result(self, fixture: CricketFixture, result):
+        """Add a CricketMatchResult for a fixture to the table."""
+        sides = (fixture.home, fixture.away)
+        max_balls = self.rules.overs_per_innings * self.rules.deliveries_per_over
+
+        for team in sides:
+            self.played[team] += 1
+
+        for side, runs, wickets, balls in result.innings:
+            batting = sides[side]
+            bowling = sides[1 - side]
+
+            # A side that is all out counts as having faced its full quota of balls
+            if wickets >= self.teams[batting].players - 1:
+                balls = max_balls
+
+            self.runs_for[batting] += runs
+            self.balls_for[batting] += balls
+            self.runs_against[bowling] += runs
+            self.balls_against[bowling] += balls
+
+        if result.winner is None:
+            for team in sides:
+                self.tied[team] += 1
+                self.points[team] += CricketTournamentTable.TIE_POINTS
+        else:
+            winner = sides[result.winner]
+            loser = sides[1 - result.winner]
+            self.won[winner] += 1
+            self.lost[loser] += 1
+            self.points[winner] += CricketTournamentTable.WIN_POINTS
+            self.head_to_head[winner][loser] += 1
+
+    def net_run_rate(self, team: int):
+        per_over = self.rules.deliveries_per_over
+        if self.balls_for[team] == 0 or self.balls_against[team] == 0:
+            return 0.0
+        return self.runs_for[team] * per_over / self.balls_for[team] - \
+               self.runs_against[team] * per_over / self.balls_against[team]
+
+    def standings(self):
+        """Team indexes ordered by points and then net run rate."""
+        return sorted(range(len(self.teams)), key=lambda team: (self.points[team], self.net_run_rate(team)),
+                      reverse=True)
+
+    def print(self):
+        print("Team\t\t\tPlayed\tWon\tLost\tTied\tPoints\tNRR")
+        for team in self.standings():
+            print("%-20s\t%#6i\t%#6i\t%#6i\t%#6i\t%#6i\t%+.3f" % (self.teams[team].name, self.played[team],
+                                                                self.won[team], self.lost[team], self.tied[team],
+                                                                self.points[team], self.net_run_rate(team)))
+
+    def print_head_to_head(self):
+        for i in range(len(self.teams)):
+            for j in range(i + 1, len(self.teams)):
+                print("%s %i - %i %s" % (self.teams[i].name, self.head_to_head[i][j],
+                                         self.head_to_head[j][i], self.teams[j].name))
+
+
+# The rules and teams each worker process plays with, set once when the worker starts
+_worker_rules = None
+_worker_teams = None
+
+
+def _init_worker(rules: CricketRules, teams: list):
+    global _worker_rules, _worker_teams
+    _worker_rules = rules
+    _worker_teams = teams
+
+
+def _play_batch(fixture_id: int, home: int, away: int, seeds: list):
+    results = []
+    for seed in seeds:
+        results.append(simulate_match(_worker_rules, _worker_teams[home], _worker_teams[away], seed))
+    return fixture_id, results
+
+
+class CricketTournament():
+    """Plays every fixture of a tournament many times over across a pool of worker processes."""
+
+    ROUND_ROBIN = 0
+    KNOCKOUT = 1
+    DESCRIPTION = ("Round Robin", "Knockout")
+
+    def __init__(self, name: str, rules: CricketRules, teams: list, format: int = ROUND_ROBIN,
+                 repeats: int = 1, seed: int = 0, workers: int = None, batch_size: int = 250):
+        for team in teams:
+            rules.check_team(team)
+
+        self.name = name
+        self.rules = rules
+        self.teams = teams
+        self.format = format
+        self.repeats = repeats
+        self.seed = seed
+        self.batch_size = batch_size
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+
+        self.fixtures = []
+        self.table = CricketTournamentTable(teams, rules)
+        self.winner = None
+
+        if format == CricketTournament.ROUND_ROBIN:
+            self.fixtures = round_robin_fixtures(teams)
+        elif format != CricketTournament.KNOCKOUT:
+            raise (Exception("Unknown tournament format %i" % format))
+
+    def _batches(self, fixture_id: int, fixture: CricketFixture):
+        for start in range(0, self.repeats, self.batch_size):
+            seeds = [fixture_seed(self.seed, fixture_id, repeat)
+                     for repeat in range(start, min(start + self.batch_size, self.repeats))]
+            yield fixture_id, fixture.home, fixture.away, seeds
+
+    def _play_fixtures(self, fixtures: list, first_id: int, executor):
+        """Play every repeat of the fixtures, yielding (fixture, results) for each batch as soon as it is done."""
+        if executor is None:
+            for i in range(len(fixtures)):
+                for batch in self._batches(first_id + i, fixtures[i]):
+                    fixture_id, results = _play_batch(*batch)
+                    yield fixtures[fixture_id - first_id], results
+        else:
+            futures = []
+            for i in range(len(fixtures)):
+                for batch in self._batches(first_id + i, fixtures[i]):
+                    futures.append(executor.submit(_play_batch, *batch))
+
+            for future in as_completed(futures):
+                fixture_id, results = future.result()
+                yield fixtures[fixture_id - first_id], results
+
+    def play(self):
+        """Play the tournament, yielding (fixture, results) for each batch of matches as it completes.
+
+        The points table is updated before each batch is yielded so it can be shown while the rest play on."""
+        logging.info("Starting %s tournament %s: %i teams, %i repeats, %i workers" %
+                     (CricketTournament.DESCRIPTION[self.format], self.name, len(self.teams), self.repeats,
+                      self.workers))
+
+        # With a single worker play the matches in this process
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                           initargs=(self.rules, self.teams))
+        else:
+            _init_worker(self.rules, self.teams)
+
+        try:
+            if self.format == CricketTournament.ROUND_ROBIN:
+                for fixture, results in self._play_fixtures(self.fixtures, 0, executor):
+                    for result in results:
+                        self.table.add_result(fixture, result)
+                    yield fixture, results
+            else:
+                yield from self._play_knockout(executor)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _play_knockout(self, executor):
+        """Each tie is decided by which team wins more of its repeats, with the higher seed going through on a tie."""
+        remaining = list(range(len(self.teams)))
+        round_number = 1
+
+        while len(remaining) > 1:
+            fixtures = []
+            for i in range(0, len(remaining) - 1, 2):
+                fixtures.append(CricketFixture(remaining[i], remaining[i + 1], round_number))
+
+            wins = {}
+            for fixture, results in self._play_fixtures(fixtures, len(self.fixtures), executor):
+                tally = wins.setdefault(fixture, [0, 0])
+                for result in results:
+                    self.table.add_result(fixture, result)
+                    if result.winner is not None:
+                        tally[result.winner] += 1
+                yield fixture, results
+
+            # Teams without an opponent get a bye into the next round
+            winners = []
+            for fixture in fixtures:
+                home_wins, away_wins = wins.get(fixture, (0, 0))
+                winners.append(fixture.away if away_wins > home_wins else fixture.home)
+            if len(remaining) % 2 > 0:
+                winners.append(remaining[-1])
+
+            self.fixtures.extend(fixtures)
+            remaining = winners
+            round_number += 1
+
+        self.winner = remaining[0] if len(remaining) > 0 else None
+
+    def run(self):
+        """Play the whole tournament and return the final table."""
+        for fixture, results in self.play():
+            pass
+        return self.table
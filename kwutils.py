@@ -2,6 +2,33 @@ __author__ = 'user'
 
 import logging
 
+# Where confirm() and pick() read answers from; None means ask the user with input()
+_input_stream = None
+
+
+# Function to read answers from a stream, such as a script file, instead of asking the user
+# Returns the previous stream so that it can be put back; pass None to go back to asking the user
+def set_input(stream):
+    global _input_stream
+    previous = _input_stream
+    _input_stream = stream
+    return previous
+
+
+# Function to get an answer from the user, or the next line of the input stream if one has been set
+def read_input(prompt: str):
+    if _input_stream is None:
+        return input(prompt)
+
+    line = _input_stream.readline()
+    if line == "":
+        raise (Exception("Ran out of input at '%s'" % prompt))
+
+    # Echo the answer so that the output reads the same as it would have done interactively
+    line = line.strip()
+    print("%s%s" % (prompt, line))
+    return line
+
 # Function to ask the user a simple Yes/No confirmation and return a boolean
 def confirm(question : str):
 
@@ -11,7 +38,7 @@ def confirm(question : str):
         print(question)
         for i in range(0, len(choices)):
             print("%i. %s" % (i+1, choices[i]))
-        choice = input("Choice?")
+        choice = read_input("Choice?")
         if is_numeric(choice) and int(choice) > 0 and int(choice) <= (len(choices)):
             break
         else:
@@ -20,54 +47,125 @@ def confirm(question : str):
     return (int(choice) == 1)
 
 
+# Non-blocking version of confirm() for a session with a print(text) method and an input(prompt) coroutine
+async def confirm_async(question: str, session):
+
+    choices = ["Yes", "No"]
+
+    while True:
+        session.print(question)
+        for i in range(0, len(choices)):
+            session.print("%i. %s" % (i+1, choices[i]))
+        choice = await session.input("Choice?")
+        if is_numeric(choice) and int(choice) > 0 and int(choice) <= (len(choices)):
+            break
+        else:
+            session.print("Invalid choice.  Try again!")
+
+    return (int(choice) == 1)
+
+
 # Function to present a menu to pick an object from a list of objects
 # auto_pick means if the list has only one item then automatically pick that item
 def pick(object_type: str, objects: list, auto_pick: bool=False):
 
-    selected_object = None
-    choices = len(objects)
+    selected_object = _check_pick(object_type, objects, auto_pick)
+
+    # While an object has not yet been picked...
+    while selected_object == None:
+
+        # Print the menu of available objects to select
+        print(_pick_menu(object_type, objects))
+
+        # Get the user's selection and validate it
+        choice = read_input("%s?" % object_type)
+        selected_object, message = _pick_choice(object_type, objects, choice)
+        if message is not None:
+            print(message)
+
+    return selected_object
+
+
+# Non-blocking version of pick() for a session with a print(text) method and an input(prompt) coroutine
+async def pick_async(object_type: str, objects: list, session, auto_pick: bool=False):
+
+    selected_object = _check_pick(object_type, objects, auto_pick)
+
+    while selected_object == None:
+        session.print(_pick_menu(object_type, objects))
+        choice = await session.input("%s?" % object_type)
+        selected_object, message = _pick_choice(object_type, objects, choice)
+        if message is not None:
+            session.print(message)
+
+    return selected_object
+
+
+# Check there is something to pick from and auto pick it if there is only one
+def _check_pick(object_type: str, objects: list, auto_pick: bool):
+
+    # If the list of objects is no good the raise an exception
+    if objects is None or len(objects) == 0:
+        raise(Exception("No %s to pick from." % object_type))
+
+    # If you selected auto pick and there is only one object in the list then pick it
+    if auto_pick is True and len(objects) == 1:
+        return objects[0]
+
+    return None
+
+
+# The menu of available objects to select, along with an extra option to cancel selection
+def _pick_menu(object_type: str, objects: list):
+
     vowels ="AEIOU"
     if object_type[0].upper() in vowels:
         a_or_an = "an"
     else:
         a_or_an = "a"
 
-    # If the list of objects is no good the raise an exception
-    if objects is None or choices == 0:
-        raise(Exception("No %s to pick from." % object_type))
+    lines = ["Select %s %s:-" % (a_or_an, object_type)]
+    for i in range(0, len(objects)):
+        lines.append("\t%i) %s" % (i + 1, str(objects[i])))
+    lines.append("\t%i) Cancel" % (len(objects) + 1))
 
-    # If you selected auto pick and there is only one object in the list then pick it
-    if auto_pick is True and choices == 1:
-        selected_object = objects[0]
+    return "\n".join(lines)
 
-    # While an object has not yet been picked...
-    while selected_object == None:
 
-        # Print the menu of available objects to select
-        print("Select %s %s:-" % (a_or_an, object_type))
+# Validate the user's selection and return the selected object or None along with a message to show them
+def _pick_choice(object_type: str, objects: list, choice: str):
 
-        for i in range(0, choices):
-            print("\t%i) %s" % (i + 1, str(objects[i])))
+    choices = len(objects)
 
-        # Along with an extra option to cancel selection
-        print("\t%i) Cancel" % (choices + 1))
+    if is_numeric(choice) is not None:
+        choice = int(choice)
 
-        # Get the user's selection and validate it
-        choice = input("%s?" % object_type)
-        if is_numeric(choice) is not None:
-            choice = int(choice)
-
-            if 0 < choice <= choices:
-                selected_object = objects[choice -1]
-                logging.info("pick(): You chose %s %s." % (object_type, str(selected_object)))
-            elif choice == (choices + 1):
-                raise (Exception("You cancelled. No %s selected" % object_type))
-            else:
-                print("Invalid choice '%i' - try again." % choice)
+        if 0 < choice <= choices:
+            selected_object = objects[choice -1]
+            logging.info("pick(): You chose %s %s." % (object_type, str(selected_object)))
+            return selected_object, None
+        elif choice == (choices + 1):
+            raise (Exception("You cancelled. No %s selected" % object_type))
         else:
-            print("You choice '%s' is not a number - try again." % choice)
+            return None, "Invalid choice '%i' - try again." % choice
+    else:
+        selected_object = match_choice(objects, choice)
+        if selected_object is not None:
+            logging.info("pick(): You chose %s %s." % (object_type, str(selected_object)))
+            return selected_object, None
 
-    return selected_object
+        return None, "You choice '%s' is not a number or one of the choices - try again." % choice
+
+
+# Function to find the object in a list whose description is the choice, ignoring case
+def match_choice(objects: list, choice: str):
+
+    choice = choice.strip().lower()
+    for selected_object in objects:
+        if str(selected_object).lower() == choice:
+            return selected_object
+
+    return None
 
 
 def is_numeric(s):
@@ -3,45 +3,105 @@ __author__ = 'user'
 from CricketCLI import *
 from pycricket import *
 from kwutils import *
+import argparse
+import contextlib
+import io
 import logging
-
-def main():
+import sys
 
 
-    logging.basicConfig(level = logging.INFO)
-
-    'Start the game from the beginning.'
+def new_match(team1_name: str = "England", team2_name: str = "Australia", seed: int = None):
+    """Set up the match between the two teams; the same seed always gives the same players and deliveries.
 
-    teams = ["England", "Australia", "India", "Pakistan", "New Zealand", "South Africa", "Hong Kong"]
-    team1_name = pick("Team 1", teams)
-    teams.remove(team1_name)
-    team2_name = pick("Team 2", teams)
+    This is also the match that cricketserver plays in each new session."""
 
     rules = CricketRules("Test Match")
-    match = CricketMatch("Ashes", rules)
+    match = CricketMatch("Ashes", rules, seed)
 
     team1 = CricketTeam(team1_name)
-    team1.add_player(CricketPlayer("Keith"))
-    team1.add_player(CricketPlayer("Jack"))
-    team1.add_player(CricketPlayer("Oliver"))
-    team1.add_player(CricketPlayer("Bruce"))
+    team1.add_player(CricketPlayer("Keith", match.rng))
+    team1.add_player(CricketPlayer("Jack", match.rng))
+    team1.add_player(CricketPlayer("Oliver", match.rng))
+    team1.add_player(CricketPlayer("Bruce", match.rng))
 
 
     team2 = CricketTeam(team2_name)
-    team2.add_player(CricketPlayer("Jane"))
-    team2.add_player(CricketPlayer("Rosie"))
-    team2.add_player(CricketPlayer("Lynne"))
-    team2.add_player(CricketPlayer("Li"))
+    team2.add_player(CricketPlayer("Jane", match.rng))
+    team2.add_player(CricketPlayer("Rosie", match.rng))
+    team2.add_player(CricketPlayer("Lynne", match.rng))
+    team2.add_player(CricketPlayer("Li", match.rng))
 
     match.add_team(team1)
     match.add_team(team2)
 
-    cli = CricketCLI(match)
+    return match
+
+
+def play(seed: int = None, stdin=None, stdout=None):
+    """Pick the teams and then play the match from the CLI, reading commands from stdin if given."""
+
+    teams = ["England", "Australia", "India", "Pakistan", "New Zealand", "South Africa", "Hong Kong"]
+    team1_name = pick("Team 1", teams)
+    teams.remove(team1_name)
+    team2_name = pick("Team 2", teams)
+
+    match = new_match(team1_name, team2_name, seed)
+
+    cli = CricketCLI(match, stdin, stdout)
 
     cli.cmdloop()
 
+
+def run_script(script: str, seed: int = None):
+    """Play a match from a script and return everything that was printed.
+
+    The script has one line per command, or per answer when a command or the team selection asks for one,
+    exactly as they would have been typed."""
+
+    output = io.StringIO()
+    stream = io.StringIO(script)
+    previous = set_input(stream)
+    try:
+        with contextlib.redirect_stdout(output):
+            try:
+                play(seed, stream, output)
+            except SystemExit:
+                pass
+            except Exception as err:
+                print(str(err))
+    finally:
+        set_input(previous)
+
+    return output.getvalue()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Play PyCricket.")
+    parser.add_argument("--script", help="read commands and answers from this file, or - for stdin, "
+                                         "and print the output at the end")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the players' skills and the deliveries")
+    args = parser.parse_args()
+
+    if args.script is not None:
+
+        logging.basicConfig(level = logging.WARNING)
+
+        if args.script == "-":
+            script = sys.stdin.read()
+        else:
+            with open(args.script) as script_file:
+                script = script_file.read()
+
+        sys.stdout.write(run_script(script, args.seed))
+        return
+
+    logging.basicConfig(level = logging.INFO)
+
+    'Start the game from the beginning.'
+
     try:
-        pass
+        play(args.seed)
 
     except Exception as err:
         print(str(err))
@@ -2,10 +2,44 @@ __author__ = 'user'
 
 import logging
 from kwutils import *
+from array import array
+from bisect import bisect_right
 from collections import deque
+import functools
+import hashlib
+import os
 import random
 
 
+class CricketRandom(random.Random):
+    """Seedable random number stream that can be split into independent child streams.
+
+    A child stream's seed is derived from its parent's seed and the keys it was asked for, so a match,
+    innings or player can be replayed exactly from the root seed whichever order the streams are used in."""
+
+    def __init__(self, seed: int = None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), "little")
+        self.root_seed = seed
+        super().__init__(seed)
+
+    def child(self, *keys):
+        """Get the independent stream for the keys, for example child("innings", 2)."""
+        digest = hashlib.sha256(repr((self.root_seed,) + keys).encode()).digest()
+        return CricketRandom(int.from_bytes(digest[:8], "little"))
+
+    @classmethod
+    def from_state(cls, root_seed: int, state: tuple):
+        """Recreate a stream from its root seed and the getstate() of where it had got to, without reseeding."""
+        rng = cls.__new__(cls)
+        rng.root_seed = root_seed
+        rng.setstate(state)
+        return rng
+
+    def __reduce__(self):
+        return self.__class__, (self.root_seed,), self.getstate()
+
+
 class CricketPlayer():
 
     BOWLING = "BOWLING"
@@ -15,13 +49,24 @@ class CricketPlayer():
     LUCK = "LUCK"
     SKILLS = (SPEED, BATTING, BOWLING, CATCHING, LUCK)
 
-    def __init__(self, name: str):
+    __slots__ = ("name", "skills", "_packed", "_packed_generation")
+
+    def __init__(self, name: str, rng: random.Random = None, skills: dict = None):
         self.name = name
 
-        # populate skills with random values
-        self.skills = {}
-        for skill in CricketPlayer.SKILLS:
-            self.skills[skill] = random.random()
+        # Use the skills if given, otherwise populate skills with random values
+        if skills is not None:
+            self.skills = dict(skills)
+        else:
+            if rng is None:
+                rng = random
+
+            self.skills = {}
+            for skill in CricketPlayer.SKILLS:
+                self.skills[skill] = rng.random()
+
+        self._packed = None
+        self._packed_generation = None
 
     def __str__(self):
         description = self.name
@@ -36,8 +81,29 @@ class CricketPlayer():
     def increase_skill(self, skill : str, increment : float):
         if skill in self.skills.keys():
             self.skills[skill] += increment
+            self.pack_skills()
 
+    @property
+    def packed_skills(self):
+        """The player's skills pre-scaled for CricketBrain as a list, see CricketBrain.pack_skills()."""
+        if self._packed_generation != CricketBrain.generation:
+            self.pack_skills()
+        return self._packed
+
+    def pack_skills(self):
+        """Refresh the packed skills; call this if the skills dictionary is changed directly."""
+        self._packed = CricketBrain.pack_skills(self.skills)
+        self._packed_generation = CricketBrain.generation
 
+    def award_bonus(self, skill: str, packed_index: int, multiplier: float, bonus: float):
+        """Increase a skill that the brain uses and update just that term of the packed skills."""
+        value = self.skills[skill] + bonus
+        self.skills[skill] = value
+        self._packed[packed_index] = value * multiplier
+
+    def skill_vector(self):
+        """Get the player's skills as a list in CricketPlayer.SKILLS order."""
+        return [self.skills[skill] for skill in CricketPlayer.SKILLS]
 
 
 class CricketDelivery():
@@ -50,6 +116,11 @@ class CricketDelivery():
 
     DESCRIPTION = ("Shot", "No Ball", "Wide", "Byes", "Wicket", "Dot")
 
+    # Delivery types whose runs count as extras rather than to the batsmen
+    EXTRAS = (NO_BALL, WIDE, BYES)
+
+    __slots__ = ("runs", "type", "bowler", "batsmen")
+
     def __init__(self, type, runs=0, bowler: CricketPlayer = None, batsmen: CricketPlayer = None):
         self.runs = runs
         self.type = type
@@ -62,6 +133,181 @@ class CricketDelivery():
             description += ": runs %i" % self.runs
         return description
 
+    @staticmethod
+    def parse_command(arg: str):
+        """Read the arguments of the bowl command, [type] [runs], for CricketCLI and cricketserver.
+
+        The type can be its number or its name, e.g. "Shot 4", "No Ball" or "5". Returns the type and the runs,
+        either of which is None if it wasn't given, and raises an exception if the type isn't one."""
+
+        # A number after the delivery type is the runs scored
+        args = arg.split()
+        runs = None
+        if len(args) > 1 and is_numeric(args[-1]) is not None:
+            runs = int(args.pop())
+        type_arg = " ".join(args)
+
+        if len(type_arg) == 0:
+            return None, runs
+
+        if is_numeric(type_arg) is not None:
+            type_id = int(type_arg) - 1
+            if type_id not in range(len(CricketDelivery.DESCRIPTION)):
+                raise (Exception("Invalid delivery type %s" % type_arg))
+            return type_id, runs
+
+        type = match_choice(CricketDelivery.DESCRIPTION, type_arg)
+        if type is None:
+            raise (Exception("Invalid delivery type %s" % type_arg))
+        return CricketDelivery.DESCRIPTION.index(type), runs
+
+
+class CricketDeliveryLog():
+    """Ball by ball record of deliveries held in typed arrays, one entry per delivery.
+
+    Batsmen and bowlers are stored as indexes into the log's batting_players and bowling_players lists,
+    which start off as the team lists so that an index is the player's position in their team."""
+
+    __slots__ = ("types", "runs", "batsmen", "bowlers", "overs",
+                 "batting_players", "bowling_players", "_batting_index", "_bowling_index")
+
+    def __init__(self, batting_players: list = (), bowling_players: list = ()):
+        self.types = array("b")
+        self.runs = array("h")
+        self.batsmen = array("H")
+        self.bowlers = array("H")
+        self.overs = array("H")
+
+        self.batting_players = []
+        self.bowling_players = []
+        self._batting_index = {}
+        self._bowling_index = {}
+
+        for player in batting_players:
+            self.batting_id(player)
+        for player in bowling_players:
+            self.bowling_id(player)
+
+    def __len__(self):
+        return len(self.types)
+
+    def batting_id(self, player: CricketPlayer):
+        """Get the index of a batsmen in the log, adding them if they are not there yet."""
+        id = self._batting_index.get(player)
+        if id is None:
+            id = len(self.batting_players)
+            self.batting_players.append(player)
+            self._batting_index[player] = id
+        return id
+
+    def bowling_id(self, player: CricketPlayer):
+        """Get the index of a bowler in the log, adding them if they are not there yet."""
+        id = self._bowling_index.get(player)
+        if id is None:
+            id = len(self.bowling_players)
+            self.bowling_players.append(player)
+            self._bowling_index[player] = id
+        return id
+
+    def append(self, delivery: CricketDelivery, over: int):
+        """Add a delivery bowled in the specified over and return its position in the log."""
+        self.types.append(delivery.type)
+        self.runs.append(int(delivery.runs))
+        self.batsmen.append(self.batting_id(delivery.batsmen))
+        self.bowlers.append(self.bowling_id(delivery.bowler))
+        self.overs.append(over)
+        return len(self.types) - 1
+
+    def delivery(self, i: int):
+        """Create a CricketDelivery object for the delivery at position i in the log."""
+        return CricketDelivery(self.types[i], self.runs[i],
+                               self.bowling_players[self.bowlers[i]], self.batting_players[self.batsmen[i]])
+
+
+class CricketDeliveries():
+    """Read only sequence view over part of a CricketDeliveryLog, creating CricketDelivery objects on demand."""
+
+    __slots__ = ("log", "start", "stop")
+
+    def __init__(self, log: CricketDeliveryLog, start: int, stop: int):
+        self.log = log
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.log.delivery(self.start + j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("delivery index out of range")
+        return self.log.delivery(self.start + i)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.log.delivery(i)
+
+
+class CricketEvents():
+    """Passes match events on to the callbacks that have subscribed to them.
+
+    Callbacks are called with the innings and the delivery for DELIVERY and WICKET, the innings and the
+    over for OVER_COMPLETE, the innings for INNINGS_COMPLETE and the match for MATCH_COMPLETE.
+    Publishers check the event's list of subscribers before building anything so unwatched events cost nothing."""
+
+    DELIVERY = 0
+    OVER_COMPLETE = 1
+    WICKET = 2
+    INNINGS_COMPLETE = 3
+    MATCH_COMPLETE = 4
+    DESCRIPTION = ("Delivery", "Over Complete", "Wicket", "Innings Complete", "Match Complete")
+
+    def __init__(self):
+        self.subscribers = [[] for event in CricketEvents.DESCRIPTION]
+
+    def subscribe(self, event: int, callback):
+        self.subscribers[event].append(callback)
+
+    def unsubscribe(self, event: int, callback):
+        if callback in self.subscribers[event]:
+            self.subscribers[event].remove(callback)
+
+    def publish(self, event: int, *args):
+        # Go through a copy so that callbacks can unsubscribe themselves without the next one being skipped
+        for callback in tuple(self.subscribers[event]):
+            callback(*args)
+
+
+class CricketOutcome():
+    """What a delivery led to and the score of the innings straight afterwards."""
+
+    CONTINUING = 0
+    OVER_COMPLETE = 1
+    INNINGS_COMPLETE = 2
+    MATCH_COMPLETE = 3
+    DESCRIPTION = ("Continuing", "Over Complete", "Innings Complete", "Match Complete")
+
+    __slots__ = ("status", "innings", "runs", "wickets", "balls", "deliveries_per_over")
+
+    def __init__(self, status: int, innings: int, runs: int, wickets: int, balls: int, deliveries_per_over: int = 6):
+        self.status = status
+        self.innings = innings
+        self.runs = runs
+        self.wickets = wickets
+        self.balls = balls
+        self.deliveries_per_over = deliveries_per_over
+
+    @property
+    def overs(self):
+        return CricketOver.balls_to_overs(self.balls, self.deliveries_per_over)
+
+    def __str__(self):
+        return "%s: innings %i, %i for %i off %.1f overs" % (CricketOutcome.DESCRIPTION[self.status], self.innings,
+                                                             self.runs, self.wickets, self.overs)
+
 
 class CricketRules():
     RUNS = -999
@@ -83,20 +329,90 @@ class CricketRules():
         self.overs_per_innings = 3
         self.deliveries_per_over = 6
 
+    @property
+    def balls_per_innings(self):
+        """For example 20 overs of 6 balls for T20 or 20 overs of 5 balls for a 100 ball match."""
+        return self.overs_per_innings * self.deliveries_per_over
+
+    def check_team(self, team):
+        """Raise an exception if a CricketTeam has too few or too many players to play under these rules.
+
+        CricketMatch, cricketsim and crickettournament all check their teams with this."""
+        if team.players < 2 or team.players > self.max_player:
+            raise (Exception("Team %s has %i players; a %s team needs between 2 and %i." %
+                             (team.name, team.players, self.name, self.max_player)))
+
     @staticmethod
     def runs(delivery_type_id):
         return CricketRules.runs_map[delivery_type_id]
 
 
+class CricketPlayerStats():
+    """Batting and bowling figures for one player in one innings."""
+
+    NOT_OUT = "NOT OUT"
+    OUT = "OUT"
+
+    def __init__(self, player: CricketPlayer, deliveries_per_over: int = 6):
+        self.player = player
+        self.deliveries_per_over = deliveries_per_over
+
+        # Batting figures
+        self.runs = 0
+        self.balls = 0
+        self.fours = 0
+        self.sixes = 0
+        self.status = CricketPlayerStats.NOT_OUT
+        self.dismissed_by = None
+
+        # Bowling figures
+        self.balls_bowled = 0
+        self.runs_conceded = 0
+        self.maidens = 0
+        self.wickets = 0
+
+    @property
+    def overs(self):
+        return CricketOver.balls_to_overs(self.balls_bowled, self.deliveries_per_over)
+
+    @property
+    def economy(self):
+        if self.balls_bowled == 0:
+            return 0.0
+        else:
+            return self.runs_conceded * self.deliveries_per_over / self.balls_bowled
+
+    @property
+    def dismissal(self):
+        if self.status == CricketPlayerStats.OUT and self.dismissed_by is not None:
+            return "b %s" % self.dismissed_by
+        else:
+            return self.status
+
+    def batting_stats(self):
+        return self.runs, self.balls, self.status
+
+    def bowling_stats(self):
+        return self.runs_conceded, self.balls_bowled, self.wickets
+
+
 class CricketTeam():
     def __init__(self, name: str):
         self.name = name
         self.list_players = []
 
+        # Players in batting order and in bowling rotation order if set, otherwise the order they were added in
+        self._batting_order = None
+        self._bowling_order = None
+
     def add_player(self, new_player: CricketPlayer):
         logging.info("Trying to add player %s to team %s." % (new_player.name, self.name))
         self.list_players.append(new_player)
 
+        # New players go in at the end of the batting order
+        if self._batting_order is not None:
+            self._batting_order.append(new_player)
+
     def __str__(self):
         return self.name
 
@@ -104,10 +420,55 @@ class CricketTeam():
     def players(self):
         return len(self.list_players)
 
-    def print(self):
-        print("Team %s" % self.name)
+    @property
+    def batting_order(self):
+        """The players in the order they go in to bat."""
+        if self._batting_order is None:
+            return list(self.list_players)
+        return list(self._batting_order)
+
+    @batting_order.setter
+    def batting_order(self, players: list):
+        """Set the batting order, which must have every player in the team once, or None to go back to the default."""
+        if players is not None:
+            players = list(players)
+            self._check_order(players)
+            if len(players) != self.players:
+                raise (Exception("The batting order for %s must include all %i players" % (self.name, self.players)))
+        self._batting_order = players
+
+    @property
+    def bowling_order(self):
+        """The players who bowl, in the order they take their turn to bowl an over."""
+        if self._bowling_order is None:
+            return list(self.list_players)
+        return list(self._bowling_order)
+
+    @bowling_order.setter
+    def bowling_order(self, players: list):
+        """Set the bowling rotation, which can leave out players who don't bowl, or None to go back to the default."""
+        if players is not None:
+            players = list(players)
+            self._check_order(players)
+            if len(players) == 0:
+                raise (Exception("The bowling order for %s needs at least one bowler" % self.name))
+        self._bowling_order = players
+
+    def _check_order(self, players: list):
+        for player in players:
+            if player not in self.list_players:
+                raise (Exception("%s is not in team %s" % (player, self.name)))
+        if len(set(players)) != len(players):
+            raise (Exception("Players can only appear once in an order for team %s" % self.name))
+
+    def render(self):
+        lines = ["Team %s\n" % self.name]
         for i in range(len(self.list_players)):
-            print("%i. %s" % (i + 1, self.list_players[i]))
+            lines.append("%i. %s\n" % (i + 1, self.list_players[i]))
+        return "".join(lines)
+
+    def print(self):
+        print(self.render(), end="")
 
 
 class CricketOver():
@@ -116,31 +477,82 @@ class CricketOver():
     FINISHED = 2
     DESCRIPTION = ("Ready", "Playing", "Finished")
 
-    def __init__(self, bowler: CricketPlayer = None, max_deliveries=6):
-        self.deliveries = []
+    __slots__ = ("log", "number", "start", "max_deliveries", "bowler", "state", "_balls", "_runs", "_wickets",
+                 "_extras", "_text")
+
+    def __init__(self, bowler: CricketPlayer = None, max_deliveries=6, log: CricketDeliveryLog = None, number=0):
+
+        # The over's deliveries are a contiguous run of entries in the log, usually the innings' log
+        if log is None:
+            log = CricketDeliveryLog()
+        self.log = log
+        self.number = number
+        self.start = len(log)
+
         self.max_deliveries = max_deliveries
         self.bowler = bowler
 
+        # Ready, playing or finished; only changed by bowl()
+        self.state = CricketOver.READY
+
+        # Running totals so that score queries don't rescan the deliveries
+        self._balls = 0
+        self._runs = 0
+        self._wickets = 0
+        self._extras = 0
+
+        # Rendered text, kept once the over has finished as it can't change after that
+        self._text = None
+
+    @property
+    def deliveries(self):
+        return CricketDeliveries(self.log, self.start, self.start + self._balls)
+
     def bowl(self, new_delivery: CricketDelivery):
 
-        if len(self.deliveries) >= self.max_deliveries:
+        if self._balls >= self.max_deliveries:
             raise (Exception("Already bowled maximum number of deliveries %i," % self.max_deliveries))
 
         # Always set the bowler of the delivery to who is currently bowling
         new_delivery.bowler = self.bowler
 
-        self.deliveries.append(new_delivery)
+        self.log.append(new_delivery, self.number)
+
+        # Update the running totals
+        runs = self.log.runs[-1]
+        self._balls += 1
+        self._runs += runs
+        if new_delivery.type == CricketDelivery.WICKET:
+            self._wickets += 1
+        elif new_delivery.type in CricketDelivery.EXTRAS:
+            self._extras += runs
+
+        if self._balls >= self.max_deliveries:
+            self.state = CricketOver.FINISHED
+        else:
+            self.state = CricketOver.PLAYING
+
+    def update_state(self):
+        """Set the state from the number of balls bowled; bowl() calls this so it is only needed after restoring."""
+        if self._balls == 0:
+            self.state = CricketOver.READY
+        elif self._balls < self.max_deliveries:
+            self.state = CricketOver.PLAYING
+        else:
+            self.state = CricketOver.FINISHED
 
     def batsmen_stats(self, batsmen: CricketPlayer):
         runs = 0
         balls = 0
         status = "NOT OUT"
 
-        for delivery in self.deliveries:
-            if delivery.batsmen == batsmen:
-                runs += delivery.runs
+        log = self.log
+        id = log.batting_id(batsmen)
+        for i in range(self.start, self.start + self._balls):
+            if log.batsmen[i] == id:
+                runs += log.runs[i]
                 balls += 1
-                if delivery.type == CricketDelivery.WICKET:
+                if log.types[i] == CricketDelivery.WICKET:
                     status = "OUT"
 
         return runs, balls, status
@@ -151,47 +563,56 @@ class CricketOver():
         else:
             return 0,0,0
 
-    @property
-    def state(self):
-        if len(self.deliveries) == 0:
-            state = CricketOver.READY
-        elif len(self.deliveries) < self.max_deliveries:
-            state = CricketOver.PLAYING
-        else:
-            state = CricketOver.FINISHED
-
-        return state
-
     @staticmethod
-    def balls_to_overs(balls: int):
-
-        return balls//6 + ((balls % 6) * 0.1)
+    def balls_to_overs(balls: int, deliveries_per_over: int = 6):
+        """Balls as overs in the usual notation, e.g. 15 balls is 2.3 overs of 6 balls or 3.0 overs of 5 balls."""
+        return balls // deliveries_per_over + ((balls % deliveries_per_over) * 0.1)
 
     @property
     def balls(self):
-        return len(self.deliveries)
+        return self._balls
 
     @property
     def runs(self):
-        count = 0
-        for delivery in self.deliveries:
-            count += delivery.runs
-        return count
+        return self._runs
 
     @property
     def wickets(self):
-        count = 0
-        for delivery in self.deliveries:
-            if delivery.type == CricketDelivery.WICKET:
-                count += 1
-        return count
+        return self._wickets
+
+    @property
+    def extras(self):
+        return self._extras
+
+    def recompute(self):
+        """Recalculate runs, balls, wickets and extras by scanning every delivery in the over."""
+        runs = 0
+        wickets = 0
+        extras = 0
+        log = self.log
+        for i in range(self.start, self.start + self._balls):
+            runs += log.runs[i]
+            if log.types[i] == CricketDelivery.WICKET:
+                wickets += 1
+            elif log.types[i] in CricketDelivery.EXTRAS:
+                extras += log.runs[i]
+
+        return runs, self._balls, wickets, extras
 
     def __str__(self):
-        description = "Bowler: %s, State:%s\n" % (self.bowler, CricketOver.DESCRIPTION[self.state])
-        for i in range(len(self.deliveries)):
-            description += "%i. %s\n" % (i + 1, str(self.deliveries[i]))
+        if self._text is not None:
+            return self._text
 
-        return description
+        lines = ["Bowler: %s, State:%s\n" % (self.bowler, CricketOver.DESCRIPTION[self.state])]
+        deliveries = self.deliveries
+        for i in range(len(deliveries)):
+            lines.append("%i. %s\n" % (i + 1, str(deliveries[i])))
+        text = "".join(lines)
+
+        if self.state == CricketOver.FINISHED:
+            self._text = text
+
+        return text
 
     def print(self):
         print(str(self))
@@ -208,17 +629,53 @@ class CricketInnings():
 
     DESCRIPTION = ("Ready", "Playing", "Finished")
 
-    def __init__(self, batting_team: CricketTeam, bowling_team: CricketTeam, max_overs=2):
+    # Set to True to check the running totals against a full recompute after every delivery
+    CHECK_CONSISTENCY = False
+
+    def __init__(self, batting_team: CricketTeam, bowling_team: CricketTeam, max_overs=2, rng: CricketRandom = None,
+                 events: CricketEvents = None, deliveries_per_over: int = 6):
         self.batting_team = batting_team
         self.bowling_team = bowling_team
         self.max_overs = max_overs
+        self.deliveries_per_over = deliveries_per_over
         self.overs = []
 
-        self.bowlers = deque(self.bowling_team.list_players)
-        self.batsmen = deque(self.batting_team.list_players)
+        # Ready, playing or finished; only changed by play()
+        self.state = CricketInnings.READY
+
+        # Random number stream for deliveries in this innings
+        if rng is None:
+            rng = CricketRandom()
+        self.rng = rng
+
+        # Where to publish what happens in the innings, usually the match's events
+        if events is None:
+            events = CricketEvents()
+        self.events = events
+
+        # Ball by ball record of the innings; the overs are views over it
+        self.log = CricketDeliveryLog(batting_team.list_players, bowling_team.list_players)
+
+        # Running totals for the whole innings, updated as each delivery is bowled
+        self.runs = 0
+        self.wickets = 0
+        self.balls = 0
+        self.extras = 0
+
+        # Batting and bowling figures for each player, updated as each delivery is bowled
+        self.player_stats = {}
+
+        self.bowlers = deque(self.bowling_team.bowling_order)
+        self.batsmen = deque(self.batting_team.batting_order)
         self.batsmen_in = deque()
         self.batsmen_out = deque()
 
+        # Rendered text of the finished overs and, once the innings has finished, of the whole innings
+        self._overs_text = ""
+        self._overs_text_count = 0
+        self._text = None
+        self._score_card_text = None
+
     @property
     def current_batsmen(self):
         if len(self.batsmen_in) < 1:
@@ -233,6 +690,13 @@ class CricketInnings():
         else:
             return self.bowlers[0]
 
+    def next_players(self):
+        """The batsmen who will face the next delivery and the bowler who will bowl it, allowing for the change of
+        ends and of bowler that play() makes first if the current over has finished."""
+        if self.current_over is not None and self.current_over.state == CricketOver.FINISHED:
+            return self.batsmen_in[-1], self.bowlers[1 % len(self.bowlers)]
+        return self.current_batsmen, self.current_bowler
+
     def start(self):
         logging.info("Starting innings: batting %s, bowling %s" % (self.batting_team.name, self.bowling_team.name))
 
@@ -241,15 +705,32 @@ class CricketInnings():
         self.batsmen_in.append(self.batsmen.popleft())
 
         # Start the first over
-        first_over = CricketOver(bowler=self.current_bowler)
+        first_over = CricketOver(bowler=self.current_bowler, max_deliveries=self.deliveries_per_over, log=self.log,
+                                 number=len(self.overs))
 
         self.overs.append(first_over)
 
     def bowl(self, delivery: CricketDelivery):
+        """Play a delivery and raise an exception if it completed the over or the innings."""
+
+        status = self.play(delivery)
+
+        if status == CricketOutcome.INNINGS_COMPLETE:
+            runs, wickets, overs = self.score()
+            raise (
+            Exception("Innings over: %s score %i for %i after %.1f overs" % (self.batting_team, runs, wickets, overs)))
+
+        elif status == CricketOutcome.OVER_COMPLETE:
+            raise (Exception("Over %i completed." % len(self.overs)))
+
+    def play(self, delivery: CricketDelivery):
+        """Play a delivery and return the CricketOutcome status: continuing, over complete or innings complete."""
+
+        if self.state == CricketInnings.FINISHED:
+            raise (Exception("The innings of %s has finished." % self.batting_team))
 
         # If the current over has finished then start a new one...
         if self.current_over.state == CricketOver.FINISHED:
-            logging.info("Starting a new over")
 
             # put the current bowler to the back of the queue
             self.bowlers.rotate(-1)
@@ -258,16 +739,31 @@ class CricketInnings():
             self.batsmen_in.reverse()
 
             # Start the new over
-            self.overs.append(CricketOver(bowler=self.current_bowler))
-
-        logging.info("New delivery %s for over %i: %s to %s" % (
-        str(delivery), len(self.overs), self.current_bowler, self.current_batsmen))
+            self.overs.append(CricketOver(bowler=self.current_bowler, max_deliveries=self.deliveries_per_over,
+                                          log=self.log, number=len(self.overs)))
 
         # set the facing batsmen for the delivery
         delivery.batsmen = self.current_batsmen
 
         self.current_over.bowl(delivery)
 
+        # Update the innings running totals
+        runs = self.log.runs[-1]
+        self.runs += runs
+        self.balls += 1
+        if delivery.type == CricketDelivery.WICKET:
+            self.wickets += 1
+        elif delivery.type in CricketDelivery.EXTRAS:
+            self.extras += runs
+
+        self.record_stats(delivery)
+
+        if CricketInnings.CHECK_CONSISTENCY is True:
+            self.check_consistency()
+
+        subscribers = self.events.subscribers
+        if subscribers[CricketEvents.DELIVERY]:
+            self.events.publish(CricketEvents.DELIVERY, self, delivery)
 
         # If the batsmen scored an odd number of runs then swap them over
         if delivery.type in (CricketDelivery.RUNS, CricketDelivery.BYES) and delivery.runs % 2 > 0:
@@ -275,86 +771,200 @@ class CricketInnings():
 
         # Else if there was a wicket bring in the new batsmen to face the next delivery
         elif delivery.type == CricketDelivery.WICKET:
-            logging.info("Batsmen %s is out!" % self.current_batsmen)
             self.batsmen_out.append(self.batsmen_in.popleft())
 
             if len(self.batsmen) > 0:
                 self.batsmen_in.appendleft(self.batsmen.popleft())
-                logging.info("New Batsmen %s" % self.current_batsmen)
 
-        if self.state == CricketInnings.FINISHED:
-            runs, wickets, overs = self.score()
-            raise (
-            Exception("Innings over: %s score %i for %i after %.1f overs" % (self.batting_team, runs, wickets, overs)))
+            if subscribers[CricketEvents.WICKET]:
+                self.events.publish(CricketEvents.WICKET, self, delivery)
 
-        if self.current_over.state == CricketOver.FINISHED:
-            raise (Exception("Over %i completed." % len(self.overs)))
+        # The innings has finished if the batting side is all out or the last over has been bowled
+        over_complete = self.current_over.state == CricketOver.FINISHED
+        if self.wickets >= self.batting_team.players - 1 or (over_complete and len(self.overs) >= self.max_overs):
+            self.state = CricketInnings.FINISHED
+        else:
+            self.state = CricketInnings.PLAYING
 
-    def print(self):
-        print("Batting %s, bowling %s : %s" % (self.batting_team.name,
-                                               self.bowling_team.name,
-                                               CricketInnings.DESCRIPTION[self.state]))
+        if over_complete and subscribers[CricketEvents.OVER_COMPLETE]:
+            self.events.publish(CricketEvents.OVER_COMPLETE, self, self.current_over)
 
-        for i in range(len(self.overs)):
-            print("Over %i of %i." % (i + 1, len(self.overs)))
-            self.overs[i].print()
+        if self.state == CricketInnings.FINISHED:
+            if subscribers[CricketEvents.INNINGS_COMPLETE]:
+                self.events.publish(CricketEvents.INNINGS_COMPLETE, self)
+            return CricketOutcome.INNINGS_COMPLETE
+
+        if over_complete:
+            return CricketOutcome.OVER_COMPLETE
+
+        return CricketOutcome.CONTINUING
+
+    def render(self):
+        """The text that print() shows; only the current over is rendered again after each delivery."""
+        if self._text is not None:
+            return self._text
+
+        state = self.state
+        lines = ["Batting %s, bowling %s : %s\n" % (self.batting_team.name,
+                                                   self.bowling_team.name,
+                                                   CricketInnings.DESCRIPTION[state])]
+
+        # The finished overs only need rendering again when a new over changes the number of overs
+        count = len(self.overs)
+        if self._overs_text_count != count:
+            self._overs_text = "".join(["Over %i of %i.\n%s\n" % (i + 1, count, self.overs[i])
+                                        for i in range(count - 1)])
+            self._overs_text_count = count
+        lines.append(self._overs_text)
+        if count > 0:
+            lines.append("Over %i of %i.\n%s\n" % (count, count, self.overs[-1]))
 
         runs, wickets, overs = self.score()
 
-        print("%s score %i for %i after %.1f overs" % (self.batting_team, runs, wickets, overs))
+        lines.append("%s score %i for %i after %.1f overs\n" % (self.batting_team, runs, wickets, overs))
+        text = "".join(lines)
 
-    def score_card(self):
-        print("Batsmen\t\tRuns\tBalls\tStatus")
+        if state == CricketInnings.FINISHED:
+            self._text = text
+
+        return text
+
+    def print(self):
+        print(self.render(), end="")
+
+    def render_score_card(self):
+        if self._score_card_text is not None:
+            return self._score_card_text
+
+        lines = ["Batsmen\t\tRuns\tBalls\t4s\t6s\tStatus\n"]
         for batsmen in self.batting_team.list_players:
-            runs, balls, status = self.batsmen_stats(batsmen)
-            print("%-10s\t%#4i\t%#4i\t%s" % (batsmen.name, runs, balls, status))
+            stats = self.find_player_stats(batsmen)
+            lines.append("%-10s\t%#4i\t%#4i\t%#2i\t%#2i\t%s\n" % (batsmen.name, stats.runs, stats.balls,
+                                                                 stats.fours, stats.sixes, stats.dismissal))
 
-        print("\nBowler\t\tRuns\tOvers\tWickets")
+        lines.append("\nBowler\t\tRuns\tOvers\tMaidens\tWickets\tEcon\n")
         for bowler in self.bowlers:
-            runs, balls, wickets = self.bowler_stats(bowler)
-            print("%-10s\t%#4i\t%4.1f\t%#4i" % (bowler.name, runs, CricketOver.balls_to_overs(balls), wickets))
+            stats = self.find_player_stats(bowler)
+            lines.append("%-10s\t%#4i\t%4.1f\t%#4i\t%#4i\t%5.2f\n" % (bowler.name, stats.runs_conceded, stats.overs,
+                                                                     stats.maidens, stats.wickets, stats.economy))
+        text = "".join(lines)
 
+        if self.state == CricketInnings.FINISHED:
+            self._score_card_text = text
 
-    def batsmen_stats(self, batsmen: CricketPlayer):
-        runs = 0
-        balls = 0
-        over_status = ""
+        return text
 
-        for over in self.overs:
-            over_runs, over_balls, over_status = over.batsmen_stats(batsmen)
-            runs += over_runs
-            balls += over_balls
+    def score_card(self):
+        print(self.render_score_card(), end="")
+
+    def get_player_stats(self, player: CricketPlayer):
+        """Get the figures for a player in this innings, adding an empty entry to the index if they have none yet."""
+        stats = self.player_stats.get(player)
+        if stats is None:
+            stats = CricketPlayerStats(player, self.deliveries_per_over)
+            self.player_stats[player] = stats
+        return stats
+
+    def find_player_stats(self, player: CricketPlayer):
+        """Get the figures for a player in this innings without changing the index, empty ones if they have none."""
+        stats = self.player_stats.get(player)
+        if stats is None:
+            stats = CricketPlayerStats(player, self.deliveries_per_over)
+        return stats
+
+    def record_stats(self, delivery: CricketDelivery):
+        """Add a delivery that has just been bowled to the batsmen's and bowler's figures."""
+        runs = self.log.runs[-1]
+
+        batting = self.get_player_stats(delivery.batsmen)
+        batting.runs += runs
+        batting.balls += 1
+
+        bowling = self.get_player_stats(delivery.bowler)
+        bowling.runs_conceded += runs
+        bowling.balls_bowled += 1
+
+        if delivery.type == CricketDelivery.RUNS:
+            if runs == 4:
+                batting.fours += 1
+            elif runs == 6:
+                batting.sixes += 1
+
+        elif delivery.type == CricketDelivery.WICKET:
+            batting.status = CricketPlayerStats.OUT
+            batting.dismissed_by = delivery.bowler
+            bowling.wickets += 1
+
+        # If the bowler has just finished an over without conceding any runs then it is a maiden
+        over = self.current_over
+        if over.state == CricketOver.FINISHED and over.runs == 0:
+            bowling.maidens += 1
 
-        return runs, balls, over_status
+    def batsmen_stats(self, batsmen: CricketPlayer):
+        return self.find_player_stats(batsmen).batting_stats()
 
     def bowler_stats(self, bowler: CricketPlayer):
+        return self.find_player_stats(bowler).bowling_stats()
+
+
+    def score(self):
+
+        return self.runs, self.wickets, CricketOver.balls_to_overs(self.balls, self.deliveries_per_over)
+
+    def recompute(self):
+        """Recalculate runs, balls, wickets and extras from scratch by scanning every over of the innings."""
         runs = 0
         balls = 0
         wickets = 0
+        extras = 0
 
         for over in self.overs:
-            over_runs, over_balls, over_wickets = over.bowler_stats(bowler)
+            over_runs, over_balls, over_wickets, over_extras = over.recompute()
             runs += over_runs
             balls += over_balls
             wickets += over_wickets
+            extras += over_extras
 
-        return runs, balls, wickets
+        return runs, balls, wickets, extras
 
+    def check_consistency(self):
+        """Compare the running totals of the innings and its overs against a full recompute."""
+        for i in range(len(self.overs)):
+            over = self.overs[i]
+            if (over.runs, over.balls, over.wickets, over.extras) != over.recompute():
+                raise (Exception("Over %i running totals %s do not match recompute %s" %
+                                 (i + 1, (over.runs, over.balls, over.wickets, over.extras), over.recompute())))
 
-    def score(self):
-        runs = 0
-        wickets = 0
-        balls = 0
+        expected = self.recompute()
+        actual = (self.runs, self.balls, self.wickets, self.extras)
+        if actual != expected:
+            raise (Exception("Innings running totals %s do not match recompute %s" % (actual, expected)))
 
-        for over in self.overs:
-            new_runs, new_balls, new_wickets = over.score()
-            runs += new_runs
-            wickets += new_wickets
-            balls += new_balls
+    @property
+    def deliveries(self):
+        return CricketDeliveries(self.log, 0, len(self.log))
+
+    def project_innings(self):
+        """Project the distribution of the innings' final total from the current state, see project_score().
+
+        The players keep their current skills for the rest of the innings: the skill bonuses that CricketBrain
+        awards as they play are not modelled, so the projection is of an innings played with no bonuses."""
+        over = self.current_over
+        per_over = self.deliveries_per_over
+        balls_left = self.max_overs * per_over - self.balls
+
+        # If no one else can come in or there are no balls left then the total is what it is
+        if self.state == CricketInnings.FINISHED or balls_left <= 0 or len(self.batsmen_in) < 2:
+            return CricketProjection({self.runs: 1.0}, 1.0 if self.wickets >= self.batting_team.players - 1 else 0.0)
 
-        # logging.info("balls=%.1f" % overs)
+        # Line the bowlers and batsmen up for the next delivery, which may start a new over
+        bowlers = list(self.bowlers)
+        batsmen_in = list(self.batsmen_in)
+        if over.state == CricketOver.FINISHED:
+            bowlers = bowlers[1:] + bowlers[:1]
+            batsmen_in.reverse()
 
-        return runs, wickets, CricketOver.balls_to_overs(balls)
+        return project_score(batsmen_in, list(self.batsmen), bowlers, self.runs, self.balls, balls_left, per_over)
 
     @property
     def current_over(self):
@@ -363,28 +973,20 @@ class CricketInnings():
         else:
             return self.overs[-1]
 
-    @property
-    def state(self):
-
-        runs, wickets, overs = self.score()
+    def update_state(self):
+        """Set the state from the wickets and overs; play() calls this so it is only needed after restoring."""
 
         # Check if all out
-        if wickets == self.batting_team.players - 1:
-            state = CricketInnings.FINISHED
+        if self.wickets >= self.batting_team.players - 1:
+            self.state = CricketInnings.FINISHED
         # No overs or nothing started so ready to start
         elif len(self.overs) == 0 or self.overs[0].state == CricketOver.READY:
-            state = CricketInnings.READY
-        # Some overs so in progress
-        elif len(self.overs) < self.max_overs:
-            state = CricketInnings.PLAYING
-        # Else final over, are we still playing?
+            self.state = CricketInnings.READY
+        # Finished once the last over has been bowled
+        elif len(self.overs) >= self.max_overs and self.overs[-1].state == CricketOver.FINISHED:
+            self.state = CricketInnings.FINISHED
         else:
-            state = CricketInnings.FINISHED
-            final_over = self.overs[-1]
-            if final_over.state != CricketOver.FINISHED:
-                state = CricketInnings.PLAYING
-
-        return state
+            self.state = CricketInnings.PLAYING
 
 
 # CricketMatch Class
@@ -396,12 +998,35 @@ class CricketMatch():
     FINISHED = 2
     DESCRIPTION = ("Ready", "Playing", "Finished")
 
-    def __init__(self, name: str, rules: CricketRules):
+    def __init__(self, name: str, rules: CricketRules, seed: int = None):
         self.name = name
         self.list_teams = []
         self.rules = rules
         self.innings = []
 
+        # Everything random in the match comes from this stream so it can be replayed from its seed
+        self.rng = CricketRandom(seed)
+
+        # Ready, playing or finished; only changed by start() and play()
+        self.state = CricketMatch.READY
+
+        # Subscribers to what happens in the match
+        self.events = CricketEvents()
+
+        # How far render_delta() has got: innings, over and ball within the over
+        self._delta = (0, 0, 0)
+
+    def subscribe(self, event: int, callback):
+        """Call back whenever the specified CricketEvents event happens in the match."""
+        self.events.subscribe(event, callback)
+
+    def unsubscribe(self, event: int, callback):
+        self.events.unsubscribe(event, callback)
+
+    @property
+    def seed(self):
+        return self.rng.root_seed
+
     def add_team(self, new_team: CricketTeam):
 
         logging.info("Trying to add team %s to match %s." % (new_team.name, self.name))
@@ -412,25 +1037,68 @@ class CricketMatch():
             logging.info("Team %s added to match %s." % (new_team.name, self.name))
             self.list_teams.append(new_team)
 
-    def print(self):
-        print("Match %s (%s) - %s" % (self.name, self.rules.name, CricketMatch.DESCRIPTION[self.state]))
+    def render(self):
+        """The text that print() shows, reusing the rendered text of finished innings and overs."""
+        lines = ["Match %s (%s) - %s\n" % (self.name, self.rules.name, CricketMatch.DESCRIPTION[self.state])]
         for i in range(len(self.list_teams)):
-            self.list_teams[i].print()
+            lines.append(self.list_teams[i].render())
 
         for i in range(len(self.innings)):
-            print("\nInnings %i" % (i + 1))
-            self.innings[i].print()
+            lines.append("\nInnings %i\n" % (i + 1))
+            lines.append(self.innings[i].render())
 
-        print("Match Summary")
+        lines.append("Match Summary\n")
         scores = self.score()
         for team in scores.keys():
-            print("Team %s has scored a total of %i runs" % (team.name, scores[team]))
+            lines.append("Team %s has scored a total of %i runs\n" % (team.name, scores[team]))
 
-    def score_card(self):
-        print("Match %s (%s) - %s" % (self.name, self.rules.name, CricketMatch.DESCRIPTION[self.state]))
+        return "".join(lines)
+
+    def print(self):
+        print(self.render(), end="")
+
+    def render_score_card(self):
+        lines = ["Match %s (%s) - %s\n" % (self.name, self.rules.name, CricketMatch.DESCRIPTION[self.state])]
         for i in range(len(self.innings)):
-            print("\nInnings %i" % (i + 1))
-            self.innings[i].score_card()
+            lines.append("\nInnings %i\n" % (i + 1))
+            lines.append(self.innings[i].render_score_card())
+
+        return "".join(lines)
+
+    def score_card(self):
+        print(self.render_score_card(), end="")
+
+    def render_delta(self):
+        """The ball by ball text of what has happened since render_delta() was last called, one line per delivery
+        and a line with the score at the end of each innings, so a live display only has to add the new lines."""
+        lines = []
+        innings_number, over_number, ball = self._delta
+
+        while innings_number < len(self.innings):
+            innings = self.innings[innings_number]
+
+            while over_number < len(innings.overs):
+                over = innings.overs[over_number]
+                deliveries = over.deliveries
+                while ball < len(deliveries):
+                    lines.append("Over %i.%i %s" % (over_number + 1, ball + 1, deliveries[ball]))
+                    ball += 1
+                if over.state != CricketOver.FINISHED:
+                    break
+                over_number += 1
+                ball = 0
+
+            if innings.state != CricketInnings.FINISHED:
+                break
+
+            runs, wickets, overs = innings.score()
+            lines.append("%s score %i for %i after %.1f overs" % (innings.batting_team, runs, wickets, overs))
+            innings_number += 1
+            over_number = 0
+            ball = 0
+
+        self._delta = (innings_number, over_number, ball)
+        return "\n".join(lines)
 
     def score(self):
         team_scores = {}
@@ -442,38 +1110,73 @@ class CricketMatch():
 
         return team_scores
 
-    # Start the match
-    def start(self):
+    # Start the match, asking who is batting first unless told
+    def start(self, batting_team: CricketTeam = None):
 
         if len(self.list_teams) != 2:
             raise (Exception("You need 2 teams to start a game; you have %i" % len(self.list_teams)))
 
+        for team in self.list_teams:
+            self.rules.check_team(team)
+
         teams = self.list_teams.copy()
 
-        self.batting_team = pick("Batting side", teams)
+        if batting_team is None:
+            batting_team = pick("Batting side", teams)
+        self.batting_team = batting_team
 
         teams.remove(self.batting_team)
 
         self.bowling_team = pick("Bowling side", teams, auto_pick=True)
 
         self.innings = []
-        innings = CricketInnings(self.batting_team, self.bowling_team, self.rules.overs_per_innings)
+        self._delta = (0, 0, 0)
+        self.state = CricketMatch.READY
+        self.innings.append(self.new_innings())
+        self.current_innings.start()
+
+    def new_innings(self):
+        """The next innings with the current batting and bowling sides, played to the match's rules."""
+        return CricketInnings(self.batting_team, self.bowling_team, self.rules.overs_per_innings,
+                              self.rng.child("innings", len(self.innings)), self.events,
+                              self.rules.deliveries_per_over)
+
+    def update_state(self):
+        """Set the state from the innings; start() and play() call this so it is only needed after restoring."""
+        if len(self.innings) == 0 or self.innings[0].state == CricketInnings.READY:
+            self.state = CricketMatch.READY
+        elif len(self.innings) >= self.rules.innings * 2 and self.innings[-1].state == CricketInnings.FINISHED:
+            self.state = CricketMatch.FINISHED
+        else:
+            self.state = CricketMatch.PLAYING
 
-        self.innings.append(innings)
-        innings.start()
+    def next_innings(self):
+        """Start the next innings if the current one is over and the match isn't; play() calls this first."""
 
-    @property
-    def state(self):
+        # Check to see if the current innings is over...
+        if self.state != CricketMatch.FINISHED and self.current_innings.state == CricketInnings.FINISHED:
+            logging.info("Starting a new innings")
 
-        state = CricketMatch.PLAYING
+            # Swap teams over
+            temp = self.bowling_team
+            self.bowling_team = self.batting_team
+            self.batting_team = temp
 
-        if len(self.innings) == 0 or self.innings[0].state == CricketInnings.READY:
-            state = CricketMatch.READY
-        elif len(self.innings) == self.rules.innings * 2:
-            if self.innings[-1].state == CricketInnings.FINISHED:
-                state = CricketMatch.FINISHED
+            logging.info("%s batting, %s bowling." % (self.batting_team, self.bowling_team))
+
+            new_innings = self.new_innings()
+            new_innings.start()
+            self.innings.append(new_innings)
+
+    def auto_delivery(self):
+        """The delivery CricketBrain picks for the next ball, between the players who will face and bowl it and
+        with the luck drawn from the innings' random number stream, for playing a match with no input.
 
-        return state
+        If the current innings has finished the next one is started first."""
+        self.next_innings()
+        innings = self.current_innings
+        batsmen, bowler = innings.next_players()
+        return CricketBrain.delivery(batsmen, bowler, innings.rng)
 
     @property
     def current_innings(self):
@@ -483,49 +1186,63 @@ class CricketMatch():
             return self.innings[-1]
 
     def bowl(self, delivery: CricketDelivery):
+        """Play a delivery and raise an exception if it completed an over, an innings or the match.
 
-        # Check to see if the match has not finished
-        if self.state != CricketMatch.FINISHED:
+        This is kept for CricketCLI; use play() to get the outcome back without exceptions."""
 
-            # Check to see if the current innings is over...
-            if self.current_innings.state == CricketInnings.FINISHED:
-                logging.info("Starting a new innings")
+        if self.state == CricketMatch.FINISHED:
+            self.print()
+            raise (Exception("Match between %s and %s has finished." % (self.batting_team, self.bowling_team)))
+
+        outcome = self.play(delivery)
+
+        if outcome.status != CricketOutcome.CONTINUING:
+            raise (Exception(self.describe(outcome)))
+
+    def describe(self, outcome: CricketOutcome):
+        """What bowl() says about an outcome that completed an over, an innings or the match."""
 
-                # Swap teams over
-                temp = self.bowling_team
-                self.bowling_team = self.batting_team
-                self.batting_team = temp
+        if outcome.status == CricketOutcome.MATCH_COMPLETE:
+            return "Match between %s and %s has finished." % (self.batting_team, self.bowling_team)
 
-                logging.info("%s batting, %s bowling." % (self.batting_team, self.bowling_team))
+        elif outcome.status == CricketOutcome.INNINGS_COMPLETE:
+            return ("Innings over: %s score %i for %i after %.1f overs" %
+                    (self.current_innings.batting_team, outcome.runs, outcome.wickets, outcome.overs))
 
-                new_innings = CricketInnings(self.batting_team, self.bowling_team, self.rules.overs_per_innings)
-                new_innings.start()
-                self.innings.append(new_innings)
+        elif outcome.status == CricketOutcome.OVER_COMPLETE:
+            return "Over %i completed." % len(self.current_innings.overs)
 
-            self.current_innings.bowl(delivery)
+        return str(outcome)
 
-            # If the match has finished...
-            if self.state == CricketMatch.FINISHED:
-                print("\nIt's all over!")
-                self.print()
-                raise (Exception("Match between %s and %s has finished." % (self.batting_team, self.bowling_team)))
+    def play(self, delivery: CricketDelivery):
+        """Play a delivery and return a CricketOutcome saying what it led to, along with the innings score.
 
-            # The innings is over but the match is still going...
-            elif self.current_innings.state == CricketInnings.FINISHED:
+        If the match has already finished the delivery is ignored and the outcome is MATCH_COMPLETE."""
 
-                # Swap teams over
-                temp = self.bowling_team
-                self.bowling_team = self.batting_team
-                self.batting_team = temp
+        # Check to see if the match has not finished
+        if self.state != CricketMatch.FINISHED:
 
-                runs, wickets, overs = self.current_innings.score()
+            self.next_innings()
 
-                raise (Exception(
-                    "Innings of %s completed: %i for %i off %.1f overs" % (self.batting_team, runs, wickets, overs)))
+            status = self.current_innings.play(delivery)
+
+            # The match is under way after the first ball and has finished at the end of the last innings
+            if self.state == CricketMatch.READY:
+                self.state = CricketMatch.PLAYING
+            if status == CricketOutcome.INNINGS_COMPLETE:
+                self.update_state()
+                if self.state == CricketMatch.FINISHED:
+                    status = CricketOutcome.MATCH_COMPLETE
+                    if self.events.subscribers[CricketEvents.MATCH_COMPLETE]:
+                        self.events.publish(CricketEvents.MATCH_COMPLETE, self)
 
         else:
-            self.print()
-            raise (Exception("Match between %s and %s has finished." % (self.batting_team, self.bowling_team)))
+            status = CricketOutcome.MATCH_COMPLETE
+
+        innings = self.current_innings
+        return CricketOutcome(status, len(self.innings), innings.runs, innings.wickets, innings.balls,
+                              innings.deliveries_per_over)
+
 
 class CricketBrain():
 
@@ -550,83 +1267,549 @@ class CricketBrain():
     # Skill award for successful play
     SKILL_BONUS = 0.1
 
+    # Positions of the terms in a player's packed skills
+    PACKED_BATTING = 0
+    PACKED_BOWLING = 1
+    PACKED_SPEED = 2
+    PACKED_LUCK = 3
+
+    # Size of the steps that packed skills are rounded to when looking up outcome tables
+    TABLE_QUANTUM = 0.001
+
+    # Increase this after changing any of the constants so that players re-pack their skills
+    # and new outcome tables are calculated
+    generation = 0
+
+    # The constants that tune the outcome model, see configure()
+    PARAMETERS = ("LUCK_MULTIPLIER", "SKILL_MULTIPLIER", "SPEED_MULTIPLIER", "ACCURATE_BOWL_LIMIT", "NO_BALL_LIMIT",
+                  "WIDE_LIMIT", "SHOT_LIMIT", "WICKET_LIMIT", "SKILL_BONUS")
+
     def __init__(self):
         pass
 
     @staticmethod
-    def delivery(batsmen : CricketPlayer, bowler : CricketPlayer):
-        """Use player stats to calculate what delivery a bowler will deliver to a batsmen."""
-        type = CricketDelivery.DOT
-        runs = 0
+    def parameters():
+        """The current values of the model's tuning constants."""
+        return {name: getattr(CricketBrain, name) for name in CricketBrain.PARAMETERS}
 
+    @staticmethod
+    def configure(**parameters):
+        """Change some of the model's tuning constants, e.g. configure(WIDE_LIMIT=4.5).
 
-        # Get the bowler's skill stats
-        bowling_skill = bowler.get_skill(CricketPlayer.BOWLING) * CricketBrain.SKILL_MULTIPLIER
-        bowling_speed = bowler.get_skill(CricketPlayer.SPEED) * CricketBrain.SPEED_MULTIPLIER
-        bowling_luck = bowler.get_skill(CricketPlayer.LUCK) * random.random() * CricketBrain.LUCK_MULTIPLIER
+        Players re-pack their skills and outcome tables are recalculated for the new values."""
+        for name, value in parameters.items():
+            if name not in CricketBrain.PARAMETERS:
+                raise (Exception("Unknown CricketBrain parameter %s" % name))
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise (Exception("CricketBrain parameter %s must be a number, not %r" % (name, value)))
 
-        # Get the batsmen's skill stats
-        batting_skill = batsmen.get_skill(CricketPlayer.BATTING) * CricketBrain.SKILL_MULTIPLIER
-        batting_speed = batsmen.get_skill(CricketPlayer.SPEED) * CricketBrain.SPEED_MULTIPLIER
-        batting_luck = batsmen.get_skill(CricketPlayer.LUCK) * random.random() * CricketBrain.LUCK_MULTIPLIER
+        for name, value in parameters.items():
+            setattr(CricketBrain, name, value)
 
-        # Calculate the batsmens's and bowler's chances
-        batsmen_chance = (batting_skill + batting_luck - bowling_speed)
-        bowling_chance = (bowling_skill + bowling_luck)
+        CricketBrain.generation += 1
+        _cached_outcome_table.cache_clear()
 
-        print("Delivery calculator stats:")
-        print("bowler skill=%.3f speed=%.3f luck=%.3f chance=%.3f, batsmen skill=%.3f speed=%.3f luck=%.3f chance=%.3f" %
-              (bowling_skill, bowling_speed, bowling_luck, bowling_chance,
-               batting_skill, batting_speed, batting_luck, batsmen_chance))
+    @staticmethod
+    def pack_skills(skills: dict):
+        """Pre-scale the skills the brain uses: batting and bowling skill, speed and the unscaled luck.
 
-        # See if the bowler bowls an accurate ball...
-        if bowling_chance > CricketBrain.ACCURATE_BOWL_LIMIT:
+        Luck is left unscaled because it is multiplied by a random draw first, as in delivery()."""
+        return [skills[CricketPlayer.BATTING] * CricketBrain.SKILL_MULTIPLIER,
+                skills[CricketPlayer.BOWLING] * CricketBrain.SKILL_MULTIPLIER,
+                skills[CricketPlayer.SPEED] * CricketBrain.SPEED_MULTIPLIER,
+                skills[CricketPlayer.LUCK]]
 
-            logging.info("Accurate ball")
+    @staticmethod
+    def delivery(batsmen : CricketPlayer, bowler : CricketPlayer, rng: random.Random = None):
+        """Use player stats to calculate what delivery a bowler will deliver to a batsmen.
 
-            # Give the bowler a skill bonus for bowling an accurate ball
-            bowler.increase_skill(CricketPlayer.BOWLING, CricketBrain.SKILL_BONUS)
+        The luck draws come from rng, for example the match's CricketRandom, or the random module if not given."""
 
-            # If the batsmen is good enough to make a shot...
-            if batsmen_chance >= CricketBrain.SHOT_LIMIT:
+        if rng is None:
+            rng = random
+
+        type, runs = CricketBrain.fast_delivery(batsmen, bowler, rng.random)
+
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Delivery calculator: %s to %s: %s runs %i (bowler packed skills %s, batsmen packed skills %s)",
+                          bowler, batsmen, CricketDelivery.DESCRIPTION[type], runs,
+                          bowler.packed_skills, batsmen.packed_skills)
+
+        # Create the delivery that the brain has calculated
+        new_delivery = CricketDelivery(type, runs, bowler, batsmen)
+
+        return new_delivery
+
+    @staticmethod
+    def fast_delivery(batsmen : CricketPlayer, bowler : CricketPlayer, random_draw):
+        """Calculate the type and runs of a delivery from the players' packed skills and award any skill bonuses.
+
+        random_draw is a function returning a float in [0, 1), such as rng.random. This is the model behind
+        delivery() without creating a CricketDelivery object."""
+        type, runs, bowler_bonuses, batsmen_bonuses = CricketBrain.outcome(batsmen.packed_skills, bowler.packed_skills,
+                                                                           random_draw)
+        if bowler_bonuses > 0:
+            CricketBrain.award_bonuses(batsmen, bowler, bowler_bonuses, batsmen_bonuses)
+        return type, runs
 
-                logging.info("Make a shot")
+    @staticmethod
+    def award_bonuses(batsmen: CricketPlayer, bowler: CricketPlayer, bowler_bonuses: int, batsmen_bonuses: int):
+        """Give the bowler a skill bonus for each accurate ball or wicket and the batsmen one for making runs."""
+        for i in range(bowler_bonuses):
+            bowler.award_bonus(CricketPlayer.BOWLING, CricketBrain.PACKED_BOWLING, CricketBrain.SKILL_MULTIPLIER,
+                               CricketBrain.SKILL_BONUS)
+        if batsmen_bonuses > 0:
+            batsmen.award_bonus(CricketPlayer.BATTING, CricketBrain.PACKED_BATTING, CricketBrain.SKILL_MULTIPLIER,
+                                CricketBrain.SKILL_BONUS)
 
-                # Make the delivery some runs...
-                type = CricketDelivery.RUNS
+    @staticmethod
+    def outcome(batsmen_packed: list, bowler_packed: list, random_draw):
+        """The model itself: decide a delivery from the players' packed skills and two random draws.
+
+        Returns (type, runs, bowler bonuses, batsmen bonuses), the same outcomes as a CricketOutcomeTable, leaving
+        the caller to award the bonuses. delivery_batch() is the same model for arrays of players."""
+        # Packed skills are [batting, bowling, speed, luck], see pack_skills()
+        # Calculate the batsmens's and bowler's chances, with the bowler's luck drawn first
+        bowling_chance = bowler_packed[1] + bowler_packed[3] * random_draw() * CricketBrain.LUCK_MULTIPLIER
+        batting_skill = batsmen_packed[0]
+        batting_luck = batsmen_packed[3] * random_draw() * CricketBrain.LUCK_MULTIPLIER
+        batsmen_chance = batting_skill + batting_luck - bowler_packed[2]
 
-                # ...and use the batsmen's skills to determine how many runs.
-                runs = ((batting_skill + batting_luck + batting_speed) * 6/15) // 1
+        # See if the bowler bowls an accurate ball...
+        if bowling_chance > CricketBrain.ACCURATE_BOWL_LIMIT:
 
-                # Give the batsmen a skill bonus for getting some runs
-                batsmen.increase_skill(CricketPlayer.BATTING, CricketBrain.SKILL_BONUS)
+            # If the batsmen is good enough to make a shot use the batsmen's skills to determine how many runs
+            if batsmen_chance >= CricketBrain.SHOT_LIMIT:
+                return CricketDelivery.RUNS, int(((batting_skill + batting_luck + batsmen_packed[2]) * 6/15) // 1), 1, 1
 
             # Else see if the batsmen can't defend their wicket...
             elif batsmen_chance < CricketBrain.WICKET_LIMIT:
+                return CricketDelivery.WICKET, 0, 2, 0
 
-                logging.info("Wicket fallen")
+            return CricketDelivery.DOT, 0, 1, 0
 
-                # Make the delivery a wicket
-                type = CricketDelivery.WICKET
+        # If the ball was not accurate then see what happens...
+        elif bowling_chance < CricketBrain.NO_BALL_LIMIT:
+            return CricketDelivery.NO_BALL, CricketRules.runs(CricketDelivery.NO_BALL), 0, 0
 
-                # give the bowler a skill bonus for getting a wicket
-                bowler.increase_skill(CricketPlayer.BOWLING, CricketBrain.SKILL_BONUS)
+        elif bowling_chance < CricketBrain.WIDE_LIMIT:
+            return CricketDelivery.WIDE, CricketRules.runs(CricketDelivery.WIDE), 0, 0
 
-        # If the ball was not accurate then see what happens...
-        else:
-            if bowling_chance < CricketBrain.NO_BALL_LIMIT:
+        return CricketDelivery.DOT, 0, 0, 0
 
-                logging.info("No ball")
-                type = CricketDelivery.NO_BALL
-                runs = CricketRules.runs(type)
+    @staticmethod
+    def outcome_table(batsmen: CricketPlayer, bowler: CricketPlayer):
+        """Get the CricketOutcomeTable for a batsmen facing a bowler.
+
+        Tables are cached by the packed skills that they depend on, the batsmen's batting, speed and luck and the
+        bowler's bowling, speed and luck, rounded to TABLE_QUANTUM, dropping the least recently used once the cache
+        is full. They are meant for projections, which hold skills still; every skill bonus earned in play moves a
+        player to a new table so playing deliveries from them would rarely reuse one."""
+        quantum = CricketBrain.TABLE_QUANTUM
+        batsmen_packed = batsmen.packed_skills
+        bowler_packed = bowler.packed_skills
+        key = (round(batsmen_packed[CricketBrain.PACKED_BATTING] / quantum),
+               round(batsmen_packed[CricketBrain.PACKED_SPEED] / quantum),
+               round(batsmen_packed[CricketBrain.PACKED_LUCK] / quantum),
+               round(bowler_packed[CricketBrain.PACKED_BOWLING] / quantum),
+               round(bowler_packed[CricketBrain.PACKED_SPEED] / quantum),
+               round(bowler_packed[CricketBrain.PACKED_LUCK] / quantum),
+               quantum, CricketBrain.generation)
+        return _cached_outcome_table(key)
 
-            elif bowling_chance < CricketBrain.WIDE_LIMIT:
+    @staticmethod
+    def table_cache_info():
+        """Hits, misses and size of the outcome table cache, as functools.lru_cache's cache_info()."""
+        return _cached_outcome_table.cache_info()
 
-                logging.info("Wide")
-                type = CricketDelivery.WIDE
-                runs = CricketRules.runs(type)
+    @staticmethod
+    def table_delivery(batsmen: CricketPlayer, bowler: CricketPlayer, random_draw):
+        """Sample the type and runs of a delivery from the players' outcome table with one random draw
+        and award the same skill bonuses as fast_delivery().
 
-        # Create the delivery that the brain has calculated
-        new_delivery = CricketDelivery(type, runs, bowler, batsmen)
+        This gives deliveries with the same probabilities as fast_delivery() but isn't quicker in play, see
+        outcome_table()."""
+        type, runs, bowler_bonuses, batsmen_bonuses = CricketBrain.outcome_table(batsmen, bowler).sample(random_draw())
+        if bowler_bonuses > 0:
+            CricketBrain.award_bonuses(batsmen, bowler, bowler_bonuses, batsmen_bonuses)
+        return type, runs
+
+    @staticmethod
+    def delivery_batch(batsmen_skills, bowler_skills, rng, bonuses: bool = False):
+        """Calculate one delivery for each of a batch of batsmen and bowler pairings in a single call.
+
+        batsmen_skills and bowler_skills are arrays of shape (n, len(CricketPlayer.SKILLS)) holding skill
+        vectors in CricketPlayer.SKILLS order (see CricketPlayer.skill_vector()) and rng is a numpy Generator.
+        Uses the same model and limits as outcome() but does not award skill bonuses.
+        Returns an array of delivery types and an array of runs, and if bonuses is True arrays of how many skill
+        bonuses each bowler and batsmen has earned, as outcome() does."""
+
+        import numpy as np
+
+        batsmen_skills = np.asarray(batsmen_skills, dtype=np.float64)
+        bowler_skills = np.asarray(bowler_skills, dtype=np.float64)
+
+        batting = CricketPlayer.SKILLS.index(CricketPlayer.BATTING)
+        bowling = CricketPlayer.SKILLS.index(CricketPlayer.BOWLING)
+        speed = CricketPlayer.SKILLS.index(CricketPlayer.SPEED)
+        luck = CricketPlayer.SKILLS.index(CricketPlayer.LUCK)
+
+        # Bowler's luck draws come first and then the batsmen's, as in delivery()
+        draws = rng.random((2, batsmen_skills.shape[0]))
+
+        bowling_skill = bowler_skills[:, bowling] * CricketBrain.SKILL_MULTIPLIER
+        bowling_speed = bowler_skills[:, speed] * CricketBrain.SPEED_MULTIPLIER
+        bowling_luck = bowler_skills[:, luck] * draws[0] * CricketBrain.LUCK_MULTIPLIER
+
+        batting_skill = batsmen_skills[:, batting] * CricketBrain.SKILL_MULTIPLIER
+        batting_speed = batsmen_skills[:, speed] * CricketBrain.SPEED_MULTIPLIER
+        batting_luck = batsmen_skills[:, luck] * draws[1] * CricketBrain.LUCK_MULTIPLIER
+
+        batsmen_chance = batting_skill + batting_luck - bowling_speed
+        bowling_chance = bowling_skill + bowling_luck
+
+        accurate = bowling_chance > CricketBrain.ACCURATE_BOWL_LIMIT
+        shot = accurate & (batsmen_chance >= CricketBrain.SHOT_LIMIT)
+        wicket = accurate & ~shot & (batsmen_chance < CricketBrain.WICKET_LIMIT)
+        no_ball = ~accurate & (bowling_chance < CricketBrain.NO_BALL_LIMIT)
+        wide = ~accurate & ~no_ball & (bowling_chance < CricketBrain.WIDE_LIMIT)
+
+        types = np.full(batsmen_skills.shape[0], CricketDelivery.DOT, dtype=np.int8)
+        types[shot] = CricketDelivery.RUNS
+        types[wicket] = CricketDelivery.WICKET
+        types[no_ball] = CricketDelivery.NO_BALL
+        types[wide] = CricketDelivery.WIDE
+
+        runs = np.zeros(batsmen_skills.shape[0], dtype=np.int16)
+        runs[shot] = ((batting_skill + batting_luck + batting_speed)[shot] * 6 / 15) // 1
+        runs[no_ball] = CricketRules.runs(CricketDelivery.NO_BALL)
+        runs[wide] = CricketRules.runs(CricketDelivery.WIDE)
+
+        if bonuses is True:
+            return types, runs, accurate.astype(np.int8) + wicket, shot.astype(np.int8)
+        return types, runs
+
+
+def _uniform_probability(start: float, width: float, low: float, high: float):
+    """Probability that start + width * U lies in [low, high) when U is uniform on [0, 1)."""
+    if width <= 0:
+        return 1.0 if low <= start < high else 0.0
+    overlap = min(high, start + width) - max(low, start)
+    return max(0.0, overlap) / width
+
+
+class CricketOutcomeTable():
+    """Exact probabilities of every outcome of a delivery between a batsmen and a bowler under CricketBrain's model.
+
+    Built from the players' packed skills. Each outcome is (type, runs, bowler bonuses, batsmen bonuses) so that
+    sampling from the table can award the same skill bonuses as fast_delivery()."""
+
+    __slots__ = ("outcomes", "probabilities", "cumulative")
+
+    def __init__(self, batsmen_packed: list, bowler_packed: list):
+        batting_skill = batsmen_packed[CricketBrain.PACKED_BATTING]
+        batting_speed = batsmen_packed[CricketBrain.PACKED_SPEED]
+        batting_width = batsmen_packed[CricketBrain.PACKED_LUCK] * CricketBrain.LUCK_MULTIPLIER
+        bowling_skill = bowler_packed[CricketBrain.PACKED_BOWLING]
+        bowling_speed = bowler_packed[CricketBrain.PACKED_SPEED]
+        bowling_width = bowler_packed[CricketBrain.PACKED_LUCK] * CricketBrain.LUCK_MULTIPLIER
+        infinity = float("inf")
+
+        outcomes = []
+
+        # The bowler's chance decides if the ball is accurate, a no ball or a wide...
+        accurate_limit = CricketBrain.ACCURATE_BOWL_LIMIT
+        no_ball_limit = min(CricketBrain.NO_BALL_LIMIT, accurate_limit)
+        wide_limit = max(no_ball_limit, min(CricketBrain.WIDE_LIMIT, accurate_limit))
+        accurate = _uniform_probability(bowling_skill, bowling_width, accurate_limit, infinity)
+        no_ball = _uniform_probability(bowling_skill, bowling_width, -infinity, no_ball_limit)
+        wide = _uniform_probability(bowling_skill, bowling_width, no_ball_limit, wide_limit)
+        outcomes.append(((CricketDelivery.NO_BALL, CricketRules.runs(CricketDelivery.NO_BALL), 0, 0), no_ball))
+        outcomes.append(((CricketDelivery.WIDE, CricketRules.runs(CricketDelivery.WIDE), 0, 0), wide))
+        outcomes.append(((CricketDelivery.DOT, 0, 0, 0), max(0.0, 1.0 - accurate - no_ball - wide)))
+
+        # ...and if it is accurate then the batsmen's luck decides between a shot, a wicket or a dot ball
+        if accurate > 0:
+            start = batting_skill - bowling_speed
+            shot_limit = CricketBrain.SHOT_LIMIT
+            wicket_limit = min(CricketBrain.WICKET_LIMIT, shot_limit)
+            wicket = _uniform_probability(start, batting_width, -infinity, wicket_limit)
+            outcomes.append(((CricketDelivery.WICKET, 0, 2, 0), accurate * wicket))
+
+            # The runs scored grow with the batsmen's luck so split the shots by the luck that gives each score
+            shot = _uniform_probability(start, batting_width, shot_limit, infinity)
+            if shot > 0:
+                lowest_luck = max(0.0, shot_limit - start)
+                highest_luck = max(lowest_luck, batting_width)
+                to_runs = 6 / 15
+                base = batting_skill + batting_speed
+                lowest_runs = int(((base + lowest_luck) * to_runs) // 1)
+                highest_runs = int(((base + highest_luck) * to_runs) // 1)
+                for runs in range(lowest_runs, highest_runs + 1):
+                    luck_from = max(lowest_luck, runs / to_runs - base)
+                    luck_to = min(highest_luck, (runs + 1) / to_runs - base)
+                    if batting_width > 0:
+                        p = max(0.0, luck_to - luck_from) / batting_width
+                    else:
+                        p = 1.0 if runs == lowest_runs else 0.0
+                    outcomes.append(((CricketDelivery.RUNS, runs, 1, 1), accurate * p))
+
+            outcomes.append(((CricketDelivery.DOT, 0, 1, 0), accurate * max(0.0, 1.0 - wicket - shot)))
+
+        # Keep the outcomes that can happen along with a running total of their probabilities for sampling
+        self.outcomes = []
+        self.probabilities = []
+        self.cumulative = []
+        total = 0.0
+        for outcome, probability in outcomes:
+            if probability > 0:
+                total += probability
+                self.outcomes.append(outcome)
+                self.probabilities.append(probability)
+                self.cumulative.append(total)
+
+    def sample(self, draw: float):
+        """Pick an outcome using a random draw in [0, 1)."""
+        i = bisect_right(self.cumulative, draw * self.cumulative[-1])
+        return self.outcomes[min(i, len(self.outcomes) - 1)]
+
+    def probability(self, type: int):
+        """Probability of a delivery of the specified type."""
+        total = 0.0
+        for i in range(len(self.outcomes)):
+            if self.outcomes[i][0] == type:
+                total += self.probabilities[i]
+        return total
 
-        return new_delivery
\ No newline at end of file
+    @property
+    def expected_runs(self):
+        total = 0.0
+        for i in range(len(self.outcomes)):
+            total += self.outcomes[i][1] * self.probabilities[i]
+        return total
+
+    @property
+    def wicket_probability(self):
+        return self.probability(CricketDelivery.WICKET)
+
+
+@functools.lru_cache(maxsize=65536)
+def _cached_outcome_table(key: tuple):
+    quantum = key[6]
+    batting, batting_speed, batting_luck, bowling, bowling_speed, bowling_luck = (value * quantum for value in key[:6])
+    return CricketOutcomeTable([batting, 0.0, batting_speed, batting_luck], [0.0, bowling, bowling_speed, bowling_luck])
+
+
+class CricketProjection():
+    """Distribution of the final total of an innings, as worked out by project_score()."""
+
+    def __init__(self, distribution: dict, all_out: float):
+        # Probability of each final total
+        self.distribution = distribution
+
+        # Probability that the batting side is all out before the end of the innings
+        self.all_out = all_out
+
+    @property
+    def mean(self):
+        total = 0.0
+        for runs, probability in self.distribution.items():
+            total += runs * probability
+        return total
+
+    @property
+    def variance(self):
+        mean = self.mean
+        total = 0.0
+        for runs, probability in self.distribution.items():
+            total += (runs - mean) ** 2 * probability
+        return total
+
+    def percentile(self, percent: float):
+        """The lowest total that the innings reaches or falls short of with the given percentage probability."""
+        target = percent / 100
+        cumulative = 0.0
+        runs = None
+        for runs in sorted(self.distribution.keys()):
+            cumulative += self.distribution[runs]
+            if cumulative >= target - 1e-12:
+                return runs
+        return runs
+
+    def probability_at_least(self, runs: int):
+        total = 0.0
+        for total_runs, probability in self.distribution.items():
+            if total_runs >= runs:
+                total += probability
+        return total
+
+    def __str__(self):
+        return "Projected total %.1f (median %i, 10%%-90%% %i-%i), all out %.1f%%" % (
+            self.mean, self.percentile(50), self.percentile(10), self.percentile(90), self.all_out * 100)
+
+
+# Ignore totals whose probability falls below this when projecting scores
+PROJECTION_CUTOFF = 1e-12
+
+
+def _add_shifted(target: dict, key, offset: int, shift: int, runs: list, scale: float):
+    """Add a runs distribution, shifted by some runs and scaled by a probability, into target[key]."""
+    entry = target.get(key)
+    new_offset = offset + shift
+    if entry is None:
+        target[key] = (new_offset, [p * scale for p in runs])
+        return
+
+    old_offset, old_runs = entry
+    start = min(old_offset, new_offset)
+    end = max(old_offset + len(old_runs), new_offset + len(runs))
+    if start == old_offset and end == old_offset + len(old_runs):
+        merged = old_runs
+    else:
+        merged = [0.0] * (end - start)
+        merged[old_offset - start:old_offset - start + len(old_runs)] = old_runs
+    i = new_offset - start
+    merged[i:i + len(runs)] = [a + p * scale for a, p in zip(merged[i:i + len(runs)], runs)]
+    target[key] = (start, merged)
+
+
+def _transitions(batsmen: CricketPlayer, bowler: CricketPlayer):
+    """Collapse a batsmen's outcome table against a bowler into (what happens, runs, probability).
+
+    What happens is 0 if the batsmen stay at the same ends, 1 if they swap ends and 2 for a wicket."""
+    table = CricketBrain.outcome_table(batsmen, bowler)
+    totals = {}
+    for i in range(len(table.outcomes)):
+        type, runs = table.outcomes[i][0], table.outcomes[i][1]
+        if type == CricketDelivery.WICKET:
+            change = 2
+        elif type in (CricketDelivery.RUNS, CricketDelivery.BYES) and runs % 2 > 0:
+            change = 1
+        else:
+            change = 0
+        key = (change, runs)
+        totals[key] = totals.get(key, 0.0) + table.probabilities[i]
+    return [(change, runs, probability) for (change, runs), probability in totals.items()]
+
+
+def project_score(batsmen_in: list, batsmen: list, bowlers: list, runs: int, balls: int, balls_left: int,
+                  deliveries_per_over: int = 6):
+    """Work out the distribution of an innings' final total with a Markov chain over who is batting.
+
+    batsmen_in is the facing batsmen and their partner, batsmen the rest of the batting order still to come in
+    and bowlers the bowling rotation starting with whoever bowls the next delivery's over. runs and balls are
+    the score so far and balls_left how many deliveries remain. Outcome probabilities come from
+    CricketBrain.outcome_table() with the players' current skills; skill bonuses earned along the way are
+    not modelled. Returns a CricketProjection."""
+
+    order = list(batsmen_in) + list(batsmen)
+
+    # Each state is (facing batsmen, other batsmen, next batsmen in) -> (lowest runs, probabilities of each total)
+    states = {(0, 1, 2): (runs, [1.0])}
+    finished = {}
+    all_out = 0.0
+    transitions = {}
+
+    bowler_index = 0
+    for ball in range(balls, balls + balls_left):
+
+        # A new over means a new bowler and the batsmen swap ends
+        if ball > balls and ball % deliveries_per_over == 0:
+            bowler_index = (bowler_index + 1) % len(bowlers)
+            states = {(non_striker, striker, next_in): value
+                      for (striker, non_striker, next_in), value in states.items()}
+
+        new_states = {}
+        for (striker, non_striker, next_in), (offset, distribution) in states.items():
+            key = (striker, bowler_index)
+            if key not in transitions:
+                transitions[key] = _transitions(order[striker], bowlers[bowler_index])
+
+            for change, change_runs, probability in transitions[key]:
+                if change == 0:
+                    _add_shifted(new_states, (striker, non_striker, next_in), offset, change_runs, distribution,
+                                 probability)
+                elif change == 1:
+                    _add_shifted(new_states, (non_striker, striker, next_in), offset, change_runs, distribution,
+                                 probability)
+                elif next_in < len(order):
+                    _add_shifted(new_states, (next_in, non_striker, next_in + 1), offset, change_runs, distribution,
+                                 probability)
+                else:
+                    # No one left to come in so the innings is over
+                    _add_shifted(finished, None, offset, change_runs, distribution, probability)
+                    all_out += probability * sum(distribution)
+
+        # Drop totals too unlikely to matter from the ends of each distribution
+        states = {}
+        for key, (offset, distribution) in new_states.items():
+            start = 0
+            end = len(distribution)
+            while start < end and distribution[start] < PROJECTION_CUTOFF:
+                start += 1
+            while end > start and distribution[end - 1] < PROJECTION_CUTOFF:
+                end -= 1
+            if end > start:
+                states[key] = (offset + start, distribution[start:end])
+
+    # Whatever is still batting at the end has used up all the balls
+    for key, (offset, distribution) in states.items():
+        _add_shifted(finished, None, offset, 0, distribution, 1.0)
+
+    result = {}
+    if None in finished:
+        offset, distribution = finished[None]
+        for i in range(len(distribution)):
+            if distribution[i] > 0:
+                result[offset + i] = distribution[i]
+
+    return CricketProjection(result, all_out)
+
+
+def expected_score(batsmen_in: list, batsmen: list, bowlers: list, runs: int, balls: int, balls_left: int,
+                   deliveries_per_over: int = 6):
+    """Work out just the mean of the final total that project_score() gives, which is much quicker.
+
+    The Markov chain only needs the probability of each (facing batsmen, other batsmen, next batsmen in) state,
+    adding up the expected runs of every ball rather than carrying a distribution of totals for each state."""
+
+    order = list(batsmen_in) + list(batsmen)
+    states = {(0, 1, 2): 1.0}
+    total = float(runs)
+    transitions = {}
+
+    bowler_index = 0
+    for ball in range(balls, balls + balls_left):
+
+        # A new over means a new bowler and the batsmen swap ends
+        if ball > balls and ball % deliveries_per_over == 0:
+            bowler_index = (bowler_index + 1) % len(bowlers)
+            states = {(non_striker, striker, next_in): probability
+                      for (striker, non_striker, next_in), probability in states.items()}
+
+        new_states = {}
+        for state, state_probability in states.items():
+            striker, non_striker, next_in = state
+            key = (striker, bowler_index)
+            if key not in transitions:
+                transitions[key] = _transitions(order[striker], bowlers[bowler_index])
+
+            for change, change_runs, probability in transitions[key]:
+                probability *= state_probability
+                total += change_runs * probability
+                if change == 0:
+                    new_state = state
+                elif change == 1:
+                    new_state = (non_striker, striker, next_in)
+                elif next_in < len(order):
+                    new_state = (next_in, non_striker, next_in + 1)
+                else:
+                    # No one left to come in so the innings is over
+                    continue
+                new_states[new_state] = new_states.get(new_state, 0.0) + probability
+
+        states = {state: probability for state, probability in new_states.items() if probability >= PROJECTION_CUTOFF}
+        if len(states) == 0:
+            break
+
+    return total
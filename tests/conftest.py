@@ -0,0 +1,36 @@
+import pytest
+from pycricket import *
+
+
+def new_match(overs: int, seed: int, players: int = 11):
+    """Create a match between two new teams with the specified number of overs per innings."""
+    rules = CricketRules("Test")
+    rules.overs_per_innings = overs
+    rules.max_player = players
+
+    match = CricketMatch("Test", rules, seed)
+    for i, name in enumerate(("Home", "Away")):
+        rng = match.rng.child("team", i)
+        team = CricketTeam(name)
+        for j in range(players):
+            team.add_player(CricketPlayer("%s %i" % (name, j + 1), rng))
+        match.add_team(team)
+    return match
+
+
+def play_match(match: CricketMatch):
+    """Play a match to the end with CricketBrain picking every delivery and return it."""
+    match.start(match.list_teams[0])
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        pass
+    return match
+
+
+@pytest.fixture
+def make_match():
+    return new_match
+
+
+@pytest.fixture
+def play():
+    return play_match
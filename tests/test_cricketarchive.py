@@ -0,0 +1,37 @@
+from pycricket import *
+from cricketarchive import CricketArchive, CricketArchiveReader
+from cricketstats import CricketStatsAggregator
+
+
+def test_record_stops_when_the_match_is_over(make_match, play, tmp_path):
+    path = str(tmp_path / "matches.bin")
+    with CricketArchive(path) as archive:
+        deliveries = 0
+        for seed in range(5):
+            match = make_match(2, seed)
+            archive.record(match)
+            play(match)
+            deliveries += sum(len(innings.log) for innings in match.innings)
+
+            assert archive.recording == {}
+            assert match.events.subscribers[CricketEvents.INNINGS_COMPLETE] == []
+            assert match.events.subscribers[CricketEvents.MATCH_COMPLETE] == []
+
+    with CricketArchiveReader(path) as reader:
+        assert len(reader) == deliveries
+        assert reader.column("match").max() == 5
+
+
+def test_record_alongside_other_subscribers(make_match, play, tmp_path):
+    path = str(tmp_path / "matches.bin")
+    aggregator = CricketStatsAggregator()
+    match = make_match(2, 1)
+    with CricketArchive(path) as archive:
+        archive.record(match)
+        aggregator.subscribe(match)
+        play(match)
+
+        # Each unsubscribes itself when the match is over without the other missing the event
+        assert archive.recording == {}
+        assert aggregator.subscriptions == {}
+        assert sum(team.won + team.lost + team.tied for team in aggregator.teams.values()) == 2
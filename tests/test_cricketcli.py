@@ -0,0 +1,18 @@
+import contextlib
+import io
+from pycricket import *
+from CricketCLI import CricketCLI
+from main import new_match
+
+
+def test_auto_plays_the_same_match_as_the_engine(play):
+    match = new_match("England", "Australia", 3)
+    cli = CricketCLI(match, io.StringIO(), io.StringIO())
+    match.start(match.list_teams[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        while match.state != CricketMatch.FINISHED:
+            cli.onecmd("auto 10")
+
+    expected = play(new_match("England", "Australia", 3))
+    assert [(innings.log.types, innings.log.runs) for innings in match.innings] == \
+           [(innings.log.types, innings.log.runs) for innings in expected.innings]
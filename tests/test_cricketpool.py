@@ -0,0 +1,61 @@
+import pickle
+import pytest
+from pycricket import *
+from cricketpool import CricketPlayerPool
+from cricketsim import simulate_match
+
+
+def make_pool():
+    pool = CricketPlayerPool(8)
+    pool.generate(22, rng=1)
+    return pool
+
+
+def test_views_of_the_matrix_are_read_only():
+    pool = make_pool()
+    for view in (pool.skill_matrix, pool.column(CricketPlayer.BATTING),
+                 pickle.loads(pickle.dumps(pool)).column(CricketPlayer.BATTING)):
+        with pytest.raises(ValueError):
+            view[0] = 0.0
+
+
+def test_players_repack_the_skills_the_pool_changes():
+    pool = make_pool()
+    players = [pool.player_at(row) for row in range(4)]
+    before = [list(player.packed_skills) for player in players]
+
+    pool.set_column(CricketPlayer.BATTING, 0.0, [0, 1])
+    matrix = pool.skill_matrix.copy()
+    matrix[2] = 0.5
+    pool.set_skill_matrix(matrix[2:3], [2])
+    players[3].skills[CricketPlayer.SPEED] = 1.0
+
+    for player in players:
+        assert player.packed_skills == CricketBrain.pack_skills(player.skills)
+    assert players[0].packed_skills[CricketBrain.PACKED_BATTING] == 0.0
+    assert players[2].packed_skills != before[2]
+    assert players[3].packed_skills[CricketBrain.PACKED_SPEED] == CricketBrain.SPEED_MULTIPLIER
+
+
+def test_engine_and_simulation_agree_after_the_pool_changes():
+    pool = make_pool()
+    rules = CricketRules("Pool")
+    rules.overs_per_innings = 5
+    rules.max_player = 11
+    team_a, team_b = pool.teams(["Home", "Away"], 11)
+
+    # Pack every player's skills and then change them all
+    for player in team_a.list_players + team_b.list_players:
+        player.packed_skills
+    pool.set_column(CricketPlayer.BOWLING, pool.column(CricketPlayer.BOWLING) * 0.5)
+
+    result = simulate_match(rules, team_a, team_b, 3)
+    match = CricketMatch("Pool", rules, 3)
+    match.add_team(team_a)
+    match.add_team(team_b)
+    match.start(team_a)
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        pass
+
+    assert [innings[1:] for innings in result.innings] == [(innings.runs, innings.wickets, innings.balls)
+                                                           for innings in match.innings]
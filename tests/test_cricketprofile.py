@@ -0,0 +1,22 @@
+import logging
+from pycricket import *
+import cricketprofile
+
+
+def test_disable_puts_back_the_engine_and_logging_exactly(make_match, play):
+    methods = [cls.__dict__[name] for phase, cls, name in cricketprofile.PHASES]
+    functions = [getattr(logging, name) for name in cricketprofile.LOGGING_FUNCTIONS]
+
+    cricketprofile.reset()
+    cricketprofile.enable()
+    try:
+        play(make_match(2, 1))
+        logging.info("Profiling")
+    finally:
+        cricketprofile.disable()
+    stats = cricketprofile.stats()
+
+    assert [cls.__dict__[name] for phase, cls, name in cricketprofile.PHASES] == methods
+    assert [getattr(logging, name) for name in cricketprofile.LOGGING_FUNCTIONS] == functions
+    assert stats["match.play"]["calls"] > 0
+    assert stats[cricketprofile.LOGGING]["calls"] > 0
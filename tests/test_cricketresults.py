@@ -0,0 +1,31 @@
+from pycricket import *
+from cricketresults import CricketResultsStore
+
+
+def test_subscriptions_end_with_the_match(make_match, play):
+    store = CricketResultsStore()
+    deliveries = 0
+    for seed in range(5):
+        match = make_match(2, seed)
+        store.subscribe(match)
+        play(match)
+        deliveries += sum(len(innings.log) for innings in match.innings)
+
+        assert store.subscriptions == {}
+        assert match.events.subscribers[CricketEvents.INNINGS_COMPLETE] == []
+        assert match.events.subscribers[CricketEvents.MATCH_COMPLETE] == []
+
+    assert len(store) == deliveries
+    assert store.query(innings=2).count == sum(1 for i in range(len(store)) if store.column("innings")[i] == 2)
+
+
+def test_subscribe_gives_the_same_rows_as_add_match(make_match, play):
+    subscribed = CricketResultsStore()
+    added = CricketResultsStore()
+    match = make_match(2, 7)
+    subscribed.subscribe(match)
+    play(match)
+    added.add_match(match)
+
+    for name in ("match", "innings", "over", "ball", "batter", "bowler", "type", "runs"):
+        assert subscribed.column(name).tolist() == added.column(name).tolist()
@@ -0,0 +1,24 @@
+import asyncio
+from pycricket import *
+from cricketserver import CricketServer
+
+
+async def run_session(commands: list):
+    """Play one session on a local server and return everything it sent back."""
+    server = await CricketServer().start(port=0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write("".join(command + "\n" for command in commands).encode())
+        await writer.drain()
+        output = await reader.read()
+        writer.close()
+    return output.decode()
+
+
+def test_bowl_takes_the_delivery_type_by_name_as_the_console_does():
+    output = asyncio.run(run_session(["start", "1", "bowl Shot 4", "bowl no ball", "score", "quit", "1"]))
+
+    assert "Select a delivery" not in output
+    assert "Over 1.1 Jane to Keith:Shot: runs 4" in output
+    assert "Over 1.2 Jane to Keith:No Ball: runs %i" % CricketRules.runs(CricketDelivery.NO_BALL) in output
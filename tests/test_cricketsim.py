@@ -0,0 +1,64 @@
+import pytest
+from pycricket import *
+from cricketsim import simulate_match, simulate_matches
+from crickettournament import CricketTournament
+
+
+def test_simulate_match_plays_the_same_innings_as_the_engine(make_match, play):
+    for seed, overs, deliveries_per_over in ((1, 2, 6), (2, 20, 6), (3, 20, 5), (4, 50, 6)):
+        match = make_match(overs, seed)
+        match.rules.deliveries_per_over = deliveries_per_over
+        team_a, team_b = match.list_teams
+        team_a.bowling_order = team_a.list_players[:3]
+
+        result = simulate_match(match.rules, team_a, team_b, seed)
+        played = play(match)
+        assert [innings[1:] for innings in result.innings] == [(innings.runs, innings.wickets, innings.balls)
+                                                               for innings in played.innings]
+
+
+def test_simulate_match_leaves_the_teams_unchanged(make_match):
+    match = make_match(20, 5)
+    team_a, team_b = match.list_teams
+    skills = [dict(player.skills) for player in team_a.list_players + team_b.list_players]
+    first = simulate_match(match.rules, team_a, team_b, 5)
+
+    assert [dict(player.skills) for player in team_a.list_players + team_b.list_players] == skills
+    assert simulate_match(match.rules, team_a, team_b, 5).innings == first.innings
+
+
+def test_simulate_matches_is_repeatable(make_match):
+    match = make_match(20, 6)
+    fixtures = [tuple(match.list_teams)] * 50
+    first = simulate_matches(match.rules, fixtures, 6)
+    second = simulate_matches(match.rules, fixtures, 6)
+    assert [result.innings for result in first] == [result.innings for result in second]
+
+
+def test_simulate_matches_has_the_same_distribution_as_simulate_match(make_match):
+    match = make_match(20, 7)
+    match.list_teams[0].bowling_order = match.list_teams[0].list_players[:4]
+    team_a, team_b = match.list_teams
+    single = [simulate_match(match.rules, team_a, team_b, seed) for seed in range(400)]
+    batch = simulate_matches(match.rules, [(team_a, team_b)] * 2000, 7)
+
+    for i in range(2):
+        for field in (1, 2, 3):
+            expected = sum(result.innings[i][field] for result in single) / len(single)
+            actual = sum(result.innings[i][field] for result in batch) / len(batch)
+            assert abs(actual - expected) <= max(0.05 * expected, 0.5)
+
+
+def test_every_engine_enforces_the_squad_limit(make_match):
+    match = make_match(2, 8)
+    team_a, team_b = match.list_teams
+    match.rules.max_player = 10
+
+    with pytest.raises(Exception):
+        match.start(team_a)
+    with pytest.raises(Exception):
+        simulate_match(match.rules, team_a, team_b, 8)
+    with pytest.raises(Exception):
+        simulate_matches(match.rules, [(team_a, team_b)], 8)
+    with pytest.raises(Exception):
+        CricketTournament("Too many", match.rules, [team_a, team_b], workers=1)
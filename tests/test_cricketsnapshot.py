@@ -0,0 +1,50 @@
+import os
+from pycricket import *
+from cricketsnapshot import snapshot, restore
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def continuation(match: CricketMatch):
+    """Play a match on to the end and return every innings' ball by ball log."""
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        pass
+    return [(innings.log.types, innings.log.runs, innings.log.batsmen, innings.log.bowlers)
+            for innings in match.innings]
+
+
+def test_restored_match_plays_on_as_the_original(make_match):
+    for seed, balls in ((1, 50), (2, 150), (3, 239)):
+        match = make_match(20, seed)
+        team = match.list_teams[1]
+        team.bowling_order = team.list_players[:5]
+        match.start(match.list_teams[0])
+        for i in range(balls):
+            match.play(match.auto_delivery())
+
+        data = snapshot(match)
+        copy = restore(data)
+        assert snapshot(copy) == data
+        assert copy.current_innings.render_score_card() == match.current_innings.render_score_card()
+        assert continuation(copy) == continuation(match)
+
+
+def test_version_1_snapshot_can_still_be_restored():
+    with open(os.path.join(DATA, "match_v1.snapshot"), "rb") as file:
+        data = file.read()
+    assert data[4:6] == b"\x01\x00"
+
+    # Taken 20 balls into the second innings of a 10 over match between teams of six
+    match = restore(data)
+    innings = match.current_innings
+    assert (len(match.innings), match.innings[0].runs, innings.runs, innings.wickets, innings.balls) == \
+           (2, 43, 41, 0, 20)
+    assert [player.name for player in innings.batsmen_in] == ["Away 1", "Away 2"]
+    assert innings.current_bowler.name == "Home 4"
+
+    # Version 1 has no batting and bowling orders so the teams use their default ones
+    for team in match.list_teams:
+        assert team.batting_order == team.list_players
+        assert team.bowling_order == team.list_players
+
+    assert continuation(restore(snapshot(match))) == continuation(match)
@@ -0,0 +1,40 @@
+import pytest
+from pycricket import *
+from cricketstats import CricketStatsAggregator
+
+
+def test_five_ball_overs(make_match, play):
+    match = make_match(20, 1)
+    match.rules.deliveries_per_over = 5
+    aggregator = CricketStatsAggregator()
+    aggregator.subscribe(match)
+    play(match)
+
+    assert aggregator.deliveries_per_over == 5
+    bowled = 0
+    for innings in match.innings:
+        for player, stats in innings.player_stats.items():
+            if stats.balls_bowled == 0:
+                continue
+            bowled += 1
+            career = aggregator.player(innings.bowling_team.name, player.name)
+
+            # One innings each so the career figures are the innings' figures
+            assert career.overs == stats.overs
+            assert career.economy == pytest.approx(stats.economy)
+            assert career.economy == pytest.approx(career.innings_economy.mean)
+            assert career.economy == pytest.approx(stats.runs_conceded * 5 / stats.balls_bowled)
+    assert bowled > 0
+
+
+def test_overs_of_another_length_cannot_be_added(make_match, play):
+    aggregator = CricketStatsAggregator()
+    match = make_match(2, 2)
+    play(match)
+    aggregator.add_match(match)
+
+    other = make_match(2, 3)
+    other.rules.deliveries_per_over = 5
+    play(other)
+    with pytest.raises(Exception):
+        aggregator.add_match(other)
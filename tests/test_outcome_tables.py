@@ -0,0 +1,52 @@
+from pycricket import *
+
+
+def lookups():
+    info = CricketBrain.table_cache_info()
+    return info.hits, info.misses
+
+
+def test_playing_a_match_does_not_use_outcome_tables(make_match, play):
+    match = make_match(20, 1)
+    before = lookups()
+    match.start(match.list_teams[0])
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        pass
+    assert lookups() == before
+
+
+def test_projections_in_a_full_match_mostly_reuse_tables(make_match, play):
+    match = make_match(20, 2)
+    hits, misses = lookups()
+    match.start(match.list_teams[0])
+    while match.play(match.auto_delivery()).status != CricketOutcome.MATCH_COMPLETE:
+        match.current_innings.project_innings()
+    new_hits, new_misses = lookups()
+
+    # Only the pairings of the players whose skills changed with the last ball need new tables
+    assert (new_hits - hits) / (new_hits - hits + new_misses - misses) > 0.6
+
+
+def test_projecting_again_from_the_same_state_only_hits_the_cache(make_match, play):
+    match = make_match(20, 3)
+    match.start(match.list_teams[0])
+    for i in range(30):
+        match.play(match.auto_delivery())
+    first = match.current_innings.project_innings()
+
+    hits, misses = lookups()
+    second = match.current_innings.project_innings()
+    assert lookups()[1] == misses
+    assert second.mean == first.mean
+
+
+def test_tables_are_keyed_only_by_the_skills_they_use():
+    rng = CricketRandom(4)
+    batsmen = CricketPlayer("Batsmen", rng)
+    bowler = CricketPlayer("Bowler", rng)
+    table = CricketBrain.outcome_table(batsmen, bowler)
+
+    # The batsmen's bowling and the bowler's batting don't change the outcome of a delivery between them
+    batsmen.increase_skill(CricketPlayer.BOWLING, 0.3)
+    bowler.increase_skill(CricketPlayer.BATTING, 0.3)
+    assert CricketBrain.outcome_table(batsmen, bowler) is table
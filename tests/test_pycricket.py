@@ -0,0 +1,63 @@
+import statistics
+import pytest
+from pycricket import *
+from cricketsnapshot import snapshot, restore
+
+
+def test_rendering_a_score_card_does_not_change_the_innings(make_match):
+    match = make_match(20, 1)
+    match.start(match.list_teams[0])
+    for i in range(20):
+        match.play(match.auto_delivery())
+    innings = match.current_innings
+    players = set(innings.player_stats)
+
+    first = innings.render_score_card()
+    innings.batsmen_stats(innings.batting_team.list_players[-1])
+    innings.bowler_stats(innings.bowling_team.list_players[-1])
+
+    assert set(innings.player_stats) == players
+    assert innings.render_score_card() == first
+
+
+def test_projection_agrees_with_simulation_from_a_mid_innings_state(make_match):
+    # The projection doesn't model skill bonuses so the simulation mustn't award any
+    bonus = CricketBrain.SKILL_BONUS
+    CricketBrain.configure(SKILL_BONUS=0)
+    try:
+        # Four players a side so that being all out matters too
+        match = make_match(20, 3, 4)
+        match.start(match.list_teams[0])
+        for i in range(30):
+            match.play(match.auto_delivery())
+        projection = match.current_innings.project_innings()
+
+        # Play the rest of the innings out many times from the same state with different luck
+        data = snapshot(match)
+        totals = []
+        all_out = 0
+        for seed in range(1000):
+            copy = restore(data, seed=seed)
+            innings = copy.current_innings
+            while innings.state != CricketInnings.FINISHED:
+                copy.play(copy.auto_delivery())
+            totals.append(innings.runs)
+            all_out += innings.wickets >= innings.batting_team.players - 1
+    finally:
+        CricketBrain.configure(SKILL_BONUS=bonus)
+
+    # Within four standard errors of the simulated mean
+    assert abs(statistics.mean(totals) - projection.mean) < 4 * statistics.stdev(totals) / len(totals) ** 0.5
+    assert abs(all_out / len(totals) - projection.all_out) < 0.05
+
+
+def test_bowl_command_arguments():
+    assert CricketDelivery.parse_command("") == (None, None)
+    assert CricketDelivery.parse_command("5") == (CricketDelivery.WICKET, None)
+    assert CricketDelivery.parse_command("1 4") == (CricketDelivery.RUNS, 4)
+    assert CricketDelivery.parse_command("Shot 4") == (CricketDelivery.RUNS, 4)
+    assert CricketDelivery.parse_command("no ball") == (CricketDelivery.NO_BALL, None)
+    with pytest.raises(Exception):
+        CricketDelivery.parse_command("7")
+    with pytest.raises(Exception):
+        CricketDelivery.parse_command("Bouncer")